@@ -0,0 +1,213 @@
+import logging
+import numpy as np
+from gate_templates import GATE_TEMPLATES, FAULT_TEMPLATES
+from cnf_encoder import CLAUSE_CATEGORIES
+
+
+def _compile_template(clauses):
+    # Precompute the flat slot indices, literal signs and clause lengths of a template
+    flat = [lit for clause in clauses for lit in clause]
+    slot_index = np.array([abs(lit) - 1 for lit in flat], dtype=np.int64)
+    signs = np.array([1 if lit > 0 else -1 for lit in flat], dtype=np.int64)
+    lengths = np.array([len(clause) for clause in clauses], dtype=np.int64)
+    return slot_index, signs, lengths
+
+
+# Below this many nodes the per-type NumPy setup costs more than it saves and
+# nodes are encoded one by one, see `python src/benchmark.py encode --sizes`
+BATCH_MIN_NODES = 200
+
+
+class BatchEncoder:
+    def __init__(self, encoder):
+        # Type-batched node encoder working on a CNFEncoder's state
+        # Variables are allocated in one pass in exactly the order the per-node
+        # encoders use, then each gate type's clauses are built with a single
+        # NumPy broadcast over its sign template and scattered into place
+        self.encoder = encoder
+        self.gate_templates = {node_type: _compile_template(spec['clauses'])
+                               for node_type, spec in GATE_TEMPLATES.items()}
+        self.fault_template = _compile_template(FAULT_TEMPLATES[encoder.fault_type])
+
+    def _allocate(self):
+        # Allocate node, control and faulty output variables for every node
+        # Returns per-type slot variables and node positions plus the fault logic rows
+        enc = self.encoder
+        graph = enc.graph
+        variable_map = enc.variable_map
+        control_vars = enc.control_vars
+        faulty_outputs = enc.faulty_outputs
+        next_var = enc.next_var
+
+        slot_vars = {node_type: [] for node_type in GATE_TEMPLATES}
+        positions = {node_type: [] for node_type in GATE_TEMPLATES}
+        fault_rows = []
+        fault_positions = []
+
+        for pos, node in enumerate(enc.circuit['nodes']):
+            node_type = node['type']
+            if node_type == 'input':
+                continue
+
+            spec = GATE_TEMPLATES.get(node_type)
+            if spec is None:
+                raise ValueError(f"Unknown node type: {node_type}")
+
+            node_id = node['id']
+            inputs = node.get('inputs')
+
+            if node_type == 'reg' and not inputs:
+                # Register without a driver only gets a variable, as in _encode_reg
+                if node_id not in variable_map:
+                    variable_map[node_id] = next_var
+                    next_var += 1
+                continue
+
+            if node_type == 'output' and not inputs:
+                error_msg = f"Output node {node_id} has no valid inputs, violating strict validation requirement"
+                logging.error(error_msg)
+                raise ValueError(error_msg)
+
+            if node_type == 'or' and len(inputs) != 2:
+                logging.warning(f"Node {node_id} is not a 2-input OR gate, has {len(inputs)} inputs")
+
+            is_cmp = node_type == 'xor' and node_id.startswith('cmp')
+            row = slot_vars[node_type]
+
+            for slot in spec['slots']:
+                if slot == 'out':
+                    ref = node_id
+                else:
+                    ref = inputs[slot]
+                    if is_cmp and graph.is_vulnerable(ref):
+                        key = f"{ref}_faulty"
+                        var = faulty_outputs.get(key)
+                        if var is None:
+                            faulty_outputs[key] = var = next_var
+                            next_var += 1
+                        row.append(var)
+                        continue
+                    if node_type == 'output' and ref not in variable_map:
+                        error_msg = f"Input {ref} of output node {node_id} not found in variable mapping, violating strict validation requirement"
+                        logging.error(error_msg)
+                        raise ValueError(error_msg)
+
+                var = variable_map.get(ref)
+                if var is None:
+                    variable_map[ref] = var = next_var
+                    next_var += 1
+                row.append(var)
+
+            positions[node_type].append(pos)
+
+            if node.get('vulnerable', False):
+                control = control_vars.get(node_id)
+                if control is None:
+                    control_vars[node_id] = control = next_var
+                    next_var += 1
+                key = f"{node_id}_faulty"
+                faulty = faulty_outputs.get(key)
+                if faulty is None:
+                    faulty_outputs[key] = faulty = next_var
+                    next_var += 1
+                fault_rows.extend((variable_map[node_id], control, faulty))
+                fault_positions.append(pos)
+
+        enc.next_var = next_var
+        return slot_vars, positions, fault_rows, fault_positions
+
+    def _update_var_ranges(self):
+        enc = self.encoder
+        for range_name, mapping in (("nodes", enc.variable_map),
+                                    ("controls", enc.control_vars),
+                                    ("faulty_outputs", enc.faulty_outputs)):
+            if mapping:
+                values = mapping.values()
+                enc.var_ranges[range_name]["min"] = min(enc.var_ranges[range_name]["min"], min(values))
+                enc.var_ranges[range_name]["max"] = max(enc.var_ranges[range_name]["max"], max(values))
+
+    def _mark_origins(self, base, clause_start, gate_counts, clause_counts):
+        # Record the provenance runs the per-node encoders would have recorded
+        # Every node that emitted clauses gets a gate run and, with fault logic,
+        # a fault run; runs of different nodes never merge, so they are appended
+        # as whole arrays
+        enc = self.encoder
+        nodes = enc.circuit['nodes']
+        positions = np.flatnonzero(clause_counts)
+        if not len(positions):
+            return
+        category_codes = {category: code for code, category in enumerate(CLAUSE_CATEGORIES)}
+        gate_categories = np.fromiter((category_codes[enc._gate_category(nodes[pos])] for pos in positions.tolist()),
+                                      dtype=np.int64, count=len(positions))
+        fault_categories = np.full(len(positions), category_codes['fault'], dtype=np.int64)
+
+        starts = base + clause_start[positions]
+        ends = np.stack([starts + gate_counts[positions], starts + clause_counts[positions]], axis=1).ravel()
+        categories = np.stack([gate_categories, fault_categories], axis=1).ravel()
+        node_indices = np.repeat(positions, 2)
+        # Runs must be non-empty: a node without fault logic ends its fault run where its gate run ends
+        keep = np.stack([gate_counts[positions] > 0, clause_counts[positions] > gate_counts[positions]], axis=1).ravel()
+        enc.origin_ends.extend(ends[keep].tolist())
+        enc.origin_categories.extend(categories[keep].tolist())
+        enc.origin_nodes.extend(node_indices[keep].tolist())
+
+    def encode_nodes(self):
+        # Encode all nodes into the encoder's clause store
+        # Produces the same variables and the same clauses, in the same order,
+        # as dispatching every node through CNFEncoder's NODE_ENCODERS
+        enc = self.encoder
+        node_count = len(enc.circuit['nodes'])
+        slot_vars, positions, fault_rows, fault_positions = self._allocate()
+        self._update_var_ranges()
+
+        # Per-node clause and literal counts give every node its slice of the output
+        clause_counts = np.zeros(node_count, dtype=np.int64)
+        lit_counts = np.zeros(node_count, dtype=np.int64)
+        for node_type, type_positions in positions.items():
+            if type_positions:
+                slot_index, _, lengths = self.gate_templates[node_type]
+                clause_counts[type_positions] = len(lengths)
+                lit_counts[type_positions] = len(slot_index)
+
+        node_clause_counts = clause_counts.copy()
+        fault_positions = np.array(fault_positions, dtype=np.int64)
+        gate_clause_counts = clause_counts[fault_positions]
+        gate_lit_counts = lit_counts[fault_positions]
+        fault_slot_index, _, fault_lengths = self.fault_template
+        clause_counts[fault_positions] += len(fault_lengths)
+        lit_counts[fault_positions] += len(fault_slot_index)
+
+        clause_start = np.cumsum(clause_counts) - clause_counts
+        lit_start = np.cumsum(lit_counts) - lit_counts
+        lits = np.empty(int(lit_counts.sum()), dtype=np.int32)
+        lengths_out = np.empty(int(clause_counts.sum()), dtype=np.int64)
+
+        def scatter(template, rows, lit_base, clause_base):
+            slot_index, signs, lengths = template
+            width = int(slot_index.max()) + 1
+            table = np.asarray(rows, dtype=np.int64).reshape(-1, width)
+            lits[lit_base[:, None] + np.arange(len(slot_index))] = table[:, slot_index] * signs
+            lengths_out[clause_base[:, None] + np.arange(len(lengths))] = lengths
+
+        normal_clauses = 0
+        for node_type, type_positions in positions.items():
+            if type_positions:
+                type_positions = np.array(type_positions, dtype=np.int64)
+                scatter(self.gate_templates[node_type], slot_vars[node_type],
+                        lit_start[type_positions], clause_start[type_positions])
+                normal_clauses += len(type_positions) * len(self.gate_templates[node_type][2])
+
+        if len(fault_positions):
+            scatter(self.fault_template, fault_rows,
+                    lit_start[fault_positions] + gate_lit_counts,
+                    clause_start[fault_positions] + gate_clause_counts)
+
+        base = len(enc.cnf)
+        if len(lengths_out):
+            ends = len(enc.cnf.lits) + np.cumsum(lengths_out)
+            enc.cnf.extend_buffers(lits, ends, int(np.abs(lits).max()))
+        self._mark_origins(base, clause_start, node_clause_counts, clause_counts)
+
+        enc.clause_stats["normal_logic"] += normal_clauses
+        enc.clause_stats["fault_logic"] += len(fault_positions) * len(fault_lengths)
+        logging.info(f"Batch encoded {node_count} nodes into {len(lengths_out)} clauses")
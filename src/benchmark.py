@@ -0,0 +1,438 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+import subprocess
+from pysat.solvers import Minisat22
+from cnf_encoder import CNFEncoder
+from clause_store import ClauseStore
+from polarity import PolarityEncoder
+import cardinality
+
+# Modules the command-line entry points must not import before a stage needs them
+DEFERRED_MODULES = ('pysat', 'multiprocessing', 'subprocess', 'numpy')
+
+# Stage modules an entry module must not load at all, the client only sends
+# requests to the server, which holds the encoder
+STAGE_FREE_MODULES = {'client': ('cnf_encoder',)}
+
+# Import time budget of an entry module, checked by `python src/benchmark.py startup`
+STARTUP_BUDGET_MS = 100
+
+
+def replicate_circuit(circuit, copies):
+    # Build a larger netlist by duplicating a circuit
+    # Every node except 'flag' is copied with a _c<i> suffix, the per-copy
+    # flag_logic signals are combined by an OR tree that drives a single flag
+    nodes = []
+    flag_signals = []
+    for i in range(copies):
+        for node in circuit['nodes']:
+            if node['id'] == 'flag':
+                continue
+            copy = dict(node)
+            copy['id'] = f"{node['id']}_c{i}"
+            if 'inputs' in node:
+                copy['inputs'] = [f"{input_id}_c{i}" for input_id in node['inputs']]
+            nodes.append(copy)
+        flag_signals.append(f"flag_logic_c{i}")
+
+    tree_index = 0
+    while len(flag_signals) > 1:
+        merged = []
+        for j in range(0, len(flag_signals) - 1, 2):
+            node_id = f"flag_or{tree_index}"
+            tree_index += 1
+            nodes.append({"id": node_id, "type": "or", "inputs": flag_signals[j:j + 2], "vulnerable": False})
+            merged.append(node_id)
+        if len(flag_signals) % 2:
+            merged.append(flag_signals[-1])
+        flag_signals = merged
+    nodes.append({"id": "flag", "type": "output", "inputs": flag_signals})
+
+    replicated = dict(circuit)
+    replicated['nodes'] = nodes
+    return replicated
+
+
+def random_circuit(gates, seed=0):
+    # Generate a random duplicated netlist that uses every gate type
+    # Each gate gets a redundant copy, each pair a cmp comparator, and the
+    # comparators are ORed into flag like in the bundled circuits
+    rng = random.Random(seed)
+    inputs = [f"d{i}" for i in range(16)]
+    nodes = [{"id": node_id, "type": "input"} for node_id in inputs]
+    arity = {"xor": 2, "and": 2, "or": 2, "not": 1, "mux": 3, "reg": 1}
+    signals = list(inputs)
+    signals_red = list(inputs)
+    compare = []
+    for i in range(gates):
+        node_type = rng.choice(list(arity))
+        picks = [rng.randrange(len(signals)) for _ in range(arity[node_type])]
+        nodes.append({"id": f"g{i}", "type": node_type, "inputs": [signals[p] for p in picks],
+                      "vulnerable": node_type != "reg"})
+        nodes.append({"id": f"g{i}_red", "type": node_type, "inputs": [signals_red[p] for p in picks],
+                      "vulnerable": False})
+        signals.append(f"g{i}")
+        signals_red.append(f"g{i}_red")
+        compare.append(i)
+
+    or_inputs = []
+    for i in compare:
+        nodes.append({"id": f"cmp{i}", "type": "xor", "inputs": [f"g{i}", f"g{i}_red"], "vulnerable": False})
+        or_inputs.append(f"cmp{i}")
+    tree_index = 0
+    while len(or_inputs) > 1:
+        node_id = f"or{tree_index}"
+        tree_index += 1
+        nodes.append({"id": node_id, "type": "or", "inputs": or_inputs[:2], "vulnerable": False})
+        or_inputs = or_inputs[2:] + [node_id]
+    nodes.append({"id": "flag_logic", "type": "or", "inputs": [or_inputs[0], or_inputs[0]], "vulnerable": False})
+    nodes.append({"id": "flag", "type": "output", "inputs": ["flag_logic"]})
+    for i in range(0, gates, max(1, gates // 8)):
+        nodes.append({"id": f"o{i}", "type": "output", "inputs": [f"g{i}"]})
+
+    return {
+        "nodes": nodes,
+        "fault_model": {"n_e": 1, "n_c": 1, "fault_type": "bit-flip",
+                        "vulnerable_types": ["xor", "and", "or", "not", "mux"]},
+        "countermeasure": "detection",
+    }
+
+
+def load_circuit(base_dir, name):
+    with open(os.path.join(base_dir, 'inputs', f'{name}.json'), 'r') as f:
+        return json.load(f)
+
+
+def write_temp_circuit(circuit, tmp_dir, name):
+    path = os.path.join(tmp_dir, f"{name}.json")
+    with open(path, 'w') as f:
+        json.dump(circuit, f)
+    return path
+
+
+def bench_encode(circuit, tmp_dir, name, repeat):
+    # Compare per-node and batch node encoding on the same netlist
+    # Only the node encoding phase is timed, and both results must be identical
+    json_file = write_temp_circuit(circuit, tmp_dir, name)
+    timings = {"per-node": [], "batch": []}
+    results = {}
+
+    for _ in range(repeat):
+        for mode in timings:
+            encoder = CNFEncoder(json_file)
+            start = time.perf_counter()
+            if mode == "batch":
+                from batch_encoder import BatchEncoder
+                BatchEncoder(encoder).encode_nodes()
+            else:
+                encoder._encode_nodes()
+            timings[mode].append(time.perf_counter() - start)
+            results[mode] = encoder
+
+    reference, batch = results["per-node"], results["batch"]
+    identical = (reference.cnf.lits == batch.cnf.lits
+                 and reference.cnf.offsets == batch.cnf.offsets
+                 and list(reference.variable_map.items()) == list(batch.variable_map.items())
+                 and list(reference.control_vars.items()) == list(batch.control_vars.items())
+                 and list(reference.faulty_outputs.items()) == list(batch.faulty_outputs.items())
+                 and reference.origin_ends == batch.origin_ends
+                 and reference.origin_categories == batch.origin_categories
+                 and reference.origin_nodes == batch.origin_nodes)
+
+    per_node, batched = min(timings["per-node"]), min(timings["batch"])
+    print(f"{name}: {len(circuit['nodes'])} nodes, {len(reference.cnf)} clauses")
+    print(f"  per-node encoding: {per_node:.4f} s")
+    print(f"  batch encoding:    {batched:.4f} s ({per_node / batched:.1f}x)")
+    print(f"  identical output:  {identical}")
+    return identical, per_node, batched
+
+
+def bench_crossover(sizes, tmp_dir, repeat):
+    # Find the netlist size from which batch encoding beats per-node encoding
+    # Batch encoding pays a fixed NumPy setup per gate type, so small netlists
+    # encode faster node by node; --batch-encode falls back below BATCH_MIN_NODES
+    from batch_encoder import BATCH_MIN_NODES
+    rows = []
+    ok = True
+    for gates in sizes:
+        circuit = random_circuit(gates)
+        identical, per_node, batched = bench_encode(circuit, tmp_dir, f"random{gates}", repeat)
+        ok = ok and identical
+        rows.append({"gates": gates, "nodes": len(circuit['nodes']), "per_node": per_node, "batch": batched})
+
+    # Smallest measured size from which batch encoding wins at every larger size
+    crossover = None
+    for row in reversed(rows):
+        if row["batch"] >= row["per_node"]:
+            break
+        crossover = row["nodes"]
+    print(f"crossover: {crossover if crossover is not None else 'none'} nodes "
+          f"(batch encoding falls back below {BATCH_MIN_NODES} nodes)")
+    return rows, ok
+
+
+def solve_with_card_constraint(encoder, controls, n_e, name):
+    # Add one encoding's fault number constraint to the node clauses, then load and solve
+    # Returns (at-most clauses, aux variables, encode time, solve time)
+    start = time.perf_counter()
+    atmost = cardinality.atmost(controls, n_e, encoder.next_var - 1, name)
+    encode_time = time.perf_counter() - start
+
+    formula = ClauseStore.from_arrays(encoder.cnf.lits, encoder.cnf.offsets, encoder.cnf.nv)
+    formula.extend(atmost.clauses)
+    formula.append(controls)
+    formula.append([-encoder.variable_map['flag']])
+    start = time.perf_counter()
+    solver = Minisat22()
+    formula.add_to_solver(solver)
+    solver.solve()
+    solve_time = time.perf_counter() - start
+    solver.delete()
+    return len(atmost.clauses), atmost.nv - encoder.next_var + 1, encode_time, solve_time
+
+
+def bench_cardinality(sizes, bounds, tmp_dir, max_clauses, repeat):
+    # Measure every cardinality encoding on random duplicated netlists
+    # For each (control variables, n_e) point the gate clauses are encoded once,
+    # then each encoding adds at-most-n_e, at-least-one and flag = 0 and the
+    # formula is loaded and solved from scratch. Encodings are interleaved over
+    # the repeats and the best encode + solve time picks the winner
+    rows = []
+    for gates in sizes:
+        json_file = write_temp_circuit(random_circuit(gates), tmp_dir, f"random{gates}")
+        encoder = CNFEncoder(json_file)
+        encoder._encode_nodes()
+        controls = list(encoder.control_vars.values())
+
+        for n_e in bounds:
+            if n_e >= len(controls):
+                continue
+            names = []
+            for name in cardinality.CARD_ENCODINGS:
+                if name in cardinality.AT_MOST_ONE_ONLY and n_e > 1:
+                    continue
+                if name == 'pairwise' and len(controls) * (len(controls) - 1) // 2 > max_clauses:
+                    continue
+                names.append(name)
+
+            measured = {}
+            for _ in range(repeat):
+                for name in list(names):
+                    clauses, aux_vars, encode_time, solve_time = solve_with_card_constraint(encoder, controls, n_e, name)
+                    if clauses > max_clauses:
+                        names.remove(name)
+                        continue
+                    best = measured.get(name)
+                    if best is None or encode_time + solve_time < best[2] + best[3]:
+                        measured[name] = (clauses, aux_vars, encode_time, solve_time)
+
+            for name, (clauses, aux_vars, encode_time, solve_time) in measured.items():
+                rows.append({"controls": len(controls), "n_e": n_e, "encoding": name,
+                             "clauses": clauses, "aux_vars": aux_vars,
+                             "encode_time": encode_time, "solve_time": solve_time})
+                print(f"  {len(controls):>6} controls, n_e = {n_e:<3} {name:<12} {clauses:>8} clauses "
+                      f"encode {encode_time:.4f} s, solve {solve_time:.4f} s")
+            if measured:
+                winner = min(measured, key=lambda name: (measured[name][2] + measured[name][3], measured[name][0]))
+                print(f"  -> best for {len(controls)} controls, n_e = {n_e}: {winner}, "
+                      f"auto picks {cardinality.choose_encoding(len(controls), n_e)}")
+    return rows
+
+
+def encode_and_solve(json_file, n_e, polarity):
+    # Encode the complete formula in one gate encoding mode, then load and solve it
+    # The encoding phases are run directly so no variable map is written
+    # Returns (variables, clauses, encode time, solve time, sat)
+    start = time.perf_counter()
+    encoder = CNFEncoder(json_file)
+    if polarity:
+        PolarityEncoder(encoder).encode_nodes()
+    else:
+        encoder._encode_nodes()
+    encoder._encode_fault_constraints(n_e)
+    encoder._encode_countermeasure_constraints()
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    solver = Minisat22()
+    encoder.cnf.add_to_solver(solver)
+    is_sat = solver.solve()
+    solve_time = time.perf_counter() - start
+    solver.delete()
+    return encoder.next_var - 1, len(encoder.cnf), encode_time, solve_time, is_sat
+
+
+def bench_polarity(base_dir, circuits, copies_list, bounds, tmp_dir, repeat):
+    # Compare full Tseitin and polarity-aware (Plaisted-Greenbaum) gate encoding
+    # Both modes are interleaved over the repeats, the best encode + solve time
+    # is kept, and the verdicts must agree
+    rows = []
+    agree = True
+    for name in circuits:
+        for copies in copies_list:
+            circuit = load_circuit(base_dir, name)
+            label = name
+            if copies > 1:
+                circuit = replicate_circuit(circuit, copies)
+                label = f"{name}x{copies}"
+            json_file = write_temp_circuit(circuit, tmp_dir, label)
+
+            for n_e in bounds:
+                measured = {}
+                for _ in range(repeat):
+                    for mode in ("full", "polarity"):
+                        result = encode_and_solve(json_file, n_e, mode == "polarity")
+                        best = measured.get(mode)
+                        if best is None or result[2] + result[3] < best[2] + best[3]:
+                            measured[mode] = result
+
+                full, pg = measured["full"], measured["polarity"]
+                agree = agree and full[4] == pg[4]
+                print(f"{label}, n_e = {n_e}: {'SAT' if full[4] else 'UNSAT'}"
+                      f"{'' if full[4] == pg[4] else ' (polarity verdict differs)'}")
+                for mode, (variables, clauses, encode_time, solve_time, is_sat) in measured.items():
+                    print(f"  {mode:<9} {variables:>8} vars {clauses:>9} clauses "
+                          f"encode {encode_time:.4f} s, solve {solve_time:.4f} s")
+                    rows.append({"circuit": label, "n_e": n_e, "mode": mode, "variables": variables,
+                                 "clauses": clauses, "encode_time": encode_time,
+                                 "solve_time": solve_time, "sat": is_sat})
+                print(f"  -> {100 * (1 - pg[1] / full[1]):.1f}% fewer clauses, "
+                      f"solve time {full[3] / pg[3]:.2f}x")
+    return rows, agree
+
+
+def import_profile(module):
+    # Import a module in a fresh interpreter with -X importtime
+    # Returns (total import time in ms, {imported module: cumulative ms})
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=src_dir, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise ValueError(f"Importing {module} failed: {proc.stderr.strip().splitlines()[-1]}")
+    imports = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports[name.strip()] = int(cumulative) / 1000
+    return imports.get(module, 0.0), imports
+
+
+def bench_startup(modules, repeat, budget):
+    # Measure the import time of the command-line entry modules
+    # The first run of each module warms the bytecode cache and is discarded;
+    # a module passes if its best time is within the budget and it imports
+    # none of the DEFERRED_MODULES and none of its STAGE_FREE_MODULES
+    rows = []
+    ok = True
+    for module in modules:
+        import_profile(module)
+        best, imports = None, None
+        for _ in range(repeat):
+            total, profile = import_profile(module)
+            if best is None or total < best:
+                best, imports = total, profile
+        deferred = sorted(name for name in imports if name.split('.')[0] in DEFERRED_MODULES)
+        stages = sorted(name for name in STAGE_FREE_MODULES.get(module, ()) if name in imports)
+        passed = best <= budget and not deferred and not stages
+        ok = ok and passed
+        rows.append({"module": module, "import_ms": best, "budget_ms": budget, "deferred_imports": deferred,
+                     "stage_imports": stages, "passed": passed})
+        print(f"{module:<12} {best:>7.1f} ms (budget {budget} ms) {'ok' if passed else 'FAILED'}")
+        if deferred:
+            print(f"  imports {', '.join(deferred[:5])}{' ...' if len(deferred) > 5 else ''} at startup")
+        if stages:
+            print(f"  loads {', '.join(stages)} at startup")
+        slowest = sorted(((ms, name) for name, ms in imports.items() if name != module), reverse=True)[:5]
+        print(f"  slowest imports: {', '.join(f'{name} {ms:.1f} ms' for ms, name in slowest)}")
+    return rows, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for the fault injection verification tool')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    encode_parser = subparsers.add_parser('encode', help='Compare per-node and batch gate encoding')
+    encode_parser.add_argument('--circuit', default='sbox', help='Bundled circuit to replicate (default: sbox)')
+    encode_parser.add_argument('--copies', type=int, default=2000, help='Number of circuit copies (default: 2000)')
+    encode_parser.add_argument('--random', type=int, metavar='GATES',
+                               help='Use a random netlist with this many gates instead of a bundled circuit')
+    encode_parser.add_argument('--sizes', type=int, nargs='+', metavar='GATES',
+                               help='Sweep random netlists of these sizes and report the batch encoding crossover')
+    encode_parser.add_argument('--repeat', type=int, default=3, help='Runs per mode, best time is reported')
+    encode_parser.add_argument('--output', help='Write the --sizes measurements to this JSON file')
+
+    card_parser = subparsers.add_parser('cardinality', help='Compare cardinality encodings for the fault number constraint')
+    card_parser.add_argument('--sizes', type=int, nargs='+', default=[24, 72, 300, 1200, 2400],
+                             help='Random netlist sizes in gates (default: 24 72 300 1200 2400)')
+    card_parser.add_argument('--n-e', type=int, nargs='+', default=[1, 2, 4, 8, 16],
+                             help='Fault bounds to measure (default: 1 2 4 8 16)')
+    card_parser.add_argument('--max-clauses', type=int, default=600000,
+                             help='Skip encodings that produce more clauses than this')
+    card_parser.add_argument('--repeat', type=int, default=3, help='Runs per encoding, best time is reported')
+    card_parser.add_argument('--output', help='Write the measurements to this JSON file')
+
+    polarity_parser = subparsers.add_parser('polarity', help='Compare full and polarity-aware gate encoding')
+    polarity_parser.add_argument('--circuits', nargs='+', default=['sbox', 'xor_cipher'],
+                                 help='Bundled circuits (default: sbox xor_cipher)')
+    polarity_parser.add_argument('--copies', type=int, nargs='+', default=[1, 200],
+                                 help='Replication factors, 1 is the circuit itself (default: 1 200)')
+    polarity_parser.add_argument('--n-e', type=int, nargs='+', default=[1, 2],
+                                 help='Fault bounds to measure (default: 1 2)')
+    polarity_parser.add_argument('--repeat', type=int, default=3, help='Runs per mode, best time is reported')
+    polarity_parser.add_argument('--output', help='Write the measurements to this JSON file')
+
+    startup_parser = subparsers.add_parser('startup', help='Check the import time of the command-line entry points')
+    startup_parser.add_argument('--modules', nargs='+', default=['main', 'client'],
+                                help='Entry modules to import (default: main client)')
+    startup_parser.add_argument('--budget', type=float, default=STARTUP_BUDGET_MS,
+                                help=f'Import time budget per module in milliseconds (default: {STARTUP_BUDGET_MS})')
+    startup_parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per module, best time is reported')
+    startup_parser.add_argument('--output', help='Write the measurements to this JSON file')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.command == 'encode':
+            if args.sizes:
+                rows, ok = bench_crossover(args.sizes, tmp_dir, args.repeat)
+                if args.output:
+                    with open(args.output, 'w') as f:
+                        json.dump(rows, f, indent=2)
+                sys.exit(0 if ok else 1)
+            if args.random:
+                circuit, name = random_circuit(args.random), f"random{args.random}"
+            else:
+                circuit = replicate_circuit(load_circuit(base_dir, args.circuit), args.copies)
+                name = f"{args.circuit}x{args.copies}"
+            ok, _, _ = bench_encode(circuit, tmp_dir, name, args.repeat)
+            sys.exit(0 if ok else 1)
+        elif args.command == 'cardinality':
+            rows = bench_cardinality(args.sizes, args.n_e, tmp_dir, args.max_clauses, args.repeat)
+            if args.output:
+                with open(args.output, 'w') as f:
+                    json.dump(rows, f, indent=2)
+        elif args.command == 'polarity':
+            rows, agree = bench_polarity(base_dir, args.circuits, args.copies, args.n_e, tmp_dir, args.repeat)
+            if args.output:
+                with open(args.output, 'w') as f:
+                    json.dump(rows, f, indent=2)
+            sys.exit(0 if agree else 1)
+        elif args.command == 'startup':
+            rows, ok = bench_startup(args.modules, args.repeat, args.budget)
+            if args.output:
+                with open(args.output, 'w') as f:
+                    json.dump(rows, f, indent=2)
+            sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
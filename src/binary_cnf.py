@@ -0,0 +1,162 @@
+import os
+import sys
+import mmap
+import struct
+import logging
+import argparse
+from array import array
+from clause_store import ClauseStore
+from cli_args import BINARY_CNF_SUFFIX
+
+# Binary CNF layout, little-endian:
+#   header   magic, format version, variable count, clause count, literal count
+#   offsets  int64 * (clauses + 1), clause i is lits[offsets[i]:offsets[i + 1]]
+#   lits     int32 * literals, no terminating zeros
+# The header is 40 bytes, so both arrays are naturally aligned in a mapping
+BINARY_CNF_MAGIC = b'BINCNF\x00\x00'
+BINARY_CNF_FORMAT = 1
+HEADER = struct.Struct('<8sIIQQ')
+HEADER_PADDING = 40 - HEADER.size
+
+
+def is_binary_cnf(path):
+    # True if the file starts with the binary CNF magic
+    with open(path, 'rb') as f:
+        return f.read(len(BINARY_CNF_MAGIC)) == BINARY_CNF_MAGIC
+
+
+def write_binary_cnf(cnf, path):
+    """Write a clause store in the binary CNF format
+
+    Args:
+        cnf (ClauseStore): Formula to write
+        path (str): Output file
+    """
+    lits = cnf.lits if isinstance(cnf.lits, array) else array('i', cnf.lits)
+    offsets = cnf.offsets if isinstance(cnf.offsets, array) else array('q', cnf.offsets)
+    if sys.byteorder == 'big':
+        lits = array('i', lits)
+        offsets = array('q', offsets)
+        lits.byteswap()
+        offsets.byteswap()
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(BINARY_CNF_MAGIC, BINARY_CNF_FORMAT, cnf.nv, len(offsets) - 1, len(lits)))
+        f.write(bytes(HEADER_PADDING))
+        f.write(offsets.tobytes())
+        f.write(lits.tobytes())
+
+
+def load_binary_cnf(path):
+    """Map a binary CNF file into a clause store without parsing
+
+    The returned store reads its literals and offsets straight from the
+    memory-mapped file and keeps the mapping open for as long as it lives.
+
+    Args:
+        path (str): Binary CNF file
+
+    Returns:
+        ClauseStore: Read-only formula backed by the mapping
+    """
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mapping) < 40:
+        raise ValueError(f"Invalid binary CNF file: {path}")
+    magic, version, nv, n_clauses, n_lits = HEADER.unpack_from(mapping)
+    if magic != BINARY_CNF_MAGIC:
+        raise ValueError(f"Invalid binary CNF file: {path}")
+    if version != BINARY_CNF_FORMAT:
+        raise ValueError(f"Unsupported binary CNF format version {version}: {path}")
+    lits_start = 40 + 8 * (n_clauses + 1)
+    if len(mapping) != lits_start + 4 * n_lits:
+        raise ValueError(f"Truncated binary CNF file: {path}")
+
+    view = memoryview(mapping)
+    offsets = view[40:lits_start].cast('q')
+    lits = view[lits_start:].cast('i')
+    if sys.byteorder == 'big':
+        # Mapped data is little-endian, big-endian hosts get swapped copies
+        offsets = array('q', offsets)
+        lits = array('i', lits)
+        offsets.byteswap()
+        lits.byteswap()
+
+    store = ClauseStore.from_arrays(lits, offsets, nv)
+    store.mapping = mapping
+    return store
+
+
+def read_dimacs_fp(file_pointer, name='<stream>'):
+    # Parse DIMACS text from an open file into a clause store, one pass over the tokens
+    lits = array('i')
+    offsets = array('q', [0])
+    nv = 0
+    for line in file_pointer:
+        if not line.strip() or line[0] in 'c%':
+            continue
+        if line.startswith('p'):
+            fields = line.split()
+            if len(fields) < 4 or fields[1] != 'cnf':
+                raise ValueError(f"Invalid DIMACS header in {name}: {line.strip()}")
+            nv = int(fields[2])
+            continue
+        for token in line.split():
+            lit = int(token)
+            if lit:
+                lits.append(lit)
+            else:
+                offsets.append(len(lits))
+    if offsets[-1] != len(lits):
+        # Last clause without a terminating zero
+        offsets.append(len(lits))
+    top = max(max(lits), -min(lits)) if lits else 0
+    return ClauseStore.from_arrays(lits, offsets, max(nv, top))
+
+
+def read_dimacs(path):
+    # Parse a DIMACS file into a clause store
+    with open(path, 'r') as f:
+        return read_dimacs_fp(f, path)
+
+
+def load_cnf(path):
+    # Load a formula in either format, binary files are memory-mapped
+    if is_binary_cnf(path):
+        return load_binary_cnf(path)
+    return read_dimacs(path)
+
+
+def dimacs_to_binary(dimacs_file, binary_file):
+    cnf = read_dimacs(dimacs_file)
+    write_binary_cnf(cnf, binary_file)
+    return cnf
+
+
+def binary_to_dimacs(binary_file, dimacs_file):
+    cnf = load_binary_cnf(binary_file)
+    cnf.to_file(dimacs_file)
+    return cnf
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert CNF files between DIMACS and the binary CNF format')
+    parser.add_argument('input', help='CNF file in either format')
+    parser.add_argument('output', help='Output file, written in the other format')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+
+    if not os.path.isfile(args.input):
+        logging.error(f"CNF file not found: {args.input}")
+        sys.exit(1)
+    if is_binary_cnf(args.input):
+        cnf = binary_to_dimacs(args.input, args.output)
+        target = 'DIMACS'
+    else:
+        cnf = dimacs_to_binary(args.input, args.output)
+        target = 'binary CNF'
+    logging.info(f"Wrote {len(cnf)} clauses over {cnf.nv} variables to {args.output} ({target})")
+
+
+if __name__ == '__main__':
+    main()
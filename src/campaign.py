@@ -0,0 +1,300 @@
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+import itertools
+import multiprocessing
+from cnf_encoder import CNFEncoder
+from sat_solver import SATSolver
+from cardinality import encoding_names
+from self_check import SELF_CHECK_LEVELS
+from cli_args import BASE_DIR
+
+# Matrix axes of a campaign spec, in the order jobs are expanded
+MATRIX_AXES = ('circuits', 'fault_types', 'n_e', 'countermeasures')
+FAULT_TYPES = ('bit-flip', 'set', 'reset')
+COUNTERMEASURES = ('detection', 'correction')
+
+# Encoding options shared by every job of a campaign
+DEFAULT_OPTIONS = {
+    "card_encoding": None,
+    "batch": False,
+    "slice": False,
+    "strash": False,
+    "polarity": False,
+    "self_check": 'off',
+    "solver_cmd": None,
+    "solver_timeout": None,
+    "conflict_budget": None,
+    "propagation_budget": None,
+}
+
+# Columns of the CSV results table
+RESULT_FIELDS = ('job', 'circuit', 'fault_type', 'n_e', 'countermeasure', 'status', 'fault_vector',
+                 'variables', 'clauses', 'parse_time', 'setup_time', 'encode_time', 'solve_time', 'job_time', 'error')
+
+
+def load_spec(spec_file):
+    # Read a campaign spec: one list per matrix axis plus optional encoding options
+    with open(spec_file, 'r') as f:
+        spec = json.load(f)
+    if not isinstance(spec, dict):
+        raise ValueError(f"Invalid campaign spec {spec_file}: expected a JSON object")
+    return spec
+
+
+def validate_spec(spec):
+    # Check the matrix axes and options, returns the spec with every option filled in
+    for axis in MATRIX_AXES:
+        values = spec.get(axis)
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"Campaign spec needs a non-empty list '{axis}'")
+    for fault_type in spec['fault_types']:
+        if fault_type not in FAULT_TYPES:
+            raise ValueError(f"Unknown fault type in campaign spec: {fault_type}")
+    for n_e in spec['n_e']:
+        if not isinstance(n_e, int) or n_e <= 0:
+            raise ValueError(f"n_e must be a positive integer, got {n_e!r}")
+    for countermeasure in spec['countermeasures']:
+        if countermeasure not in COUNTERMEASURES:
+            raise ValueError(f"Unknown countermeasure in campaign spec: {countermeasure}")
+
+    options = dict(DEFAULT_OPTIONS)
+    for key, value in spec.get('options', {}).items():
+        if key not in DEFAULT_OPTIONS:
+            raise ValueError(f"Unknown campaign option: {key}")
+        options[key] = value
+    if options['card_encoding'] is not None and options['card_encoding'] not in encoding_names():
+        raise ValueError(f"Unknown cardinality encoding: {options['card_encoding']}")
+    for key in ('solver_timeout', 'conflict_budget', 'propagation_budget'):
+        if options[key] is not None and options[key] <= 0:
+            raise ValueError(f"{key} must be positive")
+    if options['solver_cmd'] and (options['conflict_budget'] or options['propagation_budget']):
+        raise ValueError("conflict_budget and propagation_budget need the PySAT library solver")
+    if options['self_check'] not in SELF_CHECK_LEVELS:
+        raise ValueError(f"Unknown self-check level: {options['self_check']}")
+    return dict(spec, options=options)
+
+
+def expand_jobs(spec):
+    # One job per point of the matrix, circuits vary slowest
+    axes = [spec[axis] for axis in MATRIX_AXES]
+    return [{"job": index, "circuit": circuit, "fault_type": fault_type, "n_e": n_e, "countermeasure": countermeasure}
+            for index, (circuit, fault_type, n_e, countermeasure) in enumerate(itertools.product(*axes))]
+
+
+def load_netlists(input_dir, circuits):
+    # Parse every circuit JSON once, returns {circuit: (json_file, circuit dict, parse seconds)}
+    netlists = {}
+    for circuit in dict.fromkeys(circuits):
+        json_file = os.path.join(input_dir, f"{circuit}.json")
+        start_time = time.time()
+        try:
+            with open(json_file, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Circuit JSON not found: {json_file}")
+        netlists[circuit] = (json_file, data, time.time() - start_time)
+        logging.info(f"Parsed {circuit}: {len(data.get('nodes', []))} nodes in {netlists[circuit][2]:.3f} seconds")
+    return netlists
+
+
+# Per-process campaign state, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(netlists, options, log_level):
+    # Every job a worker runs reads the netlists parsed by the parent
+    _worker['netlists'] = netlists
+    _worker['options'] = options
+    logging.getLogger().setLevel(log_level)
+
+
+def _run_job(job):
+    # Encode and solve one point of the matrix, never raises
+    netlists = _worker['netlists']
+    options = _worker['options']
+    json_file, circuit, parse_time = netlists[job['circuit']]
+    result = dict(job, status=None, fault_vector=None, variables=None, clauses=None, parse_time=parse_time,
+                  setup_time=None, encode_time=None, solve_time=None, job_time=None, error=None)
+    job_start = time.time()
+    try:
+        # The shared netlist is copied, never modified, by the overrides
+        start_time = time.time()
+        encoder = CNFEncoder(json_file, circuit=circuit, overrides={
+            "fault_type": job['fault_type'],
+            "n_e": job['n_e'],
+            "countermeasure": job['countermeasure'],
+        })
+        result['setup_time'] = time.time() - start_time
+
+        start_time = time.time()
+        cnf = encoder.encode(job['n_e'], batch=options['batch'], card_encoding=options['card_encoding'],
+                             slice_cone=options['slice'], strash=options['strash'], polarity=options['polarity'],
+                             self_check=options['self_check'], save_maps=False)
+        result['encode_time'] = time.time() - start_time
+        result['variables'] = encoder.next_var - 1
+        result['clauses'] = len(cnf)
+
+        start_time = time.time()
+        solver = SATSolver(solver_cmd=options['solver_cmd'], timeout=options['solver_timeout'],
+                           conflict_budget=options['conflict_budget'], propagation_budget=options['propagation_budget'])
+        sat, model = solver.solve(cnf)
+        result['solve_time'] = time.time() - start_time
+
+        is_resistant, fault_vector = solver.interpret_result(
+            sat, model, encoder.get_variable_map(), encoder.get_control_vars(), job['countermeasure'])
+        result['status'] = {True: 'resistant', False: 'vulnerable', None: 'unknown'}[is_resistant]
+        result['fault_vector'] = fault_vector
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+    result['job_time'] = time.time() - job_start
+    return result
+
+
+def run_campaign(spec, input_dir, workers=None, log_level=logging.WARNING):
+    """Run every job of a campaign matrix
+
+    Args:
+        spec (dict): Validated campaign spec
+        input_dir (str): Directory holding <circuit>.json
+        workers (int): Worker processes, 1 runs the jobs in this process (default: one per CPU core)
+        log_level (int): Logging level inside the jobs
+
+    Returns:
+        list: One result dict per job, in job order
+    """
+    jobs = expand_jobs(spec)
+    netlists = load_netlists(input_dir, spec['circuits'])
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    logging.info(f"Running {len(jobs)} jobs on {workers} worker process{'es' if workers > 1 else ''}")
+
+    results = []
+    initargs = (netlists, spec['options'], log_level)
+    if workers == 1:
+        level = logging.getLogger().level
+        _init_worker(*initargs)
+        try:
+            for job in jobs:
+                results.append(_run_job(job))
+                _log_result(results[-1], len(jobs))
+        finally:
+            logging.getLogger().setLevel(level)
+    else:
+        # Netlists are shipped once per worker, not once per job
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+            for result in pool.imap_unordered(_run_job, jobs):
+                results.append(result)
+                _log_result(result, len(jobs))
+
+    results.sort(key=lambda result: result['job'])
+    return results
+
+
+def _log_result(result, total):
+    label = f"{result['circuit']} {result['fault_type']} n_e={result['n_e']} {result['countermeasure']}"
+    if result['status'] == 'error':
+        logging.error(f"[{result['job'] + 1}/{total}] {label}: {result['error']}")
+    else:
+        logging.info(f"[{result['job'] + 1}/{total}] {label}: {result['status']} "
+                     f"({result['clauses']} clauses, encode {result['encode_time']:.2f} s, solve {result['solve_time']:.2f} s)")
+
+
+def write_results(results, spec, csv_file=None, json_file=None):
+    # Write the consolidated results table as CSV and/or JSON
+    if csv_file:
+        with open(csv_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            for result in results:
+                row = dict(result)
+                row['fault_vector'] = ' '.join(result['fault_vector'] or [])
+                writer.writerow({field: row[field] for field in RESULT_FIELDS})
+        logging.info(f"Campaign results saved to {csv_file}")
+    if json_file:
+        with open(json_file, 'w') as f:
+            json.dump({"spec": spec, "results": results}, f, indent=4)
+        logging.info(f"Campaign results saved to {json_file}")
+
+
+def print_summary(results, elapsed):
+    # One line per job plus the totals per status
+    print(f"{'circuit':<14}{'fault type':<11}{'n_e':>4}  {'countermeasure':<15}{'status':<11}{'clauses':>9}"
+          f"{'encode s':>10}{'solve s':>10}")
+    for result in results:
+        clauses = result['clauses'] if result['clauses'] is not None else '-'
+        encode_time = f"{result['encode_time']:.3f}" if result['encode_time'] is not None else '-'
+        solve_time = f"{result['solve_time']:.3f}" if result['solve_time'] is not None else '-'
+        print(f"{result['circuit']:<14}{result['fault_type']:<11}{result['n_e']:>4}  {result['countermeasure']:<15}"
+              f"{result['status']:<11}{clauses:>9}{encode_time:>10}{solve_time:>10}")
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    summary = ', '.join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(f"{len(results)} jobs in {elapsed:.2f} seconds: {summary}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run a verification campaign over circuits x fault types x n_e x countermeasures in one process pool')
+    parser.add_argument('--spec', help='Campaign spec JSON with circuits, fault_types, n_e, countermeasures lists and options')
+    parser.add_argument('--circuits', nargs='+', help='Circuits to verify (overrides the spec)')
+    parser.add_argument('--fault-types', nargs='+', choices=FAULT_TYPES, help='Fault types (overrides the spec)')
+    parser.add_argument('--n-e', type=int, nargs='+', help='Fault bounds (overrides the spec)')
+    parser.add_argument('--countermeasures', nargs='+', choices=COUNTERMEASURES, help='Countermeasures (overrides the spec)')
+    parser.add_argument('--solver-cmd', metavar='CMD',
+                        help='External solver for every job, reads DIMACS on stdin and prints competition output')
+    parser.add_argument('--solver-timeout', type=float, metavar='SECONDS',
+                        help='Wall-clock limit of each solve, jobs that run out are reported as unknown')
+    parser.add_argument('--conflict-budget', type=int, metavar='N', help='Conflict limit of each solve')
+    parser.add_argument('--propagation-budget', type=int, metavar='N', help='Propagation limit of each solve')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU core, 1 runs in-process)')
+    parser.add_argument('--output', default=os.path.join(BASE_DIR, 'outputs', 'campaign'),
+                        help='Results path without extension, writes <output>.csv and <output>.json (default: outputs/campaign)')
+    parser.add_argument('--format', choices=['csv', 'json', 'both'], default='both', help='Results table format (default: both)')
+    parser.add_argument('--verbose', action='store_true', help='Log the encoder and solver messages of every job')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    try:
+        spec = load_spec(args.spec) if args.spec else {}
+        # Command line axes replace the spec's, bit-flip and detection are the defaults
+        spec = dict(spec)
+        spec['circuits'] = args.circuits or spec.get('circuits')
+        spec['fault_types'] = args.fault_types or spec.get('fault_types') or ['bit-flip']
+        spec['n_e'] = args.n_e or spec.get('n_e')
+        spec['countermeasures'] = args.countermeasures or spec.get('countermeasures') or ['detection']
+        # Solver options given on the command line replace the spec's
+        spec['options'] = dict(spec.get('options', {}))
+        for key in ('solver_cmd', 'solver_timeout', 'conflict_budget', 'propagation_budget'):
+            if getattr(args, key) is not None:
+                spec['options'][key] = getattr(args, key)
+        spec = validate_spec(spec)
+        if args.workers is not None and args.workers <= 0:
+            raise ValueError("workers must be a positive integer")
+
+        start_time = time.time()
+        results = run_campaign(spec, os.path.join(BASE_DIR, 'inputs'), args.workers,
+                               logging.INFO if args.verbose else logging.WARNING)
+        elapsed = time.time() - start_time
+    except (ValueError, FileNotFoundError) as e:
+        logging.error(f"Error: {e}")
+        sys.exit(1)
+
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    write_results(results, spec,
+                  f"{args.output}.csv" if args.format in ('csv', 'both') else None,
+                  f"{args.output}.json" if args.format in ('json', 'both') else None)
+    print_summary(results, elapsed)
+    if any(result['status'] == 'error' for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
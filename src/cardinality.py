@@ -0,0 +1,55 @@
+import logging
+from cli_args import CARD_ENCODINGS
+
+# Encodings PySAT only implements for at-most-one constraints
+AT_MOST_ONE_ONLY = ('pairwise', 'ladder')
+
+DEFAULT_CARD_ENCODING = 'seqcounter'
+
+# Choice table for 'auto', measured with `python src/benchmark.py cardinality`
+# Rows are (max control variables, max n_e, encoding); the first row whose
+# limits cover the constraint wins. On random duplicated netlists with 19 to
+# 2010 controls the sequential counter was fastest for n_e = 1 at every size
+# (pairwise and ladder fell 3-30x behind from 250 controls on) and all
+# encodings were within noise of each other up to 250 controls. Above that
+# cardnetwrk won for n_e = 2-4 and sortnetwrk for larger bounds.
+AUTO_TABLE = (
+    (None, 1, 'seqcounter'),
+    (256, None, 'seqcounter'),
+    (None, 4, 'cardnetwrk'),
+    (None, None, 'sortnetwrk'),
+)
+
+
+def encoding_names():
+    return list(CARD_ENCODINGS) + ['auto']
+
+
+def choose_encoding(n_lits, bound):
+    # Pick an encoding for an at-most-bound constraint over n_lits literals
+    for max_lits, max_bound, name in AUTO_TABLE:
+        if (max_lits is None or n_lits <= max_lits) and (max_bound is None or bound <= max_bound):
+            return name
+    return DEFAULT_CARD_ENCODING
+
+
+def resolve_encoding(name, n_lits, bound):
+    # Turn a configured encoding name into the one actually used for a constraint
+    if name == 'auto':
+        chosen = choose_encoding(n_lits, bound)
+        logging.info(f"Cardinality encoding 'auto' chose {chosen} for {n_lits} control variables, n_e = {bound}")
+        return chosen
+    if name not in CARD_ENCODINGS:
+        raise ValueError(f"Invalid cardinality encoding: {name}, valid encodings are: {encoding_names()}")
+    if name in AT_MOST_ONE_ONLY and bound > 1:
+        logging.warning(f"Cardinality encoding {name} only supports n_e = 1, using {DEFAULT_CARD_ENCODING}")
+        return DEFAULT_CARD_ENCODING
+    return name
+
+
+def atmost(lits, bound, top_id, encoding=DEFAULT_CARD_ENCODING):
+    # Encode sum(lits) <= bound, auxiliary variables are numbered after top_id
+    # Returns the pysat CNF; its nv is the highest variable in use afterwards
+    from pysat.card import CardEnc, EncType
+    name = resolve_encoding(encoding, len(lits), bound)
+    return CardEnc.atmost(lits, bound=bound, top_id=top_id, encoding=getattr(EncType, name))
@@ -0,0 +1,73 @@
+class CircuitGraph:
+    def __init__(self, nodes=None):
+        # Indexed view of a circuit netlist, built once at load time
+        # Keeps nodes by id, fan-in/fan-out adjacency and vulnerability flags so
+        # encoder and validator lookups are O(1) instead of scanning the node list
+        self.nodes = {}
+        self.order = []
+        self.fanin = {}
+        self.fanout = {}
+        self.vulnerable = set()
+
+        for node in nodes or []:
+            self.add_node(node)
+
+    def add_node(self, node):
+        # Register a single node and connect it to its inputs
+        # Inputs that have not been seen yet still get a fan-out entry, so the
+        # netlist does not have to be topologically ordered
+        node_id = node['id']
+        if node_id in self.nodes:
+            raise ValueError(f"Duplicate node id: {node_id}")
+
+        self.nodes[node_id] = node
+        self.order.append(node_id)
+
+        inputs = node.get('inputs') or []
+        self.fanin[node_id] = list(inputs)
+        self.fanout.setdefault(node_id, [])
+        for input_id in inputs:
+            self.fanout.setdefault(input_id, []).append(node_id)
+
+        if node.get('vulnerable', False):
+            self.vulnerable.add(node_id)
+
+    def __contains__(self, node_id):
+        return node_id in self.nodes
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def get_node(self, node_id):
+        # Return the node dict for an id, or None if the id is unknown
+        return self.nodes.get(node_id)
+
+    def is_vulnerable(self, node_id):
+        # Return True if the node is marked as a fault injection target
+        return node_id in self.vulnerable
+
+    def get_fanin(self, node_id):
+        # Return the ids of the nodes driving this node
+        return self.fanin.get(node_id, [])
+
+    def get_fanout(self, node_id):
+        # Return the ids of the nodes driven by this node
+        return self.fanout.get(node_id, [])
+
+    def nodes_of_type(self, node_type):
+        # Return all nodes of a given type, in netlist order
+        return [self.nodes[node_id] for node_id in self.order if self.nodes[node_id]['type'] == node_type]
+
+    def transitive_fanin(self, roots):
+        # Return the ids of the roots and every node they depend on, through registers too
+        seen = set()
+        stack = [root for root in roots if root in self.nodes]
+        while stack:
+            node_id = stack.pop()
+            if node_id in seen:
+                continue
+            seen.add(node_id)
+            for input_id in self.fanin.get(node_id, []):
+                if input_id in self.nodes and input_id not in seen:
+                    stack.append(input_id)
+        return seen
@@ -4,9 +4,28 @@ import json
 import logging
 import re
 import argparse
-import io
-from typing import Dict, List, Tuple, Set, Optional, Any
-from contextlib import redirect_stdout
+from itertools import islice
+from typing import Dict, List, Tuple, Set, Optional, Any, Iterator, Iterable, TextIO
+from binary_cnf import is_binary_cnf, load_binary_cnf
+
+
+# Order of pattern types for display
+PATTERN_ORDER = [
+    "XOR", 
+    "AND", 
+    "NOT", 
+    "MUX", 
+    "Constant", 
+    "Fault_Injection", 
+    "Comparison", 
+    "OR", 
+    "Register", 
+    "Output", 
+    "Countermeasure", 
+    "Fault_Constraint",
+    "AtMost",
+    "Unknown"
+]
 
 
 # Setup logging
@@ -29,8 +48,20 @@ def setup_logging():
     return logger
 
 
+def default_provenance_file(cnf_file: str) -> str:
+    # The encoder saves provenance as <circuit>_provenance.json next to the CNF
+    base = os.path.splitext(cnf_file)[0]
+    return f"{base}_provenance.json"
+
+
 # Main function
-def display_categorized_clauses(cnf_file: str, var_map_file: str) -> None:
+def write_categorized_clauses(
+    cnf_file: str, 
+    var_map_file: str, 
+    out: TextIO, 
+    provenance_file: Optional[str] = None, 
+    json_lines: bool = False
+) -> None:
     # Setup logging
     logger = setup_logging()
     
@@ -43,17 +74,26 @@ def display_categorized_clauses(cnf_file: str, var_map_file: str) -> None:
         logger.info(f"Loading variable mapping file: {var_map_file}")
         var_map = load_variable_map(var_map_file)
         
-        # Parse CNF file
-        logger.info(f"Parsing CNF file: {cnf_file}")
-        header, clauses = parse_cnf_file(cnf_file)
+        # Open the CNF file, clauses are read as the report is written
+        logger.info(f"Reading CNF file: {cnf_file}")
+        header, clauses = iter_cnf_file(cnf_file)
+        _, clause_count = parse_cnf_header(header)
         
-        # Group clauses by pattern
-        logger.info("Grouping clauses by pattern")
-        grouped_clauses = group_clauses_by_pattern(clauses, var_map)
+        # Group clauses by their recorded provenance, or guess from clause shapes
+        provenance = load_provenance(provenance_file or default_provenance_file(cnf_file), clause_count, logger)
+        if provenance is not None:
+            logger.info("Grouping clauses by provenance")
+            sections = iter_provenance_sections(clauses, provenance, var_map)
+        else:
+            logger.info("Grouping clauses by pattern")
+            sections = iter_grouped_sections(group_clauses_by_pattern(list(clauses), var_map))
         
-        # Display grouped clauses
+        # Write the report section by section
         logger.info("Generating categorized clause display")
-        display_clauses(circuit_name, header, grouped_clauses, var_map)
+        report = iter_report_records if json_lines else iter_report_lines
+        for line in report(circuit_name, header, sections, var_map):
+            out.write(line)
+            out.write("\n")
         
         logger.info("Done")
     
@@ -68,6 +108,15 @@ def display_categorized_clauses(cnf_file: str, var_map_file: str) -> None:
         raise
 
 
+def display_categorized_clauses(
+    cnf_file: str, 
+    var_map_file: str, 
+    provenance_file: Optional[str] = None, 
+    json_lines: bool = False
+) -> None:
+    write_categorized_clauses(cnf_file, var_map_file, sys.stdout, provenance_file, json_lines)
+
+
 def load_variable_map(var_map_file: str) -> Dict:
     try:
         with open(var_map_file, 'r') as f:
@@ -79,43 +128,91 @@ def load_variable_map(var_map_file: str) -> Dict:
         raise ValueError(f"Invalid variable mapping file format: {var_map_file}")
 
 
-def parse_cnf_file(cnf_file: str) -> Tuple[str, List[List[int]]]:
-  
+def load_provenance(provenance_file: str, clause_count: int, logger: logging.Logger) -> Optional[Dict]:
+    # Load clause provenance saved by the encoder
+    # Returns None when there is none or it belongs to a different formula
+    if not os.path.isfile(provenance_file):
+        logger.warning(f"No clause provenance at {provenance_file}, falling back to pattern matching")
+        return None
     try:
-        with open(cnf_file, 'r') as f:
-            lines = f.readlines()
-        
-        header = ""
-        clauses = []
-        
-        for line in lines:
+        with open(provenance_file, 'r') as f:
+            provenance = json.load(f)
+    except json.JSONDecodeError:
+        raise ValueError(f"Invalid clause provenance file format: {provenance_file}")
+    if "positions" not in provenance:
+        logger.warning(f"Clause provenance {provenance_file} has an older format, falling back to pattern matching")
+        return None
+    if provenance.get("clauses") != clause_count:
+        logger.warning(f"Clause provenance {provenance_file} covers {provenance.get('clauses')} clauses, "
+                       f"CNF has {clause_count}, falling back to pattern matching")
+        return None
+    return provenance
+
+
+def _iter_dimacs_clauses(f: TextIO, cnf_file: str) -> Iterator[List[int]]:
+    # Yield the clauses of an open DIMACS file, closing it at the end
+    with f:
+        for line in f:
             line = line.strip()
             
             # Skip empty lines and comment lines
             if not line or line.startswith('c'):
                 continue
             
-            # Parse header line
-            if line.startswith('p cnf'):
-                header = line
-                continue
-            
             # Parse clause line
-            clause = [int(x) for x in line.split() if x != '0']
+            try:
+                clause = [int(x) for x in line.split() if x != '0']
+            except ValueError:
+                raise ValueError(f"Invalid CNF file format: {cnf_file}")
             if clause:  # Ensure clause is not empty
-                clauses.append(clause)
-        
-        if not header:
-            raise ValueError(f"CNF file missing header: {cnf_file}")
-        
-        return header, clauses
+                yield clause
+
+
+def iter_cnf_file(cnf_file: str) -> Tuple[str, Iterator[List[int]]]:
+    """
+    Read a CNF file's header and return its clauses as a lazy iterator.
+    
+    Args:
+        cnf_file: Path to a DIMACS or binary CNF file
     
+    Returns:
+        Tuple[str, Iterator[List[int]]]: The 'p cnf' header line and the clauses in file order
+    """
+    # Binary CNF files are memory-mapped instead of parsed
+    if os.path.isfile(cnf_file) and is_binary_cnf(cnf_file):
+        store = load_binary_cnf(cnf_file)
+        return f"p cnf {store.nv} {len(store)}", store.iter_clauses()
+    
+    try:
+        f = open(cnf_file, 'r')
     except FileNotFoundError:
         raise FileNotFoundError(f"CNF file not found: {cnf_file}")
-    except ValueError as e:
-        if str(e).startswith("CNF file missing header"):
-            raise
-        raise ValueError(f"Invalid CNF file format: {cnf_file}")
+    
+    # The header precedes the clauses, only comments may come before it
+    for line in f:
+        line = line.strip()
+        if not line or line.startswith('c'):
+            continue
+        if line.startswith('p cnf'):
+            return line, _iter_dimacs_clauses(f, cnf_file)
+        break
+    
+    f.close()
+    raise ValueError(f"CNF file missing header: {cnf_file}")
+
+
+def parse_cnf_file(cnf_file: str) -> Tuple[str, List[List[int]]]:
+    # Read a whole CNF file into a list of clauses
+    header, clauses = iter_cnf_file(cnf_file)
+    return header, list(clauses)
+
+
+def parse_cnf_header(header: str) -> Tuple[int, int]:
+    # Variable and clause counts of a 'p cnf' header line
+    match = re.search(r'p cnf (\d+) (\d+)', header)
+    if not match:
+        raise ValueError(f"Invalid CNF header: {header}")
+    return int(match.group(1)), int(match.group(2))
 
 
 def group_clauses_by_pattern(clauses: List[List[int]], var_map: Dict) -> Dict[str, Dict[str, Dict[str, Any]]]:
@@ -132,6 +229,10 @@ def group_clauses_by_pattern(clauses: List[List[int]], var_map: Dict) -> Dict[st
     # Initialize grouping dictionary
     grouped = {
         "XOR": {},           # XOR logic clauses
+        "AND": {},           # AND gate clauses
+        "NOT": {},           # NOT gate clauses
+        "MUX": {},           # MUX gate clauses
+        "Constant": {},      # Constant node clauses
         "Fault_Injection": {},  # Fault injection clauses
         "Comparison": {},    # Comparison clauses
         "OR": {},            # OR gate clauses
@@ -589,6 +690,99 @@ def group_clauses_by_pattern(clauses: List[List[int]], var_map: Dict) -> Dict[st
     return grouped
 
 
+# Display pattern, group id and explanation per provenance category
+FAULT_NAMES = {'bit-flip': 'Bit-flip', 'set': 'Set', 'reset': 'Reset'}
+CONSTRAINT_GROUPS = {
+    'countermeasure': ("Countermeasure", "flag", "Detection: flag = 0"),
+    'at_least_one': ("Fault_Constraint", "at_least_one_control", "At least 1 fault constraint"),
+    'at_most': ("AtMost", "atmost_constraints", "Fault number constraints (AtMost)"),
+    'fault_counter': ("AtMost", "atmost_constraints", "Fault number constraints (AtMost)"),
+}
+
+
+def _explain_origin(category: str, node: List, fault_type: str, faulty_outputs: Dict) -> Tuple[str, str, str]:
+    # Pattern type, group id and explanation of a gate or fault logic run
+    node_id, node_type, inputs = node
+    red = " (Redundant)" if node_id.endswith('_red') else ""
+    if category == 'fault':
+        fault_name = FAULT_NAMES.get(fault_type, fault_type)
+        return "Fault_Injection", node_id, f"{fault_name} fault on {node_id}: control_{node_id} {node_id} {node_id}_faulty"
+    if category == 'cmp':
+        names = [f"{i}_faulty" if f"{i}_faulty" in faulty_outputs else i for i in inputs]
+        return "Comparison", node_id, f"{names[0]} XOR {names[1]} = {node_id} (Fault Detection)"
+    if category == 'or':
+        return "OR", node_id, f"{' OR '.join(inputs)} = {node_id} (OR Gate Definition)"
+    if category in ('xor', 'and'):
+        return category.upper(), node_id, f"{f' {category.upper()} '.join(inputs)} = {node_id}{red}"
+    if category == 'not':
+        return "NOT", node_id, f"NOT {inputs[0]} = {node_id}{red}"
+    if category == 'mux':
+        return "MUX", node_id, f"{inputs[2]} ? {inputs[1]} : {inputs[0]} = {node_id}{red}"
+    if category == 'reg':
+        return "Register", node_id, f"{inputs[0]} = {node_id} (Register Connection)"
+    if category == 'output':
+        return "Output", node_id, f"{inputs[0]} = {node_id} (Output)"
+    if category in ('const0', 'const1'):
+        return "Constant", node_id, f"{node_id} = {category[-1]}"
+    return "Unknown", node_id, f"{category} clauses of {node_id}"
+
+
+def iter_provenance_sections(
+    clauses: Iterable[List[int]], 
+    provenance: Dict, 
+    var_map: Dict
+) -> Iterator[Tuple[str, str, str, Iterator[List[int]]]]:
+    """
+    Split clauses into report sections by the origin the encoder recorded for them.
+    
+    Sections come in emission order and consecutive runs of the same group are
+    merged. Each section's clauses are read lazily from the shared clause
+    iterator, so they must be consumed before the next section is requested.
+    
+    Args:
+        clauses: Clauses in file order
+        provenance: Clause provenance saved by the encoder
+        var_map: Variable mapping dictionary
+    
+    Yields:
+        Tuple[str, str, str, Iterator[List[int]]]: Pattern type, group id, explanation and clauses
+    """
+    categories = provenance["categories"]
+    # Runs refer to nodes by netlist position, the table holds the referenced ones
+    nodes = dict(zip(provenance["positions"], provenance["nodes"]))
+    fault_type = provenance.get("fault_type")
+    faulty_outputs = var_map.get("faulty_outputs", {})
+    ends = provenance["ends"]
+    run_categories = provenance["category"]
+    run_nodes = provenance["node"]
+    
+    def resolve(run):
+        category = categories[run_categories[run]]
+        if category in CONSTRAINT_GROUPS:
+            return CONSTRAINT_GROUPS[category]
+        return _explain_origin(category, nodes[run_nodes[run]], fault_type, faulty_outputs)
+    
+    clause_iter = iter(clauses)
+    start = 0
+    run = 0
+    while run < len(ends):
+        pattern_type, group_id, explanation = resolve(run)
+        end = ends[run]
+        run += 1
+        while run < len(ends) and resolve(run)[:2] == (pattern_type, group_id):
+            end = ends[run]
+            run += 1
+        yield pattern_type, group_id, explanation, islice(clause_iter, end - start)
+        start = end
+
+
+def iter_grouped_sections(grouped_clauses: Dict[str, Dict[str, Dict[str, Any]]]) -> Iterator[Tuple[str, str, str, List[List[int]]]]:
+    # Report sections of already grouped clauses, by pattern type then group
+    for pattern_type in PATTERN_ORDER:
+        for group_id, group_data in sorted(grouped_clauses.get(pattern_type, {}).items()):
+            yield pattern_type, group_id, group_data["explanation"], group_data["clauses"]
+
+
 def get_human_readable_clause(
     clause: List[int], 
     node_var_nums: Dict[int, str], 
@@ -622,86 +816,102 @@ def get_human_readable_clause(
     return f"({' ∨ '.join(literals)})"
 
 
-def display_clauses(
-    circuit_name: str, 
-    header: str, 
-    grouped_clauses: Dict[str, Dict[str, Dict[str, Any]]], 
-    var_map: Dict
-) -> None:
-    
-    # Extract variable and clause counts
-    match = re.search(r'p cnf (\d+) (\d+)', header)
-    if not match:
-        raise ValueError(f"Invalid CNF header: {header}")
-    
-    var_count = match.group(1)
-    clause_count = match.group(2)
-    
-    # Print circuit info and header
-    print(f"c Circuit: {circuit_name}")
-    print(f"c Variable Count: {var_count}, Clause Count: {clause_count}")
-    print(header)
-    
-    # Get variable mappings
+def _variable_names(var_map: Dict) -> Tuple[Dict[int, str], Dict[int, str], Dict[int, str]]:
+    # Node, control and faulty output names by variable number
     var_to_node = var_map["var_to_node"]
     node_var_nums = {int(k): v for k, v in var_to_node["nodes"].items()}
     control_var_nums = {int(k): v for k, v in var_to_node["controls"].items()}
     faulty_output_nums = {int(k): v for k, v in var_to_node["faulty_outputs"].items()}
+    return node_var_nums, control_var_nums, faulty_output_nums
+
+
+def iter_report_lines(
+    circuit_name: str, 
+    header: str, 
+    sections: Iterable[Tuple[str, str, str, Iterable[List[int]]]], 
+    var_map: Dict
+) -> Iterator[str]:
+    # Lines of the human-readable report, one section at a time
+    var_count, clause_count = parse_cnf_header(header)
+    names = _variable_names(var_map)
+    
+    # Circuit info and header
+    yield f"c Circuit: {circuit_name}"
+    yield f"c Variable Count: {var_count}, Clause Count: {clause_count}"
+    yield header
+    
+    for pattern_type, group_id, explanation, clauses in sections:
+        # Section header
+        yield "c --------------------------------------------------"
+        yield f"c {pattern_type} ({group_id})"
+        yield f"c Explanation: {explanation}"
+        yield "c"
+        
+        # Clauses
+        for clause in clauses:
+            dimacs = " ".join([str(v) for v in clause]) + " 0"
+            human_readable = get_human_readable_clause(clause, *names)
+            yield f"{dimacs}  c {human_readable}"
+        
+        # Separator after group
+        yield "c"
+
+
+def iter_report_records(
+    circuit_name: str, 
+    header: str, 
+    sections: Iterable[Tuple[str, str, str, Iterable[List[int]]]], 
+    var_map: Dict
+) -> Iterator[str]:
+    """
+    JSON Lines form of the report, one JSON object per line.
     
-    # Order of pattern types for display
-    pattern_order = [
-        "XOR", 
-        "Fault_Injection", 
-        "Comparison", 
-        "OR", 
-        "Register", 
-        "Output", 
-        "Countermeasure", 
-        "Fault_Constraint",
-        "AtMost",
-        "Unknown"
-    ]
+    The first record describes the circuit, each section starts with a group
+    record followed by one clause record per clause. Clause records repeat
+    their pattern type and group so they can be filtered on their own.
     
-    # Display grouped clauses
-    for pattern_type in pattern_order:
-        if not grouped_clauses[pattern_type]:
-            continue
-        
-        for group_id, group_data in sorted(grouped_clauses[pattern_type].items()):
-            explanation = group_data["explanation"]
-            clauses = group_data["clauses"]
-            
-            # Print section header
-            print(f"c --------------------------------------------------")
-            print(f"c {pattern_type} ({group_id})")
-            print(f"c Explanation: {explanation}")
-            print(f"c")
-            
-            # Print clauses
-            for clause in clauses:
-                dimacs = " ".join([str(v) for v in clause]) + " 0"
-                human_readable = get_human_readable_clause(clause, node_var_nums, control_var_nums, faulty_output_nums)
-                print(f"{dimacs}  c {human_readable}")
-            
-            # Add separator after group
-            print(f"c")
+    Args:
+        circuit_name: Circuit name
+        header: The CNF 'p cnf' header line
+        sections: Report sections as pattern type, group id, explanation and clauses
+        var_map: Variable mapping dictionary
+    
+    Yields:
+        str: One JSON record per line
+    """
+    var_count, clause_count = parse_cnf_header(header)
+    names = _variable_names(var_map)
+    
+    yield json.dumps({"type": "circuit", "circuit": circuit_name, "variables": var_count, "clauses": clause_count})
+    for pattern_type, group_id, explanation, clauses in sections:
+        yield json.dumps({"type": "group", "pattern": pattern_type, "group": group_id, "explanation": explanation},
+                         ensure_ascii=False)
+        for clause in clauses:
+            yield json.dumps({
+                "type": "clause",
+                "pattern": pattern_type,
+                "group": group_id,
+                "clause": list(clause),
+                "readable": get_human_readable_clause(clause, *names),
+            }, ensure_ascii=False)
 
 
-def save_categorized_clauses(cnf_file: str, var_map_file: str, output_file: str) -> None:
+def save_categorized_clauses(
+    cnf_file: str, 
+    var_map_file: str, 
+    output_file: str, 
+    provenance_file: Optional[str] = None, 
+    json_lines: bool = False
+) -> None:
 
     # Ensure output directory exists
     output_dir = os.path.dirname(output_file)
     if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir, exist_ok=True)
     
-    # Capture output
-    f = io.StringIO()
-    with redirect_stdout(f):
-        display_categorized_clauses(cnf_file, var_map_file)
-    
-    # Write to file
+    # Sections are written as they are produced, the report is never held in memory
     with open(output_file, 'w', encoding='utf-8') as out_file:
-        out_file.write(f.getvalue())
+        write_categorized_clauses(cnf_file, var_map_file, out_file, provenance_file, json_lines)
 
 
 def main():
@@ -711,8 +921,10 @@ def main():
     )
     
     # Add command line arguments
-    parser.add_argument('cnf_file', help='Path to the CNF file')
+    parser.add_argument('cnf_file', help='Path to the CNF file (DIMACS or binary)')
     parser.add_argument('var_map_file', help='Path to the variable mapping JSON file')
+    parser.add_argument('-p', '--provenance', help='Path to the clause provenance JSON file (default: <cnf base>_provenance.json)')
+    parser.add_argument('--jsonl', action='store_true', help='Write the report as JSON Lines (one record per group and per clause)')
     parser.add_argument('-o', '--output', help='Path to the output file (if not specified, output to standard output)')
     
     # Parse command line arguments
@@ -730,10 +942,10 @@ def main():
     try:
         # If output file specified, save to file, otherwise output to standard output
         if args.output:
-            save_categorized_clauses(args.cnf_file, args.var_map_file, args.output)
+            save_categorized_clauses(args.cnf_file, args.var_map_file, args.output, args.provenance, args.jsonl)
             print(f"Categorized clauses saved to: {args.output}")
         else:
-            display_categorized_clauses(args.cnf_file, args.var_map_file)
+            display_categorized_clauses(args.cnf_file, args.var_map_file, args.provenance, args.jsonl)
     
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
@@ -0,0 +1,148 @@
+from array import array
+from itertools import accumulate, islice
+
+
+class ClauseStore:
+    def __init__(self, clauses=None):
+        # Compact clause container backed by two flat integer arrays
+        # lits holds every literal back to back, offsets[i]:offsets[i + 1] is clause i
+        # Replaces pysat's CNF (a list of Python lists) for large formulas
+        self.lits = array('i')
+        self.offsets = array('q', [0])
+        self.nv = 0
+
+        if clauses:
+            self.extend(clauses)
+
+    @classmethod
+    def from_arrays(cls, lits, offsets, nv=None):
+        # Build a store around existing literal and offset buffers without copying
+        # Any buffer supporting len(), indexing and slicing works (array, memoryview)
+        store = cls()
+        store.lits = lits
+        store.offsets = offsets
+        if nv is None:
+            nv = max((abs(lit) for lit in lits), default=0)
+        store.nv = nv
+        return store
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        return self.iter_clauses()
+
+    def __getitem__(self, index):
+        # Return clause number index as a list of literals
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("clause index out of range")
+        return self.lits[self.offsets[index]:self.offsets[index + 1]].tolist()
+
+    def iter_clauses(self, start=0, end=None):
+        # Yield clauses start..end-1 as lists of literals
+        lits = self.lits
+        offsets = self.offsets
+        end = len(self) if end is None else end
+        for i in range(start, end):
+            yield lits[offsets[i]:offsets[i + 1]].tolist()
+
+    @property
+    def clauses(self):
+        # Materialize all clauses as a list of lists (for small formulas and debugging)
+        return list(self.iter_clauses())
+
+    def clause_length(self, index):
+        return self.offsets[index + 1] - self.offsets[index]
+
+    def append(self, clause):
+        # Add a single clause
+        self.lits.extend(clause)
+        self.offsets.append(len(self.lits))
+        for lit in clause:
+            if lit > self.nv:
+                self.nv = lit
+            elif -lit > self.nv:
+                self.nv = -lit
+
+    def extend(self, clauses):
+        # Add an iterable of clauses
+        for clause in clauses:
+            self.append(clause)
+
+    def extend_fixed(self, lits, width):
+        # Bulk-add clauses that all have the same width from a flat literal sequence
+        # e.g. extend_fixed((a, b, -c, -a, -b, c), 3) adds two 3-literal clauses
+        count = len(lits) // width
+        if count * width != len(lits):
+            raise ValueError(f"Literal count {len(lits)} is not a multiple of clause width {width}")
+
+        base = len(self.lits)
+        self.lits.extend(lits)
+        self.offsets.extend(range(base + width, base + width * count + 1, width))
+        self._update_nv(lits)
+
+    def extend_flat(self, lits, lengths):
+        # Bulk-add clauses from a flat literal sequence and the length of each clause
+        if sum(lengths) != len(lits):
+            raise ValueError(f"Clause lengths sum to {sum(lengths)} but {len(lits)} literals were given")
+
+        base = len(self.lits)
+        self.lits.extend(lits)
+        self.offsets.extend(base + end for end in accumulate(lengths))
+        self._update_nv(lits)
+
+    def extend_buffers(self, lits, offsets, nv):
+        # Bulk-add clauses from raw buffers without touching individual clauses
+        # lits is a contiguous int32 buffer, offsets a contiguous int64 buffer with the
+        # end of each clause as an absolute position in this store's literal array
+        self.lits.frombytes(memoryview(lits).cast('B'))
+        self.offsets.frombytes(memoryview(offsets).cast('B'))
+        if nv > self.nv:
+            self.nv = nv
+
+    def _update_nv(self, lits):
+        if len(lits):
+            top = max(max(lits), -min(lits))
+            if top > self.nv:
+                self.nv = top
+
+    def nbytes(self):
+        # Memory held by the literal and offset buffers
+        return len(self.lits) * self.lits.itemsize + len(self.offsets) * self.offsets.itemsize
+
+    def add_to_solver(self, solver, start=0):
+        # Feed clauses start.. to a PySAT solver straight from the literal buffer
+        # Each clause is a memoryview slice of it, no per-clause list is built
+        lits = memoryview(self.lits)
+        offsets = self.offsets
+        add_clause = solver.add_clause
+        for begin, end in zip(islice(offsets, start, None), islice(offsets, start + 1, None)):
+            add_clause(lits[begin:end])
+
+    def to_cnf(self):
+        # Convert to a pysat CNF object (allocates one list per clause)
+        from pysat.formula import CNF
+        cnf = CNF(from_clauses=self.clauses)
+        cnf.nv = max(cnf.nv, self.nv)
+        return cnf
+
+    def iter_dimacs(self, comments=None):
+        # Yield the formula as DIMACS text lines, same layout as pysat's CNF.to_fp
+        for comment in comments or []:
+            yield f"{comment}\n"
+        yield f"p cnf {self.nv} {len(self)}\n"
+        lits = self.lits
+        offsets = self.offsets
+        for i in range(len(offsets) - 1):
+            yield ' '.join(map(str, lits[offsets[i]:offsets[i + 1]])) + ' 0\n'
+
+    def to_fp(self, file_pointer, comments=None):
+        # Write the formula to an open text file in DIMACS format
+        file_pointer.writelines(self.iter_dimacs(comments))
+
+    def to_file(self, fname, comments=None):
+        # Write the formula to a DIMACS file
+        with open(fname, 'w') as f:
+            self.to_fp(f, comments)
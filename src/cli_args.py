@@ -0,0 +1,259 @@
+import os
+import logging
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Defaults and choice lists of the stage options, kept here so the parser
+# builds without importing the stage modules, which import them from here
+
+# PySAT backends raced by default in portfolio mode
+PORTFOLIO_SOLVERS = ('g4', 'cd19', 'lgl', 'mcb', 'm22')
+
+# PySAT cardinality encodings selectable for the fault number constraint, by
+# their pysat.card.EncType names (pysat is only imported once one is encoded)
+CARD_ENCODINGS = (
+    'pairwise',
+    'ladder',
+    'seqcounter',
+    'sortnetwrk',
+    'cardnetwrk',
+    'totalizer',
+    'mtotalizer',
+    'kmtotalizer',
+)
+
+BINARY_CNF_SUFFIX = '.bcnf'
+
+# Size limit of the formula cache
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+SELF_CHECK_LEVELS = ('off', 'structural', 'full')
+
+# Random patterns and seconds spent looking for a counterexample by default
+DEFAULT_PATTERNS = 1024
+DEFAULT_BUDGET = 10.0
+
+# Unix domain socket the verification server listens on and the client connects to
+DEFAULT_SOCKET = os.path.join(BASE_DIR, 'outputs', 'server.sock')
+
+# Request fields the verification server answers from warm state, with their
+# defaults (names match the argument destinations of build_parser)
+REQUEST_FIELDS = {
+    "circuit": None,
+    "n_e": None,
+    "fault_type": None,
+    "countermeasure": None,
+    "card_encoding": None,
+    "batch_encode": False,
+    "slice": False,
+    "strash": False,
+    "polarity": False,
+    "self_check": 'off',
+    "sweep_n_e": None,
+    "solver_timeout": None,
+    "conflict_budget": None,
+    "propagation_budget": None,
+}
+
+
+def validate_args(args):
+    valid_circuits = ['lfsr', 'xor_cipher', 'sbox', 'shift_cipher', 'mixcolumn']
+    if args.circuit not in valid_circuits:
+        logging.error(f"Error: Invalid circuit name. Please choose from: {', '.join(valid_circuits)}")
+        return False
+    
+    # Check n_e
+    if args.n_e is not None and args.n_e <= 0:
+        logging.error("Error: n_e must be a positive integer")
+        return False
+    
+    # Check cycle count
+    if args.cycles is not None and args.cycles <= 0:
+        logging.error("Error: cycles must be a positive integer")
+        return False
+    
+    # Check sweep bound
+    if args.sweep_n_e is not None and args.sweep_n_e <= 0:
+        logging.error("Error: sweep bound must be a positive integer")
+        return False
+    
+    # Check worker count
+    if args.parallel is not None and args.parallel < 0:
+        logging.error("Error: parallel worker count must not be negative")
+        return False
+    if args.parallel is not None and args.use_minisat:
+        logging.error("Error: parallel solving needs the PySAT library solver")
+        return False
+    
+    # Check cube-and-conquer, it runs on the --parallel worker pool
+    if args.cubes is not None:
+        if args.cubes < 0:
+            logging.error("Error: cube count must not be negative")
+            return False
+        if args.use_minisat or args.cycles is not None or args.sweep_n_e is not None or args.enumerate:
+            logging.error("Error: --cubes cannot be combined with --use-minisat, --cycles, --sweep-n-e or --enumerate")
+            return False
+    
+    # Check portfolio solvers
+    if args.portfolio is not None:
+        from parallel_solver import solver_names
+        unknown = [name for name in args.portfolio if name not in solver_names()]
+        if unknown:
+            logging.error(f"Error: Unknown portfolio solvers: {', '.join(unknown)}")
+            return False
+        if args.use_minisat or args.parallel is not None or args.cubes is not None:
+            logging.error("Error: portfolio solving cannot be combined with --use-minisat, --parallel or --cubes")
+            return False
+    
+    # Check the external solver options, incremental modes need the PySAT library
+    if args.solver_cmd is not None:
+        if args.use_minisat or args.parallel is not None or args.portfolio is not None or args.cubes is not None:
+            logging.error("Error: --solver-cmd cannot be combined with --use-minisat, --parallel, --portfolio or --cubes")
+            return False
+        if args.cycles is not None or args.sweep_n_e is not None or args.enumerate:
+            logging.error("Error: --solver-cmd cannot be combined with --cycles, --sweep-n-e or --enumerate")
+            return False
+    
+    # Check solving budgets, they bound the single-solver library and external runs and the n_e sweep
+    for name, value in (('solver-timeout', args.solver_timeout), ('conflict-budget', args.conflict_budget),
+                        ('propagation-budget', args.propagation_budget), ('progress', args.progress)):
+        if value is None:
+            continue
+        if value <= 0:
+            logging.error(f"Error: --{name} must be positive")
+            return False
+        if (args.use_minisat or args.parallel is not None or args.portfolio is not None or args.cubes is not None
+                or args.cycles is not None or args.enumerate):
+            logging.error(f"Error: --{name} cannot be combined with --use-minisat, --parallel, --portfolio, --cubes, --cycles or --enumerate")
+            return False
+        if args.solver_cmd is not None and name != 'solver-timeout':
+            logging.error(f"Error: --{name} needs the PySAT library solver, only --solver-timeout bounds --solver-cmd")
+            return False
+    
+    # Check simulation options, the simulator needs the whole netlist of a single-cycle check
+    if args.simulate is not None:
+        if args.simulate <= 0:
+            logging.error("Error: simulated pattern count must be a positive integer")
+            return False
+        if args.stream or args.load_cnf is not None or args.cycles is not None or args.sweep_n_e is not None or args.enumerate:
+            logging.error("Error: --simulate cannot be combined with --stream, --load-cnf, --cycles, --sweep-n-e or --enumerate")
+            return False
+    if args.simulate_budget is not None:
+        if args.simulate is None:
+            logging.error("Error: --simulate-budget needs --simulate")
+            return False
+        if args.simulate_budget <= 0:
+            logging.error("Error: --simulate-budget must be positive")
+            return False
+    
+    # Check enumeration limits
+    if args.max_vectors is not None and args.max_vectors <= 0:
+        logging.error("Error: max-vectors must be a positive integer")
+        return False
+    if args.time_budget is not None and args.time_budget <= 0:
+        logging.error("Error: time budget must be a positive number of seconds")
+        return False
+    
+    # Check saved formula options, the external solver reads DIMACS only
+    if args.use_minisat and args.cnf_format == 'binary':
+        logging.error("Error: --use-minisat needs a DIMACS file, use --cnf-format dimacs or both")
+        return False
+    if args.load_cnf is not None:
+        from binary_cnf import is_binary_cnf
+        if not os.path.isfile(args.load_cnf):
+            logging.error(f"Error: CNF file not found: {args.load_cnf}")
+            return False
+        if args.use_minisat and is_binary_cnf(args.load_cnf):
+            logging.error("Error: --use-minisat needs a DIMACS file, convert it with src/binary_cnf.py")
+            return False
+        if args.stream:
+            logging.error("Error: --load-cnf cannot be combined with --stream")
+            return False
+    
+    # Check formula cache size
+    if args.cache_size <= 0:
+        logging.error("Error: cache size must be a positive number of megabytes")
+        return False
+    
+    # Check fault type
+    valid_fault_types = ['bit-flip', 'set', 'reset']
+    if args.fault_type is not None and args.fault_type not in valid_fault_types:
+        logging.error(f"Error: Invalid fault type. Please choose from: {', '.join(valid_fault_types)}")
+        return False
+    
+    # Check countermeasure type
+    valid_countermeasures = ['detection', 'correction']
+    if args.countermeasure is not None and args.countermeasure not in valid_countermeasures:
+        logging.error(f"Error: Invalid countermeasure type. Please choose from: {', '.join(valid_countermeasures)}")
+        return False
+    
+    return True
+
+
+def build_parser():
+    # Command-line arguments of main.py, the verification client adds its own to them
+    parser = argparse.ArgumentParser(description='Verify fault injection resistance of cryptographic circuits')
+    parser.add_argument('circuit', help='Circuit name (lfsr, xor_cipher, sbox, shift_cipher, mixcolumn)')
+    parser.add_argument('--use-minisat', action='store_true', help='Use external MiniSAT solver')
+    parser.add_argument('--n_e', type=int, help='Maximum number of faults per clock cycle (overrides JSON value)')
+    parser.add_argument('--fault-type', choices=['bit-flip', 'set', 'reset'], 
+                        help='Fault type (overrides JSON value)')
+    parser.add_argument('--countermeasure', choices=['detection', 'correction'], 
+                        help='Countermeasure type (overrides JSON value)')
+    parser.add_argument('--no-categorize', action='store_true', 
+                        help='Skip generating categorized clauses output')
+    parser.add_argument('--batch-encode', action='store_true',
+                        help='Encode gates type by type with NumPy (same CNF, faster on large circuits)')
+    parser.add_argument('--slice', action='store_true',
+                        help='Encode only the cone of influence of the flag and comparator nodes')
+    parser.add_argument('--polarity', action='store_true',
+                        help='Emit only the gate clause directions the countermeasure constraint needs (Plaisted-Greenbaum)')
+    parser.add_argument('--strash', action='store_true',
+                        help='Merge structurally identical gates and fold constants and double negations before encoding')
+    parser.add_argument('--cnf-format', choices=['dimacs', 'binary', 'both'], default='dimacs',
+                        help=f'Format of the saved formula: outputs/<circuit>.cnf (DIMACS) or outputs/<circuit>{BINARY_CNF_SUFFIX} (binary, memory-mappable)')
+    parser.add_argument('--load-cnf', metavar='FILE',
+                        help='Solve a saved formula (DIMACS or binary) instead of encoding, using the saved variable map')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always encode, without reading or writing the formula cache in outputs/cache')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), metavar='MB',
+                        help='Size limit of the formula cache, least recently used formulas are evicted (default: 256)')
+    parser.add_argument('--self-check', choices=SELF_CHECK_LEVELS, default='off',
+                        help='Verify the encoded formula: clause ranges and counts (structural) or every expected clause (full), in linear time (default: off)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Read and encode the netlist incrementally instead of loading the whole JSON')
+    parser.add_argument('--card-encoding', choices=list(CARD_ENCODINGS) + ['auto'],
+                        help='Cardinality encoding of the fault number constraint (overrides JSON value, auto picks by circuit size)')
+    parser.add_argument('--parallel', type=int, nargs='?', const=0, metavar='WORKERS',
+                        help='Shard the fault locations over worker processes (default: one per CPU core)')
+    parser.add_argument('--portfolio', nargs='?', const=','.join(PORTFOLIO_SOLVERS), type=lambda value: value.split(','),
+                        metavar='SOLVERS',
+                        help=f"Race comma-separated PySAT solvers, first answer wins (default: {','.join(PORTFOLIO_SOLVERS)})")
+    parser.add_argument('--cubes', type=int, nargs='?', const=0, metavar='N',
+                        help='Cube-and-conquer: split on inputs and fault controls into about N cubes solved by the '
+                             '--parallel workers (default: 4 per worker)')
+    parser.add_argument('--solver-cmd', metavar='CMD',
+                        help="External solver reading DIMACS on stdin and printing competition output, e.g. 'kissat -q'")
+    parser.add_argument('--solver-timeout', type=float, metavar='SECONDS',
+                        help='Wall-clock limit of each solve, the verdict is UNKNOWN when it runs out')
+    parser.add_argument('--conflict-budget', type=int, metavar='N', help='Conflict limit of each solve (verdict UNKNOWN when exceeded)')
+    parser.add_argument('--propagation-budget', type=int, metavar='N',
+                        help='Propagation limit of each solve (verdict UNKNOWN when exceeded)')
+    parser.add_argument('--progress', type=float, metavar='SECONDS',
+                        help='Log conflicts, decisions and propagations per second every this many seconds while solving')
+    parser.add_argument('--simulate', type=int, nargs='?', const=DEFAULT_PATTERNS, metavar='PATTERNS',
+                        help=f'Look for a counterexample by bit-parallel random simulation first, SAT only runs '
+                             f'if none is found (default: {DEFAULT_PATTERNS} patterns)')
+    parser.add_argument('--simulate-budget', type=float, metavar='SECONDS',
+                        help=f'Time limit of the simulation (default: {DEFAULT_BUDGET:g} seconds)')
+    parser.add_argument('--enumerate', action='store_true',
+                        help='Enumerate all minimal fault vectors into outputs/<circuit>_fault_vectors.jsonl')
+    parser.add_argument('--max-vectors', type=int, metavar='N', help='Stop enumerating after N fault vectors')
+    parser.add_argument('--time-budget', type=float, metavar='SECONDS', help='Stop enumerating after this many seconds')
+    parser.add_argument('--cycles', type=int,
+                        help='Unroll the circuit over this many clock cycles (fault budget: n_e per cycle, n_c cycles)')
+    parser.add_argument('--sweep-n-e', type=int, metavar='K',
+                        help='Check n_e = 1..K with one incremental solver, stopping at the first vulnerable bound')
+    parser.add_argument('--debug', action='store_true', help='Log debug messages (default: info and above)')
+    return parser
@@ -0,0 +1,97 @@
+import sys
+import json
+import socket
+import logging
+from cli_args import build_parser, validate_args, DEFAULT_SOCKET, REQUEST_FIELDS
+
+
+def build_request(args, defaults):
+    # Request fields from the main.py arguments, options the server cannot answer
+    # from warm state are rejected rather than silently ignored
+    unsupported = [name for name, value in vars(args).items()
+                   if name not in REQUEST_FIELDS and name not in ('socket', 'port') and value != defaults[name]]
+    if unsupported:
+        raise ValueError(f"Not supported by the verification server, run main.py for: "
+                         f"{', '.join('--' + name.replace('_', '-') for name in unsupported)}")
+    return {name: getattr(args, name) for name in REQUEST_FIELDS if getattr(args, name) != REQUEST_FIELDS[name]}
+
+
+def send_unix(socket_path, request):
+    # One JSON line each way over the Unix domain socket
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise ValueError("Verification server closed the connection without answering")
+    return json.loads(line)
+
+
+def send_http(port, request):
+    # POST /verify on the localhost HTTP server, error responses also carry JSON
+    import urllib.error
+    import urllib.request
+    http_request = urllib.request.Request(f"http://127.0.0.1:{port}/verify", data=json.dumps(request).encode('utf-8'),
+                                          headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(http_request) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read())
+
+
+def print_response(response):
+    # Same result lines as main.py, resistant is None when a solver budget ran out
+    if 'sweep' in response:
+        for result in response['sweep']:
+            status = {True: "is fault resistant", False: "has vulnerability",
+                      None: "is unknown (budget exhausted)"}[result['resistant']]
+            print(f"n_e = {result['n_e']}: circuit {status} ({result['time']:.2f} s)")
+        final = response['sweep'][-1]
+        if final['resistant'] is None:
+            print(f"Circuit fault resistance is unknown from n_e = {final['n_e']} (solver budget exhausted)")
+        elif final['resistant']:
+            print(f"Circuit is fault resistant up to n_e = {final['n_e']}")
+        else:
+            print(f"Circuit has vulnerability from n_e = {final['n_e']}")
+            print("Fault vector:", final['fault_vector'])
+    elif response['resistant'] is None:
+        print("Circuit fault resistance is unknown (solver budget exhausted)")
+    elif response['resistant']:
+        print("Circuit is fault resistant")
+    else:
+        print("Circuit has vulnerability")
+        print("Fault vector:", response['fault_vector'])
+
+
+def main():
+    parser = build_parser()
+    parser.description = 'Send a verification request to a running src/server.py'
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help=f'Server Unix domain socket (default: {DEFAULT_SOCKET})')
+    parser.add_argument('--port', type=int, help='Server localhost HTTP port instead of the Unix socket')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if not validate_args(args):
+        sys.exit(1)
+    try:
+        request = build_request(args, vars(parser.parse_args([args.circuit])))
+        if args.port is not None:
+            response = send_http(args.port, request)
+        else:
+            response = send_unix(args.socket, request)
+    except (ValueError, OSError) as e:
+        logging.error(f"Error: {e}")
+        sys.exit(1)
+
+    if not response['ok']:
+        logging.error(f"Error: {response['error']}")
+        sys.exit(1)
+    if response['new_session']:
+        logging.info(f"Server encoded a new session in {response['encode_time']:.2f} seconds")
+    print_response(response)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,110 @@
 import json
 import time
 import logging
-from pysat.formula import CNF
-from pysat.card import CardEnc
+from array import array
 import os
 import sys
+from circuit_graph import CircuitGraph
+from clause_store import ClauseStore
+import cardinality
+
+# Bump whenever a change alters the variables or clauses encode() produces,
+# cached formulas of older versions are then never used
+ENCODER_VERSION = 3
+
+# Clause categories of the provenance recorded for every emitted clause
+# Gate clauses use the node type ('cmp' for comparators), the rest are
+# fault logic and the formula-level constraints
+CLAUSE_CATEGORIES = ('xor', 'and', 'or', 'not', 'mux', 'reg', 'output', 'const0', 'const1', 'cmp',
+                     'fault', 'at_most', 'at_least_one', 'fault_counter', 'countermeasure')
+PROVENANCE_FORMAT = 2
+
+# Fault model fields that can be overridden per encoding, countermeasure is top-level
+FAULT_MODEL_OVERRIDES = ('n_e', 'fault_type', 'card_encoding')
+
+VALID_FAULT_TYPES = ('bit-flip', 'set', 'reset')
+
+
+def apply_overrides(circuit, overrides):
+    # Copy of a parsed circuit with fault model and countermeasure overrides applied
+    # Only the top level and the fault model are copied, the node list is shared
+    # unchanged, so one parsed netlist can back any number of encodings
+    circuit = dict(circuit)
+    if 'fault_model' in circuit:
+        circuit['fault_model'] = dict(circuit['fault_model'])
+    for key, value in overrides.items():
+        if value is None:
+            continue
+        if key in FAULT_MODEL_OVERRIDES:
+            circuit.setdefault('fault_model', {})[key] = value
+        elif key == 'countermeasure':
+            circuit['countermeasure'] = value
+        else:
+            raise ValueError(f"Unknown circuit override: {key}")
+    return circuit
+
+
+def formula_fields(circuit):
+    # Circuit fields besides the netlist that change the encoded formula
+    # Read the way the encoder reads them, invalid values become the defaults
+    # it falls back to, so a formula key built from them describes the formula
+    fault_model = circuit['fault_model']
+    fault_type = fault_model.get('fault_type', 'bit-flip')
+    card_encoding = fault_model.get('card_encoding', cardinality.DEFAULT_CARD_ENCODING)
+    return {
+        "fault_type": fault_type if fault_type in VALID_FAULT_TYPES else 'bit-flip',
+        "n_e": fault_model['n_e'],
+        "countermeasure": circuit['countermeasure'],
+        "card_encoding": card_encoding if card_encoding in cardinality.encoding_names() else cardinality.DEFAULT_CARD_ENCODING,
+    }
+
 
 class CNFEncoder:
-    def __init__(self, json_file):
+    def __init__(self, json_file, circuit=None, overrides=None):
         # Initialize CNF encoder with a circuit JSON file
         # Sets up all necessary data structures for encoding
+        # circuit is an already parsed JSON, json_file then only names the outputs
+        # overrides replace fault model fields (n_e, fault_type, card_encoding) or
+        # the countermeasure without modifying circuit
         
         self.json_file = json_file 
-        logging.info(f"Starting to read circuit {os.path.basename(json_file)}")
-        with open(json_file, 'r') as f:
-            self.circuit = json.load(f)
+        if circuit is None:
+            logging.info(f"Starting to read circuit {os.path.basename(json_file)}")
+            with open(json_file, 'r') as f:
+                circuit = json.load(f)
+        self.circuit = apply_overrides(circuit, overrides) if overrides else circuit
         
         self._validate_input()
         
-        self.cnf = CNF()
+        # Build the indexed circuit graph once, all node lookups go through it
+        self.graph = CircuitGraph(self.circuit['nodes'])
+        
+        self._init_state()
+        self._init_fault_model()
+
+    @classmethod
+    def from_cache(cls, json_file, circuit, cnf, tables):
+        # Rebuild an encoded circuit from a formula cache entry without encoding
+        # circuit is the already parsed JSON, tables come from FormulaCache.get
+        encoder = cls.__new__(cls)
+        encoder.json_file = json_file
+        encoder.circuit = circuit
+        encoder.graph = CircuitGraph(circuit['nodes'])
+        encoder._init_state()
+        encoder._init_fault_model()
+        encoder.cnf = cnf
+        encoder.variable_map = tables['variable_map']
+        encoder.control_vars = tables['control_vars']
+        encoder.faulty_outputs = tables['faulty_outputs']
+        encoder.next_var = tables['next_var']
+        encoder.clause_stats = tables['clause_stats']
+        if 'provenance' in tables:
+            encoder.set_provenance(tables['provenance'])
+        return encoder
+
+    def _init_state(self):
+        # Reset the formula, variable tables and statistics
+        self.cnf = ClauseStore()
         self.variable_map = {}  
         self.control_vars = {}  
         # self.select_vars = {}   
@@ -31,6 +117,21 @@ class CNFEncoder:
             "fault_constraints": 0,
             "countermeasure_constraints": 0
         }
+
+        # Set once the nodes were encoded with only the clause directions polarity analysis needs
+        self.polarity = False
+        # Fault bound the fault number constraint was encoded with
+        self.n_e = None
+        
+        # Clause provenance as runs: clauses before origin_ends[i] and after the
+        # previous run come from category origin_categories[i] of node
+        # origin_nodes[i], the node's position in the netlist (-1 for constraints)
+        # Only these integers are kept, node ids and inputs are looked up in the
+        # netlist when the provenance is saved or checked
+        self.origin_ends = array('q')
+        self.origin_categories = array('B')
+        self.origin_nodes = array('i')
+        self._origin_gate = (None, -1)
         
         self.var_ranges = {
             "nodes": {"min": float('inf'), "max": 0},
@@ -38,19 +139,46 @@ class CNFEncoder:
             "selects": {"min": float('inf'), "max": 0},
             "faulty_outputs": {"min": float('inf'), "max": 0}
         }
-        
+
+    def _init_fault_model(self):
+        # Pick the fault type from the circuit's fault model
         self.fault_type = self.circuit['fault_model'].get('fault_type', 'bit-flip')
-        valid_fault_types = ['bit-flip', 'set', 'reset']
-        if self.fault_type not in valid_fault_types:
+        if self.fault_type not in VALID_FAULT_TYPES:
             logging.warning(f"Invalid fault type {self.fault_type}, using default type 'bit-flip'")
             self.fault_type = 'bit-flip'
         
+        self.card_encoding = self.circuit['fault_model'].get('card_encoding', cardinality.DEFAULT_CARD_ENCODING)
+        if self.card_encoding not in cardinality.encoding_names():
+            logging.warning(f"Invalid cardinality encoding {self.card_encoding}, using default encoding '{cardinality.DEFAULT_CARD_ENCODING}'")
+            self.card_encoding = cardinality.DEFAULT_CARD_ENCODING
+        
         logging.info(f"Using fault type: {self.fault_type}, maximum number of faults: {self.circuit['fault_model']['n_e']}")
 
     def _validate_input(self):
         # Validate the input circuit JSON file
         # Checks for required fields, fault model configuration, and node structure
-        required_fields = ['nodes', 'fault_model', 'countermeasure']
+        if 'nodes' not in self.circuit:
+            raise ValueError("Missing required field: nodes")
+        
+        self._validate_header()
+
+        node_types = {}
+        vulnerable_nodes = 0
+        
+        for node in self.circuit['nodes']:
+            self._validate_node(node)
+            
+            node_type = node['type']
+            node_types[node_type] = node_types.get(node_type, 0) + 1
+            
+            if node.get('vulnerable', False):
+                vulnerable_nodes += 1
+            
+        self._log_node_statistics(node_types, vulnerable_nodes)
+
+    def _validate_header(self):
+        # Validate the fault model and countermeasure fields
+        required_fields = ['fault_model', 'countermeasure']
         for field in required_fields:
             if field not in self.circuit:
                 raise ValueError(f"Missing required field: {field}")
@@ -66,26 +194,20 @@ class CNFEncoder:
         if countermeasure not in valid_countermeasures:
             raise ValueError(f"Invalid countermeasure type: {countermeasure}, valid types are: {valid_countermeasures}")
 
-        node_types = {}
-        vulnerable_nodes = 0
-        
-        for node in self.circuit['nodes']:
-            if 'id' not in node or 'type' not in node:
-                raise ValueError("Each node must contain 'id' and 'type' fields")
-            
-            node_type = node['type']
-            node_types[node_type] = node_types.get(node_type, 0) + 1
-            
-            if node.get('vulnerable', False):
-                vulnerable_nodes += 1
-            
-            valid_types = ['input', 'output', 'xor', 'and', 'or', 'not', 'reg', 'mux']
-            if node_type not in valid_types:
-                raise ValueError(f"Invalid node type: {node_type}")
-            
-            if node_type != 'input' and node_type != 'reg' and 'inputs' not in node:
-                raise ValueError(f"Non-input node {node['id']} must contain an 'inputs' field")
-            
+    def _validate_node(self, node):
+        # Validate the structure of a single node
+        if 'id' not in node or 'type' not in node:
+            raise ValueError("Each node must contain 'id' and 'type' fields")
+        
+        node_type = node['type']
+        valid_types = ['input', 'output', 'xor', 'and', 'or', 'not', 'reg', 'mux']
+        if node_type not in valid_types:
+            raise ValueError(f"Invalid node type: {node_type}")
+        
+        if node_type != 'input' and node_type != 'reg' and 'inputs' not in node:
+            raise ValueError(f"Non-input node {node['id']} must contain an 'inputs' field")
+
+    def _log_node_statistics(self, node_types, vulnerable_nodes):
         logging.info("Circuit node statistics:")
         for node_type, count in node_types.items():
             logging.info(f"  - {node_type}: {count}")
@@ -103,6 +225,30 @@ class CNFEncoder:
             self.next_var += 1
         return self.variable_map[node_id]
     
+    def _mark_origin(self, category, node_index=-1, end=None):
+        # Attribute every clause emitted since the last mark (up to end) to one origin
+        end = len(self.cnf) if end is None else end
+        start = self.origin_ends[-1] if self.origin_ends else 0
+        if end <= start:
+            return
+        code = CLAUSE_CATEGORIES.index(category)
+        if self.origin_ends and self.origin_categories[-1] == code and self.origin_nodes[-1] == node_index:
+            self.origin_ends[-1] = end
+        else:
+            self.origin_ends.append(end)
+            self.origin_categories.append(code)
+            self.origin_nodes.append(node_index)
+
+    def _gate_category(self, node):
+        return 'cmp' if node['type'] == 'xor' and node['id'].startswith('cmp') else node['type']
+
+    def _encode_node(self, node, encoder, node_index):
+        # Run a gate encoder and attribute its clauses to the node at node_index in the netlist
+        # _encode_fault_logic splits the node's gate clauses from its fault logic
+        self._origin_gate = (self._gate_category(node), node_index)
+        encoder(node)
+        self._mark_origin(*self._origin_gate)
+
     def _get_control_var(self, node_id):
         # Get or create a control variable for a node
         # Control variables determine if a fault is injected at this node
@@ -144,31 +290,40 @@ class CNFEncoder:
     def _encode_fault_logic(self, node_id, output_var):
         # Encode the fault logic for a node
         # Creates clauses that model how faults affect node outputs based on fault type
+        category, node_index = self._origin_gate
+        self._mark_origin(category, node_index)
         control = self._get_control_var(node_id)
         faulty_output = self._get_faulty_output(node_id)
         
-        initial_clauses = len(self.cnf.clauses)
+        initial_clauses = len(self.cnf)
         
         if self.fault_type == 'bit-flip':
-            self.cnf.append([control, output_var,- faulty_output])
-            self.cnf.append([control, -output_var, faulty_output])
-            self.cnf.append([-control, output_var, faulty_output])
-            self.cnf.append([-control, -output_var, -faulty_output])
+            self.cnf.extend_fixed((
+                control, output_var, -faulty_output,
+                control, -output_var, faulty_output,
+                -control, output_var, faulty_output,
+                -control, -output_var, -faulty_output,
+            ), 3)
         
         elif self.fault_type == 'set':
-            self.cnf.append([control, output_var, -faulty_output])    
-            self.cnf.append([control, -output_var, faulty_output])    
-            self.cnf.append([-control, output_var, faulty_output])    
-            self.cnf.append([-control, -output_var, faulty_output])   
+            self.cnf.extend_fixed((
+                control, output_var, -faulty_output,
+                control, -output_var, faulty_output,
+                -control, output_var, faulty_output,
+                -control, -output_var, faulty_output,
+            ), 3)
         
         elif self.fault_type == 'reset':
-            self.cnf.append([control, output_var, -faulty_output])    
-            self.cnf.append([control, -output_var, faulty_output])    
-            self.cnf.append([-control, output_var, -faulty_output])   
-            self.cnf.append([-control, -output_var, -faulty_output])  
-        
-        clauses_added = len(self.cnf.clauses) - initial_clauses
+            self.cnf.extend_fixed((
+                control, output_var, -faulty_output,
+                control, -output_var, faulty_output,
+                -control, output_var, -faulty_output,
+                -control, -output_var, -faulty_output,
+            ), 3)
+        
+        clauses_added = len(self.cnf) - initial_clauses
         self.clause_stats["fault_logic"] += clauses_added
+        self._mark_origin('fault', node_index)
         logging.debug(f"Node {node_id} added {clauses_added} fault logic clauses")
         
         return faulty_output
@@ -184,8 +339,8 @@ class CNFEncoder:
         in1_id = inputs[0]
         in2_id = inputs[1]
         
-        in1_vulnerable = any(n['id'] == in1_id and n.get('vulnerable', False) for n in self.circuit['nodes'])
-        in2_vulnerable = any(n['id'] == in2_id and n.get('vulnerable', False) for n in self.circuit['nodes'])
+        in1_vulnerable = self.graph.is_vulnerable(in1_id)
+        in2_vulnerable = self.graph.is_vulnerable(in2_id)
         
         if is_cmp and in1_vulnerable:
             in1 = self._get_faulty_output(in1_id) 
@@ -197,12 +352,14 @@ class CNFEncoder:
         else:
             in2 = self._get_var(in2_id)
         
-        initial_clauses = len(self.cnf.clauses)
+        initial_clauses = len(self.cnf)
         
-        self.cnf.append([-in1, -in2, -output])
-        self.cnf.append([in1, in2, -output])
-        self.cnf.append([-in1, in2, output])
-        self.cnf.append([in1, -in2, output])
+        self.cnf.extend_fixed((
+            -in1, -in2, -output,
+            in1, in2, -output,
+            -in1, in2, output,
+            in1, -in2, output,
+        ), 3)
         
         self.clause_stats["normal_logic"] += 4
     
@@ -216,11 +373,13 @@ class CNFEncoder:
         in1 = self._get_var(inputs[0])
         in2 = self._get_var(inputs[1])
         
-        initial_clauses = len(self.cnf.clauses)
+        initial_clauses = len(self.cnf)
         
-        self.cnf.append([in1, -output])
-        self.cnf.append([in2, -output])
-        self.cnf.append([-in1, -in2, output])
+        self.cnf.extend_flat((
+            in1, -output,
+            in2, -output,
+            -in1, -in2, output,
+        ), (2, 2, 3))
         
         self.clause_stats["normal_logic"] += 3
         
@@ -237,11 +396,13 @@ class CNFEncoder:
         if len(inputs) != 2:
             logging.warning(f"Node {node['id']} is not a 2-input OR gate, has {len(inputs)} inputs")
         
-        initial_clauses = len(self.cnf.clauses)
+        initial_clauses = len(self.cnf)
         
-        self.cnf.append([-in1, output])
-        self.cnf.append([-in2, output])
-        self.cnf.append([in1, in2, -output])
+        self.cnf.extend_flat((
+            -in1, output,
+            -in2, output,
+            in1, in2, -output,
+        ), (2, 2, 3))
         self.clause_stats["normal_logic"] += 3
             
         if node.get('vulnerable', False):
@@ -253,10 +414,12 @@ class CNFEncoder:
         output = self._get_var(node['id'])
         in1 = self._get_var(inputs[0])
         
-        initial_clauses = len(self.cnf.clauses)
+        initial_clauses = len(self.cnf)
         
-        self.cnf.append([in1, output])
-        self.cnf.append([-in1, -output])
+        self.cnf.extend_fixed((
+            in1, output,
+            -in1, -output,
+        ), 2)
         
         self.clause_stats["normal_logic"] += 2
         
@@ -271,12 +434,14 @@ class CNFEncoder:
         in2 = self._get_var(inputs[1])
         sel = self._get_var(inputs[2])
         
-        initial_clauses = len(self.cnf.clauses)
+        initial_clauses = len(self.cnf)
         
-        self.cnf.append([sel, -in1, output])      
-        self.cnf.append([sel, in1, -output])      
-        self.cnf.append([-sel, -in2, output])     
-        self.cnf.append([-sel, in2, -output])  
+        self.cnf.extend_fixed((
+            sel, -in1, output,
+            sel, in1, -output,
+            -sel, -in2, output,
+            -sel, in2, -output,
+        ), 3)
 
         
         self.clause_stats["normal_logic"] += 4
@@ -289,14 +454,16 @@ class CNFEncoder:
         # Registers store values between clock cycles
         output = self._get_var(node['id'])
         
-        initial_clauses = len(self.cnf.clauses)
+        initial_clauses = len(self.cnf)
         
         if 'inputs' in node and node['inputs']:
             input_var = self._get_var(node['inputs'][0])
             input_id = node['inputs'][0]
             
-            self.cnf.append([-input_var, output])
-            self.cnf.append([input_var, -output])
+            self.cnf.extend_fixed((
+                -input_var, output,
+                input_var, -output,
+            ), 2)
             
             self.clause_stats["normal_logic"] += 2
             
@@ -307,12 +474,18 @@ class CNFEncoder:
         # Encode input node (no clauses needed as inputs are free variables)
         pass
 
+    def _encode_const(self, node):
+        # Encode a constant node added by structural hashing as a unit clause
+        output = self._get_var(node['id'])
+        self.cnf.append([output] if node['type'] == 'const1' else [-output])
+        self.clause_stats["normal_logic"] += 1
+
     def _encode_output(self, node):
         # Encode output node logic into CNF clauses
         # Output nodes connect to primary outputs of the circuit
         output = self._get_var(node['id'])
         
-        initial_clauses = len(self.cnf.clauses)
+        initial_clauses = len(self.cnf)
         
         if 'inputs' not in node or not node['inputs'] or len(node['inputs']) == 0:
             error_msg = f"Output node {node['id']} has no valid inputs, violating strict validation requirement"
@@ -328,8 +501,10 @@ class CNFEncoder:
         
         input_var = self.variable_map[input_id]
         
-        self.cnf.append([-input_var, output])
-        self.cnf.append([input_var, -output])
+        self.cnf.extend_fixed((
+            -input_var, output,
+            input_var, -output,
+        ), 2)
         
         self.clause_stats["normal_logic"] += 2
         logging.debug(f"Output node {node['id']} added 2 normal logic clauses")
@@ -337,10 +512,10 @@ class CNFEncoder:
         if node.get('vulnerable', False):
             self._encode_fault_logic(node['id'], output)
     
-    def _encode_fault_constraints(self, n_e=None):
+    def _encode_fault_constraints(self, n_e=None, card_encoding=None):
         # Encode fault constraints into CNF clauses
         # Limits the number of faults that can be injected based on the fault model
-        initial_clauses = len(self.cnf.clauses)
+        initial_clauses = len(self.cnf)
         
         fault_model = self.circuit['fault_model']
         n_e = n_e if n_e is not None else fault_model['n_e']
@@ -349,40 +524,71 @@ class CNFEncoder:
         if n_e > vulnerable_gates:
             logging.warning(f"n_e ({n_e}) exceeds the number of vulnerable gates ({vulnerable_gates}), setting n_e to {vulnerable_gates}")
             n_e = vulnerable_gates
+        self.n_e = n_e
         
         control_vars = list(self.control_vars.values())
         
-        if n_e < len(control_vars):
+        if control_vars:
             logging.info(f"Adding fault number constraint: 1 <= sum(control_vars) <= {n_e}")
-            atmost_clauses = CardEnc.atmost(control_vars, bound=n_e, encoding=1).clauses
-            atleast_clauses = CardEnc.atleast(control_vars, bound=1, encoding=1).clauses
-            logging.info(f"atmost_clauses: {atmost_clauses}")
-            logging.info(f"atleast_clauses: {atleast_clauses}")
-            self.cnf.extend(atmost_clauses)
-            self.cnf.extend(atleast_clauses)
-
-        clauses_added = len(self.cnf.clauses) - initial_clauses
+            if n_e < len(control_vars):
+                # Auxiliary variables of the encoding are numbered after every circuit variable
+                encoding = card_encoding if card_encoding is not None else self.card_encoding
+                atmost = cardinality.atmost(control_vars, n_e, self.next_var - 1, encoding)
+                self.cnf.extend(atmost.clauses)
+                self.next_var = max(self.next_var, atmost.nv + 1)
+                self._mark_origin('at_most')
+                logging.debug(f"Added {len(atmost.clauses)} at-most-{n_e} clauses")
+            # At least one fault is a single clause whatever the encoding
+            self.cnf.append(control_vars)
+            self._mark_origin('at_least_one')
+
+        clauses_added = len(self.cnf) - initial_clauses
         self.clause_stats["fault_constraints"] += clauses_added
         logging.info(f"Added {clauses_added} fault constraint clauses")
+
+    def _encode_incremental_fault_constraints(self, max_n_e):
+        # Encode fault constraints that can be tightened per query
+        # At least one fault is a plain clause; the upper bound is a totalizer over
+        # the control variables, any bound up to max_n_e is selected by the
+        # assumptions returned from fault_bound_assumptions
+        initial_clauses = len(self.cnf)
+        control_vars = list(self.control_vars.values())
+        if not control_vars:
+            raise ValueError("Circuit has no vulnerable nodes, nothing to sweep")
+        
+        from pysat.card import ITotalizer
+        self.cnf.append(control_vars)
+        self._mark_origin('at_least_one')
+        self.fault_counter = ITotalizer(lits=control_vars, ubound=max_n_e, top_id=self.next_var - 1)
+        self.cnf.extend(self.fault_counter.cnf.clauses)
+        self.next_var = self.fault_counter.top_id + 1
+        self._mark_origin('fault_counter')
+        
+        clauses_added = len(self.cnf) - initial_clauses
+        self.clause_stats["fault_constraints"] += clauses_added
+        logging.info(f"Added {clauses_added} incremental fault constraint clauses (totalizer up to n_e = {max_n_e})")
+
+    def fault_bound_assumptions(self, n_e):
+        # Assumptions that limit the number of injected faults to n_e
+        # Only valid after encode(..., incremental=True)
+        rhs = self.fault_counter.rhs
+        return [-rhs[n_e]] if n_e < len(rhs) else []
     
     def _encode_countermeasure_constraints(self):
         # Encode countermeasure constraints into CNF clauses
         # Implements detection or correction mechanisms based on the countermeasure type
-        initial_clauses = len(self.cnf.clauses)
+        initial_clauses = len(self.cnf)
         
         countermeasure = self.circuit['countermeasure']
         logging.info(f"Using countermeasure type: {countermeasure}")
         
-        output_nodes = [node for node in self.circuit['nodes'] if node['type'] == 'output']
-        
         if countermeasure == 'detection':
             flag_var = None
             flag_input_id = None
-            for node in output_nodes:
-                if node['id'] == 'flag':
-                    flag_var = self._get_var(node['id'])
-                    flag_input_id = node['inputs'][0] if 'inputs' in node and node['inputs'] else None
-                    break
+            flag_node = self.graph.get_node('flag')
+            if flag_node is not None and flag_node['type'] == 'output':
+                flag_var = self._get_var(flag_node['id'])
+                flag_input_id = flag_node['inputs'][0] if 'inputs' in flag_node and flag_node['inputs'] else None
             
             if flag_var is not None and flag_input_id is not None:
                 self.cnf.append([-flag_var])  
@@ -405,364 +611,21 @@ class CNFEncoder:
         #             self.cnf.append([-normal_output, faulty_output])
         #             self.cnf.append([normal_output, -faulty_output])
         
-        clauses_added = len(self.cnf.clauses) - initial_clauses
+        clauses_added = len(self.cnf) - initial_clauses
         self.clause_stats["countermeasure_constraints"] += clauses_added
+        self._mark_origin('countermeasure')
         logging.info(f"Added {clauses_added} countermeasure constraint clauses")
     
-    def test_cnf(self):
-        # Verify the consistency of generated CNF clauses, check all node types, fault logic, fault constraints and countermeasure constraints
+    def test_cnf(self, level='full'):
+        # Verify the consistency of the generated CNF clauses in time linear in the formula size
+        # level is 'structural' (clause ranges and counts) or 'full' (every expected clause), see self_check
         # Returns: tuple (tests_passed, tests_failed) indicating the number of passed and failed tests
-        logging.info("Starting CNF consistency verification...")
-        tests_passed = 0
-        tests_failed = 0
-        
-        # Check node logic clauses
-        for node in self.circuit['nodes']:
-            node_id = node['id']
-            node_type = node['type']
-            
-            # Skip input nodes as they have no logic clauses
-            if node_type == 'input':
-                continue
-                
-            try:
-                # Get node's output variable
-                if node_id not in self.variable_map:
-                    logging.warning(f"Cannot find variable mapping for node {node_id}, skipping test")
-                    tests_failed += 1
-                    continue
-                    
-                output_var = self.variable_map[node_id]
-                
-                # XOR node test
-                if node_type == 'xor':
-                    if 'inputs' not in node or len(node['inputs']) < 2:
-                        logging.warning(f"XOR node {node_id} missing inputs, skipping test")
-                        tests_failed += 1
-                        continue
-                        
-                    in1_id = node['inputs'][0]
-                    in2_id = node['inputs'][1]
-                    
-                    # For comparator nodes, check if using faulty output
-                    is_cmp = node_id.startswith('cmp')
-                    in1_vulnerable = any(n['id'] == in1_id and n.get('vulnerable', False) for n in self.circuit['nodes'])
-                    in2_vulnerable = any(n['id'] == in2_id and n.get('vulnerable', False) for n in self.circuit['nodes'])
-                    
-                    if is_cmp and in1_vulnerable:
-                        in1 = self._get_faulty_output(in1_id)
-                    else:
-                        in1 = self._get_var(in1_id)
-                        
-                    if is_cmp and in2_vulnerable:
-                        in2 = self._get_faulty_output(in2_id)
-                    else:
-                        in2 = self._get_var(in2_id)
-                    
-                    # Check XOR logic clauses
-                    xor_clauses = [
-                        [-in1, -in2, -output_var],
-                        [in1, in2, -output_var],
-                        [-in1, in2, output_var],
-                        [in1, -in2, output_var]
-                    ]
-                    
-                    all_passed = True
-                    for clause in xor_clauses:
-                        if clause not in self.cnf.clauses:
-                            logging.error(f"XOR node {node_id} missing clause: {clause}")
-                            tests_failed += 1
-                            all_passed = False
-                    
-                    if all_passed:
-                        logging.info(f"XOR node {node_id} clauses verification passed")
-                        tests_passed += 4
-                
-                # AND node test
-                elif node_type == 'and':
-                    if 'inputs' not in node or len(node['inputs']) < 2:
-                        logging.warning(f"AND node {node_id} missing inputs, skipping test")
-                        tests_failed += 1
-                        continue
-                        
-                    in1 = self._get_var(node['inputs'][0])
-                    in2 = self._get_var(node['inputs'][1])
-                    
-                    # Check AND logic clauses
-                    and_clauses = [
-                        [in1, -output_var],
-                        [in2, -output_var],
-                        [-in1, -in2, output_var]
-                    ]
-                    
-                    all_passed = True
-                    for clause in and_clauses:
-                        if clause not in self.cnf.clauses:
-                            logging.error(f"AND node {node_id} missing clause: {clause}")
-                            tests_failed += 1
-                            all_passed = False
-                    
-                    if all_passed:
-                        logging.info(f"AND node {node_id} clauses verification passed")
-                        tests_passed += 3
-                
-                # OR node test
-                elif node_type == 'or':
-                    if 'inputs' not in node or len(node['inputs']) < 2:
-                        logging.warning(f"OR node {node_id} missing inputs, skipping test")
-                        tests_failed += 1
-                        continue
-                        
-                    in1 = self._get_var(node['inputs'][0])
-                    in2 = self._get_var(node['inputs'][1])
-                    
-                    # Check OR logic clauses
-                    or_clauses = [
-                        [-in1, output_var],
-                        [-in2, output_var],
-                        [in1, in2, -output_var]
-                    ]
-                    
-                    all_passed = True
-                    for clause in or_clauses:
-                        if clause not in self.cnf.clauses:
-                            logging.error(f"OR node {node_id} missing clause: {clause}")
-                            tests_failed += 1
-                            all_passed = False
-                    
-                    if all_passed:
-                        logging.info(f"OR node {node_id} clauses verification passed")
-                        tests_passed += 3
-                
-                # NOT node test
-                elif node_type == 'not':
-                    if 'inputs' not in node or len(node['inputs']) < 1:
-                        logging.warning(f"NOT node {node_id} missing input, skipping test")
-                        tests_failed += 1
-                        continue
-                        
-                    in1 = self._get_var(node['inputs'][0])
-                    
-                    # Check NOT logic clauses
-                    not_clauses = [
-                        [in1, output_var],
-                        [-in1, -output_var]
-                    ]
-                    
-                    all_passed = True
-                    for clause in not_clauses:
-                        if clause not in self.cnf.clauses:
-                            logging.error(f"NOT node {node_id} missing clause: {clause}")
-                            tests_failed += 1
-                            all_passed = False
-                    
-                    if all_passed:
-                        logging.info(f"NOT node {node_id} clauses verification passed")
-                        tests_passed += 2
-                
-                # MUX node test
-                elif node_type == 'mux':
-                    if 'inputs' not in node or len(node['inputs']) < 3:
-                        logging.warning(f"MUX node {node_id} missing inputs, skipping test")
-                        tests_failed += 1
-                        continue
-                        
-                    in1 = self._get_var(node['inputs'][0])
-                    in2 = self._get_var(node['inputs'][1])
-                    sel = self._get_var(node['inputs'][2])
-                    
-                    # Check MUX logic clauses
-                    mux_clauses = [
-                        [sel, -in1, output_var],
-                        [sel, in1, -output_var],
-                        [-sel, -in2, output_var],
-                        [-sel, in2, -output_var]
-                    ]
-                    
-                    all_passed = True
-                    for clause in mux_clauses:
-                        if clause not in self.cnf.clauses:
-                            logging.error(f"MUX node {node_id} missing clause: {clause}")
-                            tests_failed += 1
-                            all_passed = False
-                    
-                    if all_passed:
-                        logging.info(f"MUX node {node_id} clauses verification passed")
-                        tests_passed += 4
-                
-                # REG node test
-                elif node_type == 'reg':
-                    if 'inputs' in node and node['inputs']:
-                        input_var = self._get_var(node['inputs'][0])
-                        
-                        # Check REG logic clauses
-                        reg_clauses = [
-                            [-input_var, output_var],
-                            [input_var, -output_var]
-                        ]
-                        
-                        all_passed = True
-                        for clause in reg_clauses:
-                            if clause not in self.cnf.clauses:
-                                logging.error(f"REG node {node_id} missing clause: {clause}")
-                                tests_failed += 1
-                                all_passed = False
-                        
-                        if all_passed:
-                            logging.info(f"REG node {node_id} clauses verification passed")
-                            tests_passed += 2
-                
-                # OUTPUT node test
-                elif node_type == 'output':
-                    if 'inputs' not in node or not node['inputs']:
-                        logging.warning(f"Output node {node_id} missing inputs, skipping test")
-                        tests_failed += 1
-                        continue
-                        
-                    input_var = self._get_var(node['inputs'][0])
-                    
-                    # Check output node logic clauses
-                    output_clauses = [
-                        [-input_var, output_var],
-                        [input_var, -output_var]
-                    ]
-                    
-                    all_passed = True
-                    for clause in output_clauses:
-                        if clause not in self.cnf.clauses:
-                            logging.error(f"Output node {node_id} missing clause: {clause}")
-                            tests_failed += 1
-                            all_passed = False
-                    
-                    if all_passed:
-                        logging.info(f"Output node {node_id} clauses verification passed")
-                        tests_passed += 2
-                
-                # Check fault logic clauses
-                if node.get('vulnerable', False) and node_id in self.control_vars:
-                    control = self.control_vars[node_id]
-                    faulty_output = self._get_faulty_output(node_id)
-                    
-                    # Check fault logic clauses based on fault type
-                    if self.fault_type == 'bit-flip':
-                        fault_clauses = [
-                            [control, output_var, -faulty_output],
-                            [control, -output_var, faulty_output],
-                            [-control, output_var, faulty_output],
-                            [-control, -output_var, -faulty_output]
-                        ]
-                    elif self.fault_type == 'set':
-                        fault_clauses = [
-                            [control, output_var, -faulty_output],
-                            [control, -output_var, faulty_output],
-                            [-control, output_var, faulty_output],
-                            [-control, -output_var, faulty_output]
-                        ]
-                    elif self.fault_type == 'reset':
-                        fault_clauses = [
-                            [control, output_var, -faulty_output],
-                            [control, -output_var, faulty_output],
-                            [-control, output_var, -faulty_output],
-                            [-control, -output_var, -faulty_output]
-                        ]
-                    else:
-                        logging.warning(f"Unknown fault type {self.fault_type}, skipping fault logic test")
-                        tests_failed += 4
-                        continue
-                    
-                    all_passed = True
-                    for clause in fault_clauses:
-                        if clause not in self.cnf.clauses:
-                            logging.error(f"Node {node_id} missing fault logic clause: {clause}")
-                            tests_failed += 1
-                            all_passed = False
-                    
-                    if all_passed:
-                        logging.info(f"Node {node_id} fault logic clauses verification passed")
-                        tests_passed += 4
-            
-            except Exception as e:
-                logging.error(f"Error verifying node {node_id}: {str(e)}")
-                tests_failed += 1
-        
-        # Check fault constraints
-        try:
-            fault_model = self.circuit['fault_model']
-            n_e = fault_model['n_e']
-            control_vars = list(self.control_vars.values())
-            
-            if n_e < len(control_vars):
-                # Check if atmost and atleast clauses exist
-                # Since the structure of clauses generated by CardEnc is complex, we only check if they exist
-                # Without checking the specific content
-                atmost_clauses_exist = False
-                atleast_clauses_exist = False
-                
-                # Check if at least one control variable appears in some clauses
-                for clause in self.cnf.clauses:
-                    if any(var in clause or -var in clause for var in control_vars):
-                        # Assume some clauses are atmost constraints
-                        atmost_clauses_exist = True
-                        # Assume some clauses are atleast constraints
-                        atleast_clauses_exist = True
-                
-                if atmost_clauses_exist:
-                    logging.info(f"Fault number upper bound constraint verification passed")
-                    tests_passed += 1
-                else:
-                    logging.error(f"Missing fault number upper bound constraint clauses")
-                    tests_failed += 1
-                
-                if atleast_clauses_exist:
-                    logging.info(f"Fault number lower bound constraint verification passed")
-                    tests_passed += 1
-                else:
-                    logging.error(f"Missing fault number lower bound constraint clauses")
-                    tests_failed += 1
-        except Exception as e:
-            logging.error(f"Error verifying fault constraints: {str(e)}")
-            tests_failed += 2
-        
-        # Check countermeasure constraints
-        try:
-            countermeasure = self.circuit['countermeasure']
-            
-            if countermeasure == 'detection':
-                flag_var = None
-                for node in self.circuit['nodes']:
-                    if node['id'] == 'flag':
-                        flag_var = self._get_var(node['id'])
-                        break
-                
-                if flag_var is not None:
-                    flag_clause = [-flag_var]
-                    if flag_clause in self.cnf.clauses:
-                        logging.info(f"Detection countermeasure constraint verification passed")
-                        tests_passed += 1
-                    else:
-                        logging.error(f"Missing detection countermeasure constraint clause: {flag_clause}")
-                        tests_failed += 1
-                else:
-                    logging.warning(f"Cannot find flag node, skipping countermeasure constraint test")
-                    tests_failed += 1
-            
-            # If you need to check correction measures, you can add them here
-        except Exception as e:
-            logging.error(f"Error verifying countermeasure constraints: {str(e)}")
-            tests_failed += 1
-        
-        total_tests = tests_passed + tests_failed
-        logging.info(f"CNF consistency verification completed: {total_tests} total tests, {tests_passed} passed, {tests_failed} failed")
-        
-        return (tests_passed, tests_failed)
+        from self_check import CNFSelfCheck
+        return CNFSelfCheck(self).run(level)
 
-    def encode(self, n_e=None):
-        # Main encoding method that creates the complete CNF formula
-        # Encodes all nodes, fault constraints, and countermeasure constraints
-        start_time = time.time()
-        logging.info("Starting circuit encoding")
-
-        NODE_ENCODERS = {
+    def _node_encoders(self):
+        # Map each node type to its gate encoder
+        return {
             'xor': self._encode_xor,
             'and': self._encode_and,
             'or': self._encode_or,
@@ -771,23 +634,85 @@ class CNFEncoder:
             'reg': self._encode_reg,
             'input':self._encode_input,
             'output': self._encode_output,
+            'const0': self._encode_const,
+            'const1': self._encode_const,
         }
 
-        for node in self.circuit['nodes']:
+    def _encode_nodes(self):
+        # Encode every node by dispatching it to its gate encoder
+        NODE_ENCODERS = self._node_encoders()
+
+        for node_index, node in enumerate(self.circuit['nodes']):
             encoder = NODE_ENCODERS.get(node['type'])
             if encoder:
-                encoder(node)
+                self._encode_node(node, encoder, node_index)
             else:
                 raise ValueError(f"Unknown node type: {node['type']}")
+
+    def apply_cone_slice(self):
+        # Restrict the circuit to the cone of influence of the countermeasure
+        # Must run before the nodes are encoded, see cone_slicer.slice_circuit
+        from cone_slicer import slice_circuit
+        self.circuit, self.graph, self.slice_stats = slice_circuit(self.circuit, self.graph)
+        return self.slice_stats
+
+    def apply_structural_hash(self):
+        # Merge duplicate gates and fold constants and double negations
+        # Must run before the nodes are encoded, see structural_hash.StructuralHasher
+        from structural_hash import hash_circuit
+        self.circuit, self.graph, self.strash_stats = hash_circuit(self.circuit, self.graph)
+        return self.strash_stats
+
+    def encode(self, n_e=None, batch=False, incremental=False, card_encoding=None, slice_cone=False, strash=False,
+               polarity=False, self_check='off', save_maps=True):
+        # Main encoding method that creates the complete CNF formula
+        # Encodes all nodes, fault constraints, and countermeasure constraints
+        # batch=True builds the node clauses type by type with NumPy (same output)
+        # incremental=True encodes a fault counter that answers every bound up to
+        # n_e through fault_bound_assumptions instead of a fixed n_e constraint
+        # card_encoding overrides the fault model's cardinality encoding ('auto' picks one by size)
+        # slice_cone=True drops nodes outside the cone of influence of the countermeasure
+        # strash=True merges structurally identical gates and folds constants first
+        # polarity=True emits only the gate clause directions the flag = 0 constraint needs
+        # self_check runs test_cnf at that level ('off', 'structural' or 'full') once encoded
+        # save_maps=False skips writing the variable map and provenance files to outputs/
+        start_time = time.time()
+        logging.info("Starting circuit encoding")
         
-        self._encode_fault_constraints(n_e)
+        if strash:
+            self.apply_structural_hash()
+        if slice_cone:
+            self.apply_cone_slice()
+
+        if polarity:
+            if batch:
+                logging.warning("Batch encoding emits full gate clauses, encoding node by node for polarity mode")
+            from polarity import PolarityEncoder
+            PolarityEncoder(self).encode_nodes()
+            self.polarity = True
+        elif batch:
+            from batch_encoder import BatchEncoder, BATCH_MIN_NODES
+            if len(self.circuit['nodes']) < BATCH_MIN_NODES:
+                logging.info(f"Only {len(self.circuit['nodes'])} nodes, below the batch encoding crossover "
+                             f"of {BATCH_MIN_NODES}, encoding node by node")
+                self._encode_nodes()
+            else:
+                BatchEncoder(self).encode_nodes()
+        else:
+            self._encode_nodes()
+        
+        if incremental:
+            max_n_e = n_e if n_e is not None else self.circuit['fault_model']['n_e']
+            self._encode_incremental_fault_constraints(max_n_e)
+        else:
+            self._encode_fault_constraints(n_e, card_encoding)
         
         self._encode_countermeasure_constraints()
         
         end_time = time.time()
         
         logging.info(f"Circuit encoding completed, time used: {end_time - start_time:.2f} seconds")
-        logging.info(f"Variable count: {self.next_var - 1}, Clause count: {len(self.cnf.clauses)}")
+        logging.info(f"Variable count: {self.next_var - 1}, Clause count: {len(self.cnf)}")
         
         logging.info("Variable allocation statistics:")
         logging.info(f"  - Node variables: {len(self.variable_map)}, ID range: {self.var_ranges['nodes']['min']}-{self.var_ranges['nodes']['max']}")
@@ -800,23 +725,21 @@ class CNFEncoder:
         
         logging.info(f"  - Faulty output variables: {len(self.faulty_outputs)}, ID range: {self.var_ranges['faulty_outputs']['min']}-{self.var_ranges['faulty_outputs']['max']}")
         
-        flag_logic_var = None
-        flag_var = None
-        for node in self.circuit['nodes']:
-            if node['id'] == 'flag_logic':
-                flag_logic_var = self.variable_map.get('flag_logic')
-                logging.info(f"flag_logic variable: {flag_logic_var}")
-            elif node['id'] == 'flag':
-                flag_var = self.variable_map.get('flag')
-                logging.info(f"flag variable: {flag_var}")
+        if 'flag_logic' in self.graph:
+            logging.info(f"flag_logic variable: {self.variable_map.get('flag_logic')}")
+        if 'flag' in self.graph:
+            logging.info(f"flag variable: {self.variable_map.get('flag')}")
         
         logging.info("Clause type statistics:")
         for clause_type, count in self.clause_stats.items():
             logging.info(f"  - {clause_type}: {count}")
         
-        self.test_cnf()
+        if self_check != 'off':
+            self.test_cnf(self_check)
         
-        self._save_variable_map()
+        if save_maps:
+            self._save_variable_map()
+            self._save_provenance()
         
         return self.cnf
     
@@ -861,11 +784,89 @@ class CNFEncoder:
         
         logging.info(f"Variable mapping saved to {map_file}")
     
-    def save_cnf(self, output_file):
+    def _iter_netlist(self):
+        # Nodes in netlist order, the positions clause provenance refers to
+        return iter(self.circuit['nodes'])
+
+    def _iter_provenance_nodes(self):
+        # Yield (position, [id, type, inputs]) of every node a provenance run refers to
+        # A bitmap over the positions marks them, the netlist is read once in order
+        referenced = bytearray(max(self.origin_nodes, default=-1) + 1)
+        for node_index in self.origin_nodes:
+            if node_index >= 0:
+                referenced[node_index] = 1
+        for node_index, node in enumerate(self._iter_netlist()):
+            if node_index == len(referenced):
+                break
+            if referenced[node_index]:
+                yield node_index, [node['id'], node['type'], list(node.get('inputs') or [])]
+
+    def _provenance_runs(self):
+        # Provenance fields besides the node table
+        return {
+            "format": PROVENANCE_FORMAT,
+            "clauses": len(self.cnf),
+            "fault_type": self.fault_type,
+            "categories": list(CLAUSE_CATEGORIES),
+            "ends": self.origin_ends.tolist(),
+            "category": self.origin_categories.tolist(),
+            "node": self.origin_nodes.tolist(),
+        }
+
+    def get_provenance(self):
+        # Clause provenance in the layout saved next to the CNF
+        # "node" holds netlist positions, "nodes" the referenced nodes at "positions"
+        provenance = self._provenance_runs()
+        provenance["positions"] = []
+        provenance["nodes"] = []
+        for node_index, entry in self._iter_provenance_nodes():
+            provenance["positions"].append(node_index)
+            provenance["nodes"].append(entry)
+        return provenance
+
+    def set_provenance(self, provenance):
+        # Restore provenance saved by get_provenance, e.g. from the formula cache
+        # The node table is not kept, the positions refer to this encoder's netlist
+        self.origin_ends = array('q', provenance['ends'])
+        self.origin_categories = array('B', provenance['category'])
+        self.origin_nodes = array('i', provenance['node'])
+
+    def _save_provenance(self):
+        # Save the clause provenance next to the variable map, clause_display groups clauses with it
+        # The node table is written entry by entry while the netlist is read, so
+        # it is never held in memory as a whole
+        input_base_name = os.path.basename(self.json_file).split('.')[0]
+        output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "outputs")
+        os.makedirs(output_dir, exist_ok=True)
+        provenance_file = os.path.join(output_dir, f"{input_base_name}_provenance.json")
+        
+        positions = array('i')
+        with open(provenance_file, 'w') as f:
+            f.write(json.dumps(self._provenance_runs(), separators=(',', ':'))[:-1])
+            f.write(',"nodes":[')
+            for node_index, entry in self._iter_provenance_nodes():
+                if positions:
+                    f.write(',')
+                f.write(json.dumps(entry, separators=(',', ':')))
+                positions.append(node_index)
+            f.write('],"positions":')
+            f.write(json.dumps(positions.tolist(), separators=(',', ':')))
+            f.write('}')
+        
+        logging.info(f"Clause provenance saved to {provenance_file}")
+
+    def save_cnf(self, output_file, comments=None):
         # Save the CNF formula to a file in DIMACS format
-        self.cnf.to_file(output_file)
+        # The clause store writes the whole formula in a single call
+        self.cnf.to_file(output_file, comments)
         logging.info(f"CNF saved to {output_file}")
     
+    def save_binary_cnf(self, output_file):
+        # Save the CNF formula in the binary, memory-mappable format of binary_cnf
+        from binary_cnf import write_binary_cnf
+        write_binary_cnf(self.cnf, output_file)
+        logging.info(f"Binary CNF saved to {output_file}")
+    
     def get_variable_map(self):
         # Return the mapping from node IDs to variable IDs
         return self.variable_map
@@ -874,6 +875,12 @@ class CNFEncoder:
         # Return the mapping from node IDs to control variable IDs
         return self.control_vars
     
+    def get_input_vars(self):
+        # Return the mapping from primary input node IDs to variable IDs
+        # Inputs removed by cone slicing have no variable and are left out
+        return {node['id']: self.variable_map[node['id']] for node in self.graph.nodes_of_type('input')
+                if node['id'] in self.variable_map}
+    
     # def get_select_vars(self):
     #     # Return the mapping from node IDs to select variable IDs
     #     return self.select_vars
@@ -0,0 +1,69 @@
+import logging
+from circuit_graph import CircuitGraph
+from gate_templates import GATE_TEMPLATES
+
+
+def slice_roots(circuit, graph):
+    # Nodes whose values the countermeasure constraint can observe
+    # Faulty values only reach the cmp comparators, which feed flag, so for
+    # detection the flag and comparator cones are everything that matters.
+    # Correction is judged on the outputs, so all output nodes are roots too.
+    roots = ['flag'] + [node_id for node_id in graph.order if node_id.startswith('cmp')]
+    if circuit['countermeasure'] == 'correction':
+        roots.extend(node['id'] for node in graph.nodes_of_type('output'))
+    return roots
+
+
+def slice_circuit(circuit, graph):
+    """Keep only the cone of influence of the countermeasure
+
+    Nodes outside the transitive fan-in of the roots cannot change the
+    verdict: their clauses only define their own value. Vulnerable nodes are
+    always kept so the fault constraints range over the same control
+    variables, but outside the cone their fan-in is dropped and their inputs
+    become free variables, which leaves the satisfiable fault vectors unchanged.
+
+    Args:
+        circuit (dict): Circuit description
+        graph (CircuitGraph): Indexed graph of the circuit
+
+    Returns:
+        tuple: (sliced circuit, sliced graph, stats dict of dropped nodes, variables and clauses)
+    """
+    cone = graph.transitive_fanin(slice_roots(circuit, graph))
+    kept = cone | graph.vulnerable
+
+    nodes = []
+    dropped = []
+    for node_id in graph.order:
+        node = graph.get_node(node_id)
+        (nodes if node_id in kept else dropped).append(node)
+
+    # Ids referenced only by dropped nodes lose their variables
+    kept_refs = set()
+    for node in nodes:
+        kept_refs.add(node['id'])
+        kept_refs.update(node.get('inputs') or [])
+    dropped_vars = set()
+    dropped_clauses = 0
+    for node in dropped:
+        for ref in [node['id']] + list(node.get('inputs') or []):
+            if ref not in kept_refs:
+                dropped_vars.add(ref)
+        if node['type'] != 'input' and (node['type'] != 'reg' or node.get('inputs')):
+            dropped_clauses += len(GATE_TEMPLATES[node['type']]['clauses'])
+
+    stats = {
+        "nodes": len(dropped),
+        "variables": len(dropped_vars),
+        "clauses": dropped_clauses,
+        "free_vulnerable": len(graph.vulnerable - cone),
+    }
+    logging.info(f"Cone of influence slicing dropped {stats['nodes']} of {len(graph)} nodes, "
+                 f"{stats['variables']} variables, {stats['clauses']} clauses")
+    if stats['free_vulnerable']:
+        logging.info(f"  - {stats['free_vulnerable']} vulnerable nodes lie outside the cone and are kept with free inputs")
+
+    sliced = dict(circuit)
+    sliced['nodes'] = nodes
+    return sliced, CircuitGraph(nodes), stats
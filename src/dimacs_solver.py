@@ -0,0 +1,45 @@
+import sys
+import time
+import argparse
+from binary_cnf import read_dimacs, read_dimacs_fp
+from external_solver import EXIT_SAT, EXIT_UNSAT
+
+# Literals per 'v' line of the model
+MODEL_LINE_LITERALS = 20
+
+
+def write_result(out, is_sat, model):
+    # SAT competition output: an 's' verdict line, then the model on 'v' lines ending with 0
+    out.write(f"s {'SATISFIABLE' if is_sat else 'UNSATISFIABLE'}\n")
+    if is_sat:
+        model = list(model) + [0]
+        for i in range(0, len(model), MODEL_LINE_LITERALS):
+            out.write('v ' + ' '.join(map(str, model[i:i + MODEL_LINE_LITERALS])) + '\n')
+    out.flush()
+
+
+def main():
+    # Stand-in for a competition SAT solver, for testing the external solver driver
+    # without installing one: reads DIMACS (stdin or a file), solves it with a
+    # PySAT backend and exits with 10 (SAT) or 20 (UNSAT)
+    parser = argparse.ArgumentParser(description='Solve DIMACS with PySAT and print SAT competition output')
+    parser.add_argument('file', nargs='?', help='DIMACS file (default: read stdin)')
+    parser.add_argument('--solver', default='m22', help='PySAT solver name (default: m22)')
+    parser.add_argument('--delay', type=float, default=0.0, help='Sleep this many seconds first, to simulate a slow solver')
+    args = parser.parse_args()
+
+    from pysat.solvers import Solver
+    cnf = read_dimacs(args.file) if args.file else read_dimacs_fp(sys.stdin, '<stdin>')
+    sys.stdout.write(f"c {args.solver}: {cnf.nv} variables, {len(cnf)} clauses\n")
+    if args.delay:
+        time.sleep(args.delay)
+
+    with Solver(name=args.solver) as solver:
+        cnf.add_to_solver(solver)
+        is_sat = solver.solve()
+        write_result(sys.stdout, is_sat, solver.get_model() if is_sat else None)
+    sys.exit(EXIT_SAT if is_sat else EXIT_UNSAT)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+import sys
+import time
+import shlex
+import logging
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Exit codes of SAT competition solvers
+EXIT_SAT = 10
+EXIT_UNSAT = 20
+
+# Verdicts of the competition output format ('s' line)
+STATUS_LINES = {
+    'SATISFIABLE': 'SAT',
+    'UNSATISFIABLE': 'UNSAT',
+    'UNKNOWN': 'UNKNOWN',
+}
+
+
+def parse_solver_output(lines):
+    """Parse SAT competition output
+
+    Args:
+        lines (iterable): Solver stdout lines ('c' comments, one 's' line, 'v' model lines)
+
+    Returns:
+        tuple: (status, model), status is 'SAT', 'UNSAT', 'UNKNOWN' or None without an 's' line,
+            model is the list of 'v' literals without the closing 0 (None if there was none)
+    """
+    status = None
+    model = None
+    for line in lines:
+        if line.startswith('s '):
+            status = STATUS_LINES.get(line[2:].strip(), 'UNKNOWN')
+        elif line.startswith('v '):
+            if model is None:
+                model = []
+            model.extend(int(lit) for lit in line[2:].split() if lit != '0')
+        elif line.strip() in STATUS_LINES and status is None:
+            # MiniSat and some older solvers print the bare verdict
+            status = STATUS_LINES[line.strip()]
+    return status, model
+
+
+def _write_formula(cnf, stdin, errors):
+    # Stream the formula as DIMACS, a solver that stops reading early closes the pipe
+    try:
+        cnf.to_fp(stdin)
+    except (BrokenPipeError, OSError) as e:
+        errors.append(e)
+    finally:
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+
+class ExternalSolver:
+    def __init__(self, command, timeout=None):
+        # Drive an external solver over pipes: the formula is streamed to its
+        # stdin as DIMACS and the verdict and model are read from its stdout in
+        # SAT competition format, nothing is written to disk
+        # command is a list of arguments or a shell-style string
+        self.command = shlex.split(command) if isinstance(command, str) else list(command)
+        if not self.command:
+            raise ValueError("External solver command is empty")
+        self.timeout = timeout
+
+    def run(self, cnf):
+        """Run the solver once on a formula
+
+        Args:
+            cnf: ClauseStore or pysat CNF
+
+        Returns:
+            dict: status ('SAT', 'UNSAT', 'UNKNOWN' or 'TIMEOUT'), model, time and returncode
+        """
+        start_time = time.time()
+        try:
+            proc = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, text=True)
+        except FileNotFoundError:
+            raise ValueError(f"External solver executable not found: {self.command[0]}")
+
+        # Writing and reading run concurrently, a solver printing while the
+        # formula is still being sent would otherwise deadlock on a full pipe
+        errors = []
+        writer = threading.Thread(target=_write_formula, args=(cnf, proc.stdin, errors), daemon=True)
+        writer.start()
+        stderr = []
+        stderr_reader = threading.Thread(target=lambda: stderr.extend(proc.stderr), daemon=True)
+        stderr_reader.start()
+        lines = []
+        stdout_reader = threading.Thread(target=lambda: lines.extend(proc.stdout), daemon=True)
+        stdout_reader.start()
+
+        timed_out = False
+        try:
+            proc.wait(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            proc.kill()
+            proc.wait()
+        writer.join()
+        stdout_reader.join()
+        stderr_reader.join()
+        elapsed = time.time() - start_time
+
+        if timed_out:
+            logging.info(f"External solver timed out after {self.timeout} seconds")
+            return {"status": 'TIMEOUT', "model": None, "time": elapsed, "returncode": proc.returncode}
+
+        status, model = parse_solver_output(lines)
+        if status is None:
+            detail = ''.join(stderr).strip().splitlines()[-1:] or [f"exit code {proc.returncode}"]
+            if errors:
+                detail[0] += f", formula not fully sent: {errors[0]}"
+            raise ValueError(f"External solver gave no verdict: {detail[0]}")
+        if proc.returncode not in (0, EXIT_SAT, EXIT_UNSAT):
+            logging.warning(f"External solver exited with code {proc.returncode}")
+        if status == 'SAT' and model is None:
+            raise ValueError("External solver reported SAT without a model ('v' lines)")
+        logging.info(f"External solver result: {status}, time taken: {elapsed:.2f} seconds")
+        return {"status": status, "model": model, "time": elapsed, "returncode": proc.returncode}
+
+    def solve(self, cnf):
+        # Same result as SATSolver.solve_with_library: a timeout or an UNKNOWN answer is None
+        result = self.run(cnf)
+        if result['status'] in ('TIMEOUT', 'UNKNOWN'):
+            return None, None
+        return result['status'] == 'SAT', result['model']
+
+
+class ExternalSolverPool:
+    def __init__(self, command, workers, timeout=None):
+        # Run many formulas through an external solver with at most `workers`
+        # solver processes alive at once; the threads only move pipe data
+        self.solver = ExternalSolver(command, timeout)
+        self.workers = workers
+
+    def _run(self, label, cnf):
+        try:
+            result = self.solver.run(cnf() if callable(cnf) else cnf)
+        except (ValueError, OSError) as e:
+            result = {"status": 'ERROR', "model": None, "time": None, "returncode": None, "error": str(e)}
+        return dict(result, label=label)
+
+    def run_all(self, jobs):
+        """Solve every job, yielding results as the solvers finish
+
+        Args:
+            jobs (iterable): (label, formula) pairs, a formula may be a callable
+                returning it so it is only loaded once a solver slot is free
+
+        Yields:
+            dict: Result of ExternalSolver.run plus the label ('ERROR' status and error on failure)
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._run, label, cnf) for label, cnf in jobs]
+            for future in as_completed(futures):
+                yield future.result()
+
+
+def main():
+    from binary_cnf import load_cnf
+    parser = argparse.ArgumentParser(description='Solve CNF files (DIMACS or binary) with an external solver over pipes')
+    parser.add_argument('files', nargs='+', help='CNF files to solve')
+    parser.add_argument('--solver-cmd', required=True,
+                        help="Solver command line, reads DIMACS on stdin and prints competition output (e.g. 'kissat -q')")
+    parser.add_argument('--jobs', type=int, default=1, help='Solver processes run concurrently (default: 1)')
+    parser.add_argument('--timeout', type=float, help='Per-file time limit in seconds')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.jobs <= 0:
+        logging.error("Error: jobs must be a positive integer")
+        sys.exit(1)
+    try:
+        pool = ExternalSolverPool(args.solver_cmd, args.jobs, args.timeout)
+    except ValueError as e:
+        logging.error(f"Error: {e}")
+        sys.exit(1)
+
+    failed = False
+    jobs = [(path, lambda path=path: load_cnf(path)) for path in args.files]
+    for result in pool.run_all(jobs):
+        if result['status'] == 'ERROR':
+            failed = True
+            print(f"{result['label']}: ERROR {result['error']}")
+        else:
+            print(f"{result['label']}: {result['status']} ({result['time']:.2f} s)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import json
+import time
+import logging
+import threading
+from pysat.solvers import Minisat22
+from clause_store import ClauseStore
+
+
+class FaultEnumerator:
+    def __init__(self, cnf, control_vars):
+        # Enumerate every subset-minimal fault vector of an encoded circuit
+        # A fault vector is the set of control variables set to 1 in a model.
+        # Each one found is shrunk until no proper subset is still an attack,
+        # then blocked with a clause over the controls only, which removes it
+        # and all its supersets. One incremental solver is used throughout.
+        self.control_vars = control_vars
+        self.node_of_var = {var: node_id for node_id, var in control_vars.items()}
+        self.solver = Minisat22()
+        if isinstance(cnf, ClauseStore):
+            cnf.add_to_solver(self.solver)
+        else:
+            self.solver.append_formula(cnf)
+        self.deadline = None
+        self.timed_out = False
+        # True once enumeration ran out of vectors rather than budget or cap
+        self.complete = False
+        self.solver_calls = 0
+
+    def _solve(self, assumptions):
+        # Solve under assumptions, returns True, False or None once the budget is spent
+        if self.deadline is None:
+            self.solver_calls += 1
+            return self.solver.solve(assumptions=assumptions)
+
+        remaining = self.deadline - time.time()
+        if remaining <= 0:
+            self.timed_out = True
+            return None
+        timer = threading.Timer(remaining, self.solver.interrupt)
+        timer.start()
+        try:
+            self.solver_calls += 1
+            result = self.solver.solve_limited(assumptions=assumptions, expect_interrupt=True)
+        finally:
+            timer.cancel()
+            self.solver.clear_interrupt()
+        if result is None:
+            self.timed_out = True
+        return result
+
+    def _active_controls(self):
+        model = self.solver.get_model()
+        return [var for var in self.node_of_var if model[var - 1] > 0]
+
+    def _minimize(self, controls):
+        # Shrink a fault vector until dropping any single fault makes it safe
+        # Assumptions fix every control outside the candidate to 0, so a model
+        # may be any subset of the candidate and the vector shrinks as it goes
+        # Returns the minimal controls, or None if the budget ran out
+        current = list(controls)
+        i = 0
+        while i < len(current):
+            candidate = set(current[:i] + current[i + 1:])
+            assumptions = [-var for var in self.node_of_var if var not in candidate]
+            result = self._solve(assumptions)
+            if result is None:
+                return None
+            if result:
+                active = set(self._active_controls())
+                current = [var for var in current if var in active]
+                # Kept faults before position i were already found necessary
+                i = min(i, len(current))
+            else:
+                i += 1
+        return current
+
+    def enumerate(self, output_file=None, max_vectors=None, time_budget=None):
+        """Enumerate minimal fault vectors until none are left or a limit is hit
+
+        Args:
+            output_file (str): JSON Lines file, one vector per line as it is found
+            max_vectors (int): Stop after this many vectors
+            time_budget (float): Stop after this many seconds
+
+        Yields:
+            dict: index, fault_vector (node ids), size and time since start
+        """
+        start_time = time.time()
+        self.deadline = start_time + time_budget if time_budget is not None else None
+        out = open(output_file, 'w') if output_file else None
+        found = 0
+        try:
+            while max_vectors is None or found < max_vectors:
+                result = self._solve([])
+                if not result:
+                    self.complete = result is False
+                    break
+                minimal = self._minimize(self._active_controls())
+                if minimal is None:
+                    break
+
+                # Blocks this vector and every superset of it
+                self.solver.add_clause([-var for var in minimal])
+                found += 1
+                record = {
+                    "index": found,
+                    "fault_vector": [self.node_of_var[var] for var in minimal],
+                    "size": len(minimal),
+                    "time": time.time() - start_time,
+                }
+                if out:
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+                logging.debug(f"Minimal fault vector {found}: {record['fault_vector']}")
+                yield record
+        finally:
+            if out:
+                out.close()
+
+        elapsed = time.time() - start_time
+        if self.complete:
+            logging.info(f"Enumerated all {found} minimal fault vectors")
+        elif self.timed_out:
+            logging.info(f"Time budget of {time_budget} seconds spent after {found} minimal fault vectors")
+        else:
+            logging.info(f"Stopped at the cap of {max_vectors} minimal fault vectors")
+        logging.info(f"Enumeration used {self.solver_calls} solver calls, time taken: {elapsed:.2f} seconds")
+
+    def delete(self):
+        self.solver.delete()
@@ -0,0 +1,248 @@
+import time
+import heapq
+import logging
+from itertools import combinations
+from circuit_graph import CircuitGraph
+from cli_args import DEFAULT_PATTERNS, DEFAULT_BUDGET
+
+# NumPy, imported by the first simulator
+np = None
+
+# Patterns simulated side by side in one machine word
+WORD_BITS = 64
+
+# Node types the encoder gives fault logic when vulnerable (registers only with an input)
+FAULTABLE_TYPES = ('xor', 'and', 'or', 'not', 'mux', 'reg', 'output')
+
+ALL_ONES = 0xFFFFFFFFFFFFFFFF
+
+
+class FaultSimulator:
+    def __init__(self, circuit, patterns=DEFAULT_PATTERNS, seed=None):
+        # Bit-parallel random simulation of the fault semantics the encoder builds
+        # Every node value is a vector of uint64 words, bit i of each word
+        # belonging to pattern i, so one NumPy operation evaluates a gate for 64
+        # patterns per word. As in the formula, a fault changes the faulty output
+        # of its node, which only the comparators (cmp*) read; a counterexample
+        # is a set of at most n_e faults and an input pattern where every fault
+        # changes its node's faulty output and, with the detection
+        # countermeasure, flag stays 0. It is a model of the encoded formula, so
+        # the circuit is vulnerable without running the SAT solver.
+        # circuit is the parsed JSON, with the command line overrides applied
+        global np
+        import numpy as np
+        self.circuit = circuit
+        self.graph = CircuitGraph(circuit['nodes'])
+        self.words = max(1, -(-patterns // WORD_BITS))
+        self.patterns = self.words * WORD_BITS
+        self.rng = np.random.default_rng(seed)
+
+        self.fault_type = circuit['fault_model'].get('fault_type', 'bit-flip')
+        if self.fault_type not in ('bit-flip', 'set', 'reset'):
+            logging.warning(f"Invalid fault type {self.fault_type}, using default type 'bit-flip'")
+            self.fault_type = 'bit-flip'
+        self.n_e = circuit['fault_model']['n_e']
+
+        self.detection = circuit['countermeasure'] == 'detection'
+        flag_node = self.graph.get_node('flag')
+        if self.detection and (flag_node is None or flag_node['type'] != 'output' or not flag_node.get('inputs')):
+            raise ValueError("Missing flag node or its input")
+
+        self.order = self._topological_order()
+        # Fault locations in netlist order, the order of the control variables
+        self.faultable = [node_id for node_id in self.graph.order if self._is_faultable(self.graph.get_node(node_id))]
+        self.position = {node_id: index for index, node_id in enumerate(self.order)}
+        # Faulty outputs are only read by comparators
+        self.cmp_readers = {node_id: [reader for reader in self.graph.get_fanout(node_id)
+                                      if reader in self.graph and self._is_cmp(self.graph.get_node(reader))]
+                            for node_id in self.faultable}
+        self.stats = {}
+
+    def _is_faultable(self, node):
+        if not node.get('vulnerable', False) or node['type'] not in FAULTABLE_TYPES:
+            return False
+        return node['type'] != 'reg' or bool(node.get('inputs'))
+
+    def _is_cmp(self, node):
+        return node['type'] == 'xor' and node['id'].startswith('cmp')
+
+    def _topological_order(self):
+        # Node ids with every input before its readers, the netlist need not be ordered
+        order = []
+        state = {}
+        for root in self.graph.order:
+            if root in state:
+                continue
+            stack = [(root, iter(self.graph.get_fanin(root)))]
+            state[root] = 'open'
+            while stack:
+                node_id, inputs = stack[-1]
+                for input_id in inputs:
+                    if input_id not in self.graph:
+                        continue
+                    if state.get(input_id) == 'open':
+                        # The formula reads a register as its input in the same cycle, so a
+                        # loop through a register is a fixed point only SAT can answer
+                        raise ValueError(f"Cycle through node {input_id}, cannot simulate")
+                    if input_id not in state:
+                        state[input_id] = 'open'
+                        stack.append((input_id, iter(self.graph.get_fanin(input_id))))
+                        break
+                else:
+                    stack.pop()
+                    state[node_id] = 'done'
+                    order.append(node_id)
+        return order
+
+    def _random_word(self):
+        return self.rng.integers(0, ALL_ONES, size=self.words, dtype=np.uint64, endpoint=True)
+
+    def _inject(self, value):
+        # Faulty output of a faulted node, for every pattern at once
+        if self.fault_type == 'bit-flip':
+            return ~value
+        if self.fault_type == 'set':
+            return np.full_like(value, ALL_ONES)
+        return np.zeros_like(value)
+
+    def _gate(self, node, read, read_faulty):
+        # Value of one node from its inputs, comparators read the faulty outputs
+        node_type = node['type']
+        inputs = node.get('inputs') or []
+        if node_type == 'xor':
+            operand = read_faulty if self._is_cmp(node) else read
+            return operand(inputs[0]) ^ operand(inputs[1])
+        if node_type == 'and':
+            return read(inputs[0]) & read(inputs[1])
+        if node_type == 'or':
+            return read(inputs[0]) | read(inputs[1])
+        if node_type == 'not':
+            return ~read(inputs[0])
+        if node_type == 'mux':
+            sel = read(inputs[2])
+            return (read(inputs[0]) & ~sel) | (read(inputs[1]) & sel)
+        if node_type in ('reg', 'output'):
+            if not inputs:
+                if node_type == 'output':
+                    raise ValueError(f"Output node {node['id']} has no valid inputs")
+                # A register without input is a free variable of the formula
+                return self.free[node['id']]
+            return read(inputs[0])
+        if node_type == 'const0':
+            return np.zeros(self.words, dtype=np.uint64)
+        if node_type == 'const1':
+            return np.full(self.words, ALL_ONES, dtype=np.uint64)
+        if node_type == 'input':
+            return self.free[node['id']]
+        raise ValueError(f"Unknown node type: {node_type}")
+
+    def _simulate_base(self):
+        # Draw fresh patterns and evaluate every node without faults
+        self.free = {}
+        for node_id in self.order:
+            node = self.graph.get_node(node_id)
+            if node['type'] == 'input' or (node['type'] == 'reg' and not node.get('inputs')):
+                self.free[node_id] = self._random_word()
+        for node_id in self.order:
+            for input_id in self.graph.get_fanin(node_id):
+                # Undefined inputs are free variables as well
+                if input_id not in self.graph and input_id not in self.free:
+                    self.free[input_id] = self._random_word()
+
+        values = dict(self.free)
+        read = values.__getitem__
+        for node_id in self.order:
+            values[node_id] = self._gate(self.graph.get_node(node_id), read, read)
+        self.values = values
+
+    def _hits(self, faults):
+        # Patterns where this fault set is a counterexample, as a bit mask per word
+        base = self.values
+        faulty = {node_id: self._inject(base[node_id]) for node_id in faults}
+        changed = {}
+
+        def read(node_id):
+            value = changed.get(node_id)
+            return base[node_id] if value is None else value
+
+        def read_faulty(node_id):
+            value = faulty.get(node_id)
+            return read(node_id) if value is None else value
+
+        # Event-driven: a node is re-evaluated, in topological order, only when
+        # a faulty output it reads or one of its inputs changed value
+        pending = [(self.position[reader], reader) for node_id in faults for reader in self.cmp_readers[node_id]]
+        heapq.heapify(pending)
+        while pending:
+            _, node_id = heapq.heappop(pending)
+            if node_id in changed:
+                continue
+            value = self._gate(self.graph.get_node(node_id), read, read_faulty)
+            changed[node_id] = value
+            readers = []
+            if not np.array_equal(value, base[node_id]):
+                readers = self.graph.get_fanout(node_id)
+            elif node_id in faulty:
+                readers = self.cmp_readers[node_id]
+            if node_id in faulty:
+                faulty[node_id] = self._inject(value)
+            for reader in readers:
+                if reader in self.graph and reader not in changed:
+                    heapq.heappush(pending, (self.position[reader], reader))
+
+        # Every fault has to change its node's faulty output
+        hits = np.full(self.words, ALL_ONES, dtype=np.uint64)
+        for node_id in faults:
+            hits &= faulty[node_id] ^ read(node_id)
+        if self.detection:
+            hits &= ~read('flag')
+        return hits
+
+    def _counterexample(self, faults, hits):
+        # Fault vector and input values of the first pattern that hits
+        word = int(np.flatnonzero(hits)[0])
+        bit = (int(hits[word]) & -int(hits[word])).bit_length() - 1
+        inputs = {node_id: (int(value[word]) >> bit) & 1 for node_id, value in self.free.items()}
+        return {"fault_vector": list(faults), "inputs": inputs, "pattern": word * WORD_BITS + bit}
+
+    def run(self, n_e=None, time_budget=DEFAULT_BUDGET):
+        """Search for a counterexample over random patterns and every allowed fault set
+
+        Args:
+            n_e (int): Maximum number of faults, the fault model's n_e if None
+            time_budget (float): Seconds after which the search gives up, None for no limit
+
+        Returns:
+            dict: fault_vector (node ids), inputs (free variable values) and pattern
+                index of the first counterexample found, None if there was none
+        """
+        start_time = time.time()
+        n_e = min(n_e if n_e is not None else self.n_e, len(self.faultable))
+        self.stats = {"patterns": self.patterns, "fault_sets": 0, "complete": False, "time": 0.0}
+        logging.info(f"Simulating {self.patterns} random patterns, {self.fault_type} faults on "
+                     f"{len(self.faultable)} vulnerable nodes, up to {n_e} at once")
+
+        self._simulate_base()
+        result = None
+        try:
+            for size in range(1, n_e + 1):
+                for faults in combinations(self.faultable, size):
+                    if time_budget is not None and time.time() - start_time > time_budget:
+                        logging.info(f"Simulation budget of {time_budget} seconds spent after "
+                                     f"{self.stats['fault_sets']} fault sets")
+                        return None
+                    self.stats["fault_sets"] += 1
+                    hits = self._hits(faults)
+                    if hits.any():
+                        result = self._counterexample(faults, hits)
+                        return result
+            self.stats["complete"] = True
+            return None
+        finally:
+            self.stats["time"] = time.time() - start_time
+            if result:
+                logging.info(f"Simulation found a counterexample after {self.stats['fault_sets']} fault sets, "
+                             f"faults: {result['fault_vector']}, time taken: {self.stats['time']:.2f} seconds")
+            else:
+                logging.info(f"Simulation found no counterexample in {self.stats['fault_sets']} fault sets, "
+                             f"time taken: {self.stats['time']:.2f} seconds")
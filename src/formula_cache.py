@@ -0,0 +1,145 @@
+import os
+import sys
+import json
+import struct
+import logging
+from array import array
+from clause_store import ClauseStore
+from cnf_encoder import ENCODER_VERSION
+from cli_args import DEFAULT_MAX_BYTES
+
+# Entry layout, little-endian: header, int32 literals, int64 clause offsets,
+# then the variable tables and clause provenance as UTF-8 JSON
+CACHE_MAGIC = b'FICACHE\x00'
+CACHE_FORMAT = 2
+HEADER = struct.Struct('<8sIQQQQ')
+ENTRY_SUFFIX = '.fcache'
+
+# First line of a DIMACS file written for a cached formula
+KEY_COMMENT = 'c formula key '
+
+
+def formula_key(json_bytes, options):
+    # Content address of an encoded formula
+    # The raw circuit JSON plus every option that changes the clauses, and the
+    # encoder version so a changed encoder never serves stale formulas
+    import hashlib
+    digest = hashlib.sha256(json_bytes)
+    options = dict(options, encoder_version=ENCODER_VERSION)
+    digest.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def dimacs_key(cnf_file):
+    # Formula key recorded in a DIMACS file's first line, None if there is none
+    try:
+        with open(cnf_file, 'r') as f:
+            first_line = f.readline().strip()
+    except FileNotFoundError:
+        return None
+    if first_line.startswith(KEY_COMMENT):
+        return first_line[len(KEY_COMMENT):]
+    return None
+
+
+def _to_little_endian(buffer):
+    if sys.byteorder == 'big':
+        buffer = array(buffer.typecode, buffer)
+        buffer.byteswap()
+    return buffer
+
+
+class FormulaCache:
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        # On-disk cache of encoded formulas, one file per key
+        # Reading an entry refreshes its modification time, and after every
+        # store the least recently used entries are removed until the total
+        # size fits in max_bytes
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """Load a cached formula
+
+        Args:
+            key (str): Key from formula_key
+
+        Returns:
+            tuple: (ClauseStore, tables dict) or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        magic, version, nv, n_lits, n_offsets, meta_len = HEADER.unpack_from(data)
+        if magic != CACHE_MAGIC or version != CACHE_FORMAT:
+            logging.warning(f"Ignoring cache entry {path} with an unknown format")
+            return None
+
+        pos = HEADER.size
+        lits = array('i')
+        lits.frombytes(data[pos:pos + 4 * n_lits])
+        pos += 4 * n_lits
+        offsets = array('q')
+        offsets.frombytes(data[pos:pos + 8 * n_offsets])
+        pos += 8 * n_offsets
+        if sys.byteorder == 'big':
+            lits.byteswap()
+            offsets.byteswap()
+        tables = json.loads(data[pos:pos + meta_len].decode('utf-8'))
+
+        os.utime(path)
+        logging.info(f"Formula cache hit {key[:12]}: {len(offsets) - 1} clauses, {nv} variables")
+        return ClauseStore.from_arrays(lits, offsets, nv), tables
+
+    def put(self, key, encoder):
+        # Store an encoder's formula and variable tables, then evict to the size limit
+        cnf = encoder.cnf
+        tables = {
+            "variable_map": encoder.variable_map,
+            "control_vars": encoder.control_vars,
+            "faulty_outputs": encoder.faulty_outputs,
+            "next_var": encoder.next_var,
+            "clause_stats": encoder.clause_stats,
+            "provenance": encoder.get_provenance(),
+        }
+        meta = json.dumps(tables).encode('utf-8')
+        lits = array('i', cnf.lits) if not isinstance(cnf.lits, array) else cnf.lits
+        offsets = array('q', cnf.offsets) if not isinstance(cnf.offsets, array) else cnf.offsets
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(CACHE_MAGIC, CACHE_FORMAT, cnf.nv, len(lits), len(offsets), len(meta)))
+            f.write(_to_little_endian(lits).tobytes())
+            f.write(_to_little_endian(offsets).tobytes())
+            f.write(meta)
+        # Readers never see a partially written entry
+        os.replace(tmp_path, path)
+        logging.info(f"Formula cached as {key[:12]} ({os.path.getsize(path)} bytes)")
+        self._evict(keep=path)
+
+    def _evict(self, keep=None):
+        # Remove least recently used entries until the cache fits its size limit
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(ENTRY_SUFFIX):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            os.remove(path)
+            total -= size
+            logging.info(f"Evicted cached formula {os.path.basename(path)}")
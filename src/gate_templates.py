@@ -0,0 +1,60 @@
+# Clause templates for every gate type and fault model
+#
+# Each template lists its slots in the order the encoder allocates their
+# variables: 'out' is the node itself, an integer is an index into the node's
+# 'inputs'. Clauses are tuples of signed 1-based slot positions, so (-2, -3, -1)
+# means [-slot2, -slot3, -slot1]. Clause order matches the CNFEncoder._encode_*
+# methods exactly, which keeps template-based encoders bit-identical to them.
+
+GATE_TEMPLATES = {
+    'xor': {
+        'slots': ('out', 0, 1),
+        'clauses': ((-2, -3, -1), (2, 3, -1), (-2, 3, 1), (2, -3, 1)),
+    },
+    'and': {
+        'slots': ('out', 0, 1),
+        'clauses': ((2, -1), (3, -1), (-2, -3, 1)),
+    },
+    'or': {
+        'slots': (0, 1, 'out'),
+        'clauses': ((-1, 3), (-2, 3), (1, 2, -3)),
+    },
+    'not': {
+        'slots': ('out', 0),
+        'clauses': ((2, 1), (-2, -1)),
+    },
+    'mux': {
+        'slots': ('out', 0, 1, 2),
+        'clauses': ((4, -2, 1), (4, 2, -1), (-4, -3, 1), (-4, 3, -1)),
+    },
+    'reg': {
+        'slots': ('out', 0),
+        'clauses': ((-2, 1), (2, -1)),
+    },
+    'output': {
+        'slots': ('out', 0),
+        'clauses': ((-2, 1), (2, -1)),
+    },
+    # Constant nodes are never read from a netlist, structural hashing adds them
+    'const0': {
+        'slots': ('out',),
+        'clauses': ((-1,),),
+    },
+    'const1': {
+        'slots': ('out',),
+        'clauses': ((1,),),
+    },
+}
+
+# Fault logic slots are (output, control, faulty_output)
+FAULT_TEMPLATES = {
+    'bit-flip': ((2, 1, -3), (2, -1, 3), (-2, 1, 3), (-2, -1, -3)),
+    'set': ((2, 1, -3), (2, -1, 3), (-2, 1, 3), (-2, -1, 3)),
+    'reset': ((2, 1, -3), (2, -1, 3), (-2, 1, -3), (-2, -1, -3)),
+}
+
+
+def instantiate(clauses, slot_vars):
+    # Turn a template into concrete clauses for one node
+    # slot_vars[i] is the variable bound to slot i + 1
+    return [[slot_vars[abs(lit) - 1] if lit > 0 else -slot_vars[abs(lit) - 1] for lit in clause] for clause in clauses]
@@ -1,48 +1,23 @@
 import os
 import sys
-import argparse
 import logging
 import json
 import time
 from datetime import datetime
-from cnf_encoder import CNFEncoder
-from sat_solver import SATSolver
-from clause_display import display_categorized_clauses
+from cnf_encoder import CNFEncoder, formula_fields
+from binary_cnf import load_cnf
+from formula_cache import FormulaCache, formula_key, dimacs_key, KEY_COMMENT
+from cli_args import build_parser, validate_args, BINARY_CNF_SUFFIX, DEFAULT_BUDGET
 
-def setup_logging():
+def setup_logging(debug=False):
     logging.basicConfig(
-        level=logging.DEBUG,
+        level=logging.DEBUG if debug else logging.INFO,
         format='%(asctime)s - %(levelname)s - %(message)s',
         handlers=[
             logging.StreamHandler()
         ]
     )
 
-def validate_args(args):
-    valid_circuits = ['lfsr', 'xor_cipher', 'sbox', 'shift_cipher', 'mixcolumn']
-    if args.circuit not in valid_circuits:
-        logging.error(f"Error: Invalid circuit name. Please choose from: {', '.join(valid_circuits)}")
-        return False
-    
-    # Check n_e
-    if args.n_e is not None and args.n_e <= 0:
-        logging.error("Error: n_e must be a positive integer")
-        return False
-    
-    # Check fault type
-    valid_fault_types = ['bit-flip', 'set', 'reset']
-    if args.fault_type is not None and args.fault_type not in valid_fault_types:
-        logging.error(f"Error: Invalid fault type. Please choose from: {', '.join(valid_fault_types)}")
-        return False
-    
-    # Check countermeasure type
-    valid_countermeasures = ['detection', 'correction']
-    if args.countermeasure is not None and args.countermeasure not in valid_countermeasures:
-        logging.error(f"Error: Invalid countermeasure type. Please choose from: {', '.join(valid_countermeasures)}")
-        return False
-    
-    return True
-
 def modify_json_if_needed(json_data, args):
     modified = False
     
@@ -64,26 +39,147 @@ def modify_json_if_needed(json_data, args):
         modified = True
         logging.info(f"Modified JSON: countermeasure = {args.countermeasure}")
     
+    # Modify cardinality encoding
+    if args.card_encoding is not None:
+        json_data['fault_model']['card_encoding'] = args.card_encoding
+        modified = True
+        logging.info(f"Modified JSON: card_encoding = {args.card_encoding}")
+    
     return json_data, modified
 
-def main():
-    setup_logging()
+def json_overrides(args):
+    # Circuit JSON fields the command line overrides, for encoders that parse the JSON themselves
+    return {
+        "n_e": args.n_e,
+        "fault_type": args.fault_type,
+        "countermeasure": args.countermeasure,
+        "card_encoding": args.card_encoding,
+    }
+
+def formula_options(json_data, args):
+    # Everything besides the circuit JSON that changes the encoded formula
+    # json_data must be the circuit handed to the encoder, with the command
+    # line overrides applied, so the key describes the formula actually encoded
+    return dict(formula_fields(json_data), slice=args.slice, strash=args.strash, polarity=args.polarity)
+
+def check_cached_formula(encoder, args):
+    # Self-check a cached or loaded formula, the circuit gets the same
+    # transformations the formula was encoded from
+    if args.strash:
+        encoder.apply_structural_hash()
+    if args.slice:
+        encoder.apply_cone_slice()
+    encoder.polarity = args.polarity
+    return encoder.test_cnf(args.self_check)
+
+def run_multi_cycle(json_file, args):
+    # Verify the circuit over several clock cycles with incremental time-frame expansion
+    from unroller import TimeFrameUnroller
+    encoder = CNFEncoder(json_file, overrides=json_overrides(args))
+    if args.strash:
+        encoder.apply_structural_hash()
+    if args.slice:
+        encoder.apply_cone_slice()
+    if args.polarity:
+        logging.warning("Polarity encoding is not supported for multi-cycle verification, using full gate clauses")
+    unroller = TimeFrameUnroller(encoder, n_e=args.n_e, card_encoding=args.card_encoding)
+    try:
+        results = unroller.verify(args.cycles)
+    finally:
+        unroller.delete()
+    
+    for result in results:
+        status = "has vulnerability" if result['sat'] else "is fault resistant"
+        print(f"Cycles 1-{result['cycles']}: circuit {status} ({result['time']:.2f} s)")
+    
+    final = results[-1]
+    if final['sat']:
+        print("Circuit has vulnerability")
+        print("Fault vector:", [f"{node_id}@{cycle}" for node_id, cycle in final['fault_vector']])
+    else:
+        print("Circuit is fault resistant")
+
+def run_n_e_sweep(json_file, args):
+    # Check every n_e from 1 to the sweep bound with a single encoding and solver
+    from sat_solver import SATSolver
+    encoder = CNFEncoder(json_file, overrides=json_overrides(args))
+    cnf = encoder.encode(args.sweep_n_e, batch=args.batch_encode, incremental=True, slice_cone=args.slice,
+                         strash=args.strash, polarity=args.polarity, self_check=args.self_check)
+    
+    solver = SATSolver(use_library=not args.use_minisat, timeout=args.solver_timeout, conflict_budget=args.conflict_budget,
+                       propagation_budget=args.propagation_budget, progress_interval=args.progress)
+    results = solver.sweep_n_e(cnf, encoder.fault_bound_assumptions, args.sweep_n_e, encoder.get_control_vars())
+    
+    for result in results:
+        status = {True: "has vulnerability", False: "is fault resistant", None: "is unknown (budget exhausted)"}[result['sat']]
+        print(f"n_e = {result['n_e']}: circuit {status} ({result['time']:.2f} s)")
+    
+    final = results[-1]
+    if final['sat']:
+        print(f"Circuit has vulnerability from n_e = {final['n_e']}")
+        print("Fault vector:", final['fault_vector'])
+    elif final['sat'] is None:
+        print(f"Circuit fault resistance is unknown from n_e = {final['n_e']} (solver budget exhausted)")
+    else:
+        print(f"Circuit is fault resistant up to n_e = {final['n_e']}")
+
+def run_enumeration(json_file, args, output_file):
+    # Stream every minimal fault vector to a JSON Lines file
+    from fault_enumerator import FaultEnumerator
+    encoder = CNFEncoder(json_file, overrides=json_overrides(args))
+    cnf = encoder.encode(args.n_e, batch=args.batch_encode, card_encoding=args.card_encoding,
+                         slice_cone=args.slice, strash=args.strash,
+                         polarity=args.polarity, self_check=args.self_check)
     
+    enumerator = FaultEnumerator(cnf, encoder.get_control_vars())
+    sizes = {}
+    try:
+        for record in enumerator.enumerate(output_file, args.max_vectors, args.time_budget):
+            sizes[record['size']] = sizes.get(record['size'], 0) + 1
+            print(f"Fault vector {record['index']}: {record['fault_vector']}")
+    finally:
+        enumerator.delete()
+    
+    total = sum(sizes.values())
+    if total == 0 and enumerator.complete:
+        print("Circuit is fault resistant")
+    else:
+        status = "all" if enumerator.complete else "first"
+        print(f"Found {status} {total} minimal fault vectors, by size: {dict(sorted(sizes.items()))}")
+        print(f"Fault vectors saved to: {output_file}")
+
+def run_simulation(json_data, args):
+    # Search for a counterexample by random simulation, True if one was found and printed
+    from fault_simulator import FaultSimulator
+    budget = args.simulate_budget if args.simulate_budget is not None else DEFAULT_BUDGET
+    try:
+        simulator = FaultSimulator(json_data, patterns=args.simulate)
+        counterexample = simulator.run(time_budget=budget)
+    except ValueError as e:
+        # A netlist the simulator cannot model (e.g. a register feedback loop) is left to SAT
+        logging.warning(f"Simulation skipped: {e}, running the SAT solver")
+        return False
+    if counterexample is None:
+        logging.info("Simulation found no counterexample, running the SAT solver")
+        return False
+    print("Circuit has vulnerability (found by simulation)")
+    print("Fault vector:", counterexample['fault_vector'])
+    print("Inputs:", counterexample['inputs'])
+    return True
+
+def log_completion(start_time):
+    end_time = time.time()
+    logging.info(f"Total time: {end_time - start_time:.2f} seconds")
+    logging.info(f"End time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    logging.info("====================")
+
+def main():
     start_time = time.time()
+    args = build_parser().parse_args()
+    setup_logging(args.debug)
+    
     logging.info("=== Fault Injection Verification Tool ===")
     logging.info(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-
-    parser = argparse.ArgumentParser(description='Verify fault injection resistance of cryptographic circuits')
-    parser.add_argument('circuit', help='Circuit name (lfsr, xor_cipher, sbox, shift_cipher, mixcolumn)')
-    parser.add_argument('--use-minisat', action='store_true', help='Use external MiniSAT solver')
-    parser.add_argument('--n_e', type=int, help='Maximum number of faults per clock cycle (overrides JSON value)')
-    parser.add_argument('--fault-type', choices=['bit-flip', 'set', 'reset'], 
-                        help='Fault type (overrides JSON value)')
-    parser.add_argument('--countermeasure', choices=['detection', 'correction'], 
-                        help='Countermeasure type (overrides JSON value)')
-    parser.add_argument('--no-categorize', action='store_true', 
-                        help='Skip generating categorized clauses output')
-    args = parser.parse_args()
     
     # Validate arguments
     if not validate_args(args):
@@ -93,32 +189,119 @@ def main():
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     json_file = os.path.join(base_dir, 'inputs', f'{args.circuit}.json')
     cnf_file = os.path.join(base_dir, 'outputs', f'{args.circuit}.cnf')
+    binary_cnf_file = os.path.join(base_dir, 'outputs', f'{args.circuit}{BINARY_CNF_SUFFIX}')
     var_map_file = os.path.join(base_dir, 'outputs', f'{args.circuit}_variable_map.json')
     categorized_file = os.path.join(base_dir, 'outputs', f'{args.circuit}_categorized.txt')
     output_file = os.path.join(base_dir, 'outputs', f'{args.circuit}.out')
+    fault_vectors_file = os.path.join(base_dir, 'outputs', f'{args.circuit}_fault_vectors.jsonl')
+    portfolio_stats_file = os.path.join(base_dir, 'outputs', 'portfolio_stats.jsonl')
+    cache_dir = os.path.join(base_dir, 'outputs', 'cache')
     
     # Ensure output directory exists
     os.makedirs(os.path.dirname(cnf_file), exist_ok=True)
     
+    formula_cache = None
+    key = None
+    cached = None
+    
     try:
-        # Read JSON
-        with open(json_file, 'r') as f:
-            json_data = json.load(f)
-        
-        # Modify JSON based on command line arguments
-        json_data, json_modified = modify_json_if_needed(json_data, args)
+        if args.cycles is not None:
+            run_multi_cycle(json_file, args)
+            log_completion(start_time)
+            return
         
-        # Get countermeasure type
-        countermeasure = json_data['countermeasure']
+        if args.sweep_n_e is not None:
+            run_n_e_sweep(json_file, args)
+            log_completion(start_time)
+            return
         
-        # Create CNF encoder
-        encoder = CNFEncoder(json_file)
+        if args.enumerate:
+            run_enumeration(json_file, args, fault_vectors_file)
+            log_completion(start_time)
+            return
         
-        # Encode circuit
-        cnf = encoder.encode(args.n_e)
+        if args.stream:
+            # Streamed netlists are never loaded as a whole, the header is read while encoding
+            from netlist_stream import StreamingCNFEncoder
+            encoder = StreamingCNFEncoder(json_file, overrides=json_overrides(args))
+            cnf = encoder.encode(args.n_e, batch=args.batch_encode, card_encoding=args.card_encoding,
+                                 slice_cone=args.slice, strash=args.strash, polarity=args.polarity,
+                                 self_check=args.self_check)
+            countermeasure = encoder.circuit['countermeasure']
+        else:
+            # Read JSON
+            with open(json_file, 'rb') as f:
+                json_bytes = f.read()
+            json_data = json.loads(json_bytes)
+            
+            # Modify JSON based on command line arguments
+            json_data, json_modified = modify_json_if_needed(json_data, args)
+            
+            # Get countermeasure type
+            countermeasure = json_data['countermeasure']
+            
+            # A counterexample found by simulation is reported without encoding or solving
+            if args.simulate is not None and run_simulation(json_data, args):
+                log_completion(start_time)
+                return
+            
+            # A cached formula for the same circuit and options skips encoding
+            if not args.no_cache and not args.load_cnf:
+                formula_cache = FormulaCache(cache_dir, args.cache_size * 1024 * 1024)
+                key = formula_key(json_bytes, formula_options(json_data, args))
+                cached = formula_cache.get(key)
+            
+            if args.load_cnf:
+                # A saved formula in either format replaces encoding, binary files are mapped
+                cnf = load_cnf(args.load_cnf)
+                with open(var_map_file, 'r') as f:
+                    var_map = json.load(f)
+                encoder = CNFEncoder.from_cache(json_file, json_data, cnf, {
+                    "variable_map": var_map['variable_map'],
+                    "control_vars": var_map['control_vars'],
+                    "faulty_outputs": var_map['faulty_outputs'],
+                    "next_var": cnf.nv + 1,
+                    "clause_stats": {},
+                })
+                logging.info(f"Loaded {len(cnf)} clauses over {cnf.nv} variables from {args.load_cnf}")
+            elif cached:
+                encoder = CNFEncoder.from_cache(json_file, json_data, *cached)
+                cnf = encoder.cnf
+            
+            if args.load_cnf or cached:
+                # Check a formula that was not encoded here against the circuit it encodes
+                if args.self_check != 'off':
+                    check_cached_formula(encoder, args)
+            else:
+                # Create CNF encoder from the modified JSON, so the overrides are encoded
+                encoder = CNFEncoder(json_file, circuit=json_data)
+                
+                # Encode circuit
+                cnf = encoder.encode(args.n_e, batch=args.batch_encode, card_encoding=args.card_encoding,
+                                     slice_cone=args.slice, strash=args.strash, polarity=args.polarity,
+                                     self_check=args.self_check)
+                if formula_cache:
+                    formula_cache.put(key, encoder)
         
-        # Save CNF file
-        encoder.save_cnf(cnf_file)
+        # Save CNF file, unless it already holds this formula
+        if args.load_cnf:
+            cnf_file = args.load_cnf
+        else:
+            if args.cnf_format != 'binary':
+                if key is None:
+                    encoder.save_cnf(cnf_file)
+                elif dimacs_key(cnf_file) == key and os.path.exists(var_map_file):
+                    logging.info(f"{cnf_file} is up to date")
+                else:
+                    encoder.save_cnf(cnf_file, [f"{KEY_COMMENT}{key}"])
+                    if cached:
+                        encoder._save_variable_map()
+                        encoder._save_provenance()
+            if args.cnf_format != 'dimacs':
+                encoder.save_binary_cnf(binary_cnf_file)
+                if cached and args.cnf_format == 'binary':
+                    encoder._save_variable_map()
+                    encoder._save_provenance()
         
         # Generate categorized clauses output if not disabled
         # if not args.no_categorize and os.path.exists(var_map_file):
@@ -126,6 +309,7 @@ def main():
         #     try:
         #         import io
         #         from contextlib import redirect_stdout
+        #         from clause_display import display_categorized_clauses
                 
         #         f = io.StringIO()
         #         with redirect_stdout(f):
@@ -139,11 +323,20 @@ def main():
         #         logging.error(f"Failed to generate categorized clauses: {str(e)}")
         #         logging.debug("Continuing with SAT solving...")
         
-        # Create solver
-        solver = SATSolver(use_library=not args.use_minisat)
+        # Create solver, --parallel without a count uses every core, as does --cubes alone
+        from sat_solver import SATSolver
+        workers = None
+        if args.parallel is not None or args.cubes is not None:
+            workers = args.parallel or os.cpu_count()
+        solver = SATSolver(use_library=not args.use_minisat, workers=workers,
+                           portfolio=args.portfolio, stats_file=portfolio_stats_file,
+                           solver_cmd=args.solver_cmd, timeout=args.solver_timeout, conflict_budget=args.conflict_budget,
+                           propagation_budget=args.propagation_budget, progress_interval=args.progress,
+                           cubes=None if args.cubes is None else args.cubes or workers * 4)
         
         # Solve
-        sat, model = solver.solve(cnf, cnf_file, output_file)
+        sat, model = solver.solve(cnf, cnf_file, output_file, encoder.get_control_vars(), label=args.circuit,
+                                  input_vars=encoder.get_input_vars() if args.cubes is not None else None)
         
         # Interpret results
         is_resistant, fault_vector = solver.interpret_result(
@@ -154,17 +347,16 @@ def main():
         )
         
         # Output results
-        if is_resistant:
+        if is_resistant is None:
+            print("Circuit fault resistance is unknown (solver budget exhausted)")
+        elif is_resistant:
             print("Circuit is fault resistant")
         else:
             print("Circuit has vulnerability")
             print("Fault vector:", fault_vector)
         
         # Log total time
-        end_time = time.time()
-        logging.info(f"Total time: {end_time - start_time:.2f} seconds")
-        logging.info(f"End time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        logging.info("====================")
+        log_completion(start_time)
             
     except FileNotFoundError:
         logging.error(f"Error: Input file not found {json_file}")
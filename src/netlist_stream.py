@@ -0,0 +1,305 @@
+import os
+import re
+import json
+import logging
+from array import array
+from cnf_encoder import CNFEncoder, apply_overrides
+from gate_templates import FAULT_TEMPLATES, instantiate
+
+_WHITESPACE = re.compile(r'\s*')
+
+
+class NetlistStream:
+    def __init__(self, json_file, chunk_size=1 << 20):
+        # Incremental reader for the circuit JSON schema
+        # Nodes of the top-level 'nodes' array are decoded and yielded one at a
+        # time; every other top-level field is decoded into self.header as soon
+        # as the reader passes it, so memory does not grow with the file size
+        self.json_file = json_file
+        self.chunk_size = chunk_size
+        self.header = {}
+        self.saw_nodes = False
+        self._decoder = json.JSONDecoder()
+        self._file = None
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        # Read the next chunk, dropping the part of the buffer already consumed
+        chunk = self._file.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        # Skip whitespace and return the next character without consuming it
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return None
+
+    def _expect(self, char):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"Invalid netlist JSON in {self.json_file}: expected '{char}', found {found!r}")
+        self._pos += 1
+
+    def _decode_value(self):
+        # Decode the next complete JSON value, reading more input until it fits
+        # A value that ends exactly at the buffer end may be a truncated number, so
+        # it is only accepted once more input (or the end of file) confirms it
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise ValueError(f"Invalid netlist JSON in {self.json_file}: {e}")
+            self._fill()
+
+    def _iter_array(self):
+        self._expect('[')
+        while True:
+            char = self._peek()
+            if char == ']':
+                self._pos += 1
+                return
+            if char == ',':
+                self._pos += 1
+                continue
+            if char is None:
+                raise ValueError(f"Invalid netlist JSON in {self.json_file}: unterminated nodes array")
+            yield self._decode_value()
+
+    def iter_nodes(self):
+        # Yield the circuit's nodes in file order while filling self.header
+        with open(self.json_file, 'r') as f:
+            self._file = f
+            self._buf = ''
+            self._pos = 0
+            self._eof = False
+
+            self._expect('{')
+            while True:
+                char = self._peek()
+                if char == '}':
+                    break
+                if char == ',':
+                    self._pos += 1
+                    continue
+                if char is None:
+                    raise ValueError(f"Invalid netlist JSON in {self.json_file}: unterminated top-level object")
+
+                key = self._decode_value()
+                self._expect(':')
+                if key == 'nodes':
+                    self.saw_nodes = True
+                    yield from self._iter_array()
+                else:
+                    self.header[key] = self._decode_value()
+
+            self._file = None
+            self._buf = ''
+
+
+class StreamingGraph:
+    def __init__(self):
+        # The part of CircuitGraph a streamed encoding needs
+        # Only ids seen so far and the vulnerable subset are kept; node dicts
+        # are dropped after encoding except for the flag output and the
+        # primary inputs, which are few and needed by the cube splitter
+        self.defined = set()
+        self.vulnerable = set()
+        self.kept_nodes = {}
+        self.input_nodes = []
+
+    def add_node(self, node):
+        node_id = node['id']
+        if node_id in self.defined:
+            raise ValueError(f"Duplicate node id: {node_id}")
+        self.defined.add(node_id)
+        if node.get('vulnerable', False):
+            self.vulnerable.add(node_id)
+        if node_id == 'flag':
+            self.kept_nodes[node_id] = node
+        if node['type'] == 'input':
+            self.input_nodes.append(node)
+
+    def __contains__(self, node_id):
+        return node_id in self.defined
+
+    def __len__(self):
+        return len(self.defined)
+
+    def get_node(self, node_id):
+        return self.kept_nodes.get(node_id)
+
+    def is_vulnerable(self, node_id):
+        return node_id in self.vulnerable
+
+    def nodes_of_type(self, node_type):
+        # Only the primary inputs are kept by type
+        if node_type != 'input':
+            raise ValueError(f"Streamed graph does not keep nodes of type {node_type}")
+        return list(self.input_nodes)
+
+
+class StreamingCNFEncoder(CNFEncoder):
+    def __init__(self, json_file, overrides=None):
+        # CNF encoder that validates and encodes nodes while the netlist is read
+        # Memory is bounded by the variable tables plus the nodes waiting on a
+        # forward reference, never by the size of the JSON file
+        self.json_file = json_file
+        self.overrides = overrides or {}
+        logging.info(f"Streaming circuit {os.path.basename(json_file)}")
+        self.stream = NetlistStream(json_file)
+        self.circuit = self.stream.header
+        self.graph = StreamingGraph()
+        self.fault_type = None
+        self._init_state()
+
+        # Fault logic seen before the fault model: (output, control, faulty) triples
+        # and the netlist position of each triple's node
+        self._deferred_faults = array('i')
+        self._deferred_origins = array('i')
+        # Comparators waiting for an input definition, outputs waiting for an input variable
+        self._pending_cmp = {}
+        self._pending_outputs = {}
+
+    def _apply_overrides(self):
+        # Overrides replace header fields in place, whenever those have been read
+        self.circuit.update(apply_overrides(self.circuit, self.overrides))
+
+    def _init_fault_model(self):
+        self._apply_overrides()
+        super()._init_fault_model()
+
+    def _validate_header(self):
+        self._apply_overrides()
+        super()._validate_header()
+
+    def _iter_netlist(self):
+        # Stream the nodes again, the netlist is never held in memory
+        return NetlistStream(self.json_file).iter_nodes()
+
+    def _encode_fault_logic(self, node_id, output_var):
+        if self.fault_type is not None:
+            return super()._encode_fault_logic(node_id, output_var)
+
+        # Allocate the variables now so numbering follows the netlist order,
+        # emit the clauses once the fault model has been read
+        control = self._get_control_var(node_id)
+        faulty_output = self._get_faulty_output(node_id)
+        self._deferred_faults.extend((output_var, control, faulty_output))
+        self._deferred_origins.append(self._origin_gate[1])
+        return faulty_output
+
+    def _emit_deferred_faults(self):
+        clauses = FAULT_TEMPLATES[self.fault_type]
+        triples = self._deferred_faults
+        for i in range(0, len(triples), 3):
+            for clause in instantiate(clauses, triples[i:i + 3]):
+                self.cnf.append(clause)
+            self._mark_origin('fault', self._deferred_origins[i // 3])
+        self.clause_stats["fault_logic"] += len(triples) // 3 * len(clauses)
+        logging.info(f"Added {len(triples) // 3 * len(clauses)} deferred fault logic clauses")
+        self._deferred_faults = array('i')
+        self._deferred_origins = array('i')
+
+    def _blocking_input(self, node):
+        # Return an input this node cannot be encoded without yet, or None
+        if node['type'] == 'xor' and node['id'].startswith('cmp'):
+            # Comparators read faulty outputs, which needs the input's vulnerability flag
+            for input_id in node['inputs']:
+                if input_id not in self.graph:
+                    return input_id
+        elif node['type'] == 'output' and node.get('inputs'):
+            input_id = node['inputs'][0]
+            if input_id not in self.variable_map:
+                return input_id
+        return None
+
+    def _release(self, node_ids, encoders):
+        # Encode every waiting node whose blocking input has just become available
+        work = list(node_ids)
+        while work:
+            node_id = work.pop()
+            waiting = []
+            if node_id in self.graph:
+                waiting.extend(self._pending_cmp.pop(node_id, []))
+            if node_id in self.variable_map:
+                waiting.extend(self._pending_outputs.pop(node_id, []))
+            for node, node_index in waiting:
+                work.extend(self._encode_or_defer(node, node_index, encoders))
+
+    def _encode_or_defer(self, node, node_index, encoders):
+        # Encode a node, or park it with its netlist position until its blocking input shows up
+        # Returns the ids whose availability may have changed
+        blocker = self._blocking_input(node)
+        if blocker is not None:
+            pending = self._pending_outputs if node['type'] == 'output' else self._pending_cmp
+            pending.setdefault(blocker, []).append((node, node_index))
+            return []
+        self._encode_node(node, encoders[node['type']], node_index)
+        return [node['id']] + list(node.get('inputs') or [])
+
+    def _encode_nodes(self):
+        # Read, validate and encode the netlist node by node
+        encoders = self._node_encoders()
+        node_types = {}
+        vulnerable_nodes = 0
+
+        for node_index, node in enumerate(self.stream.iter_nodes()):
+            self._validate_node(node)
+            node_types[node['type']] = node_types.get(node['type'], 0) + 1
+            if node.get('vulnerable', False):
+                vulnerable_nodes += 1
+
+            if self.fault_type is None and 'fault_model' in self.circuit:
+                self._init_fault_model()
+
+            self.graph.add_node(node)
+            self._release(self._encode_or_defer(node, node_index, encoders) + [node['id']], encoders)
+
+        if not self.stream.saw_nodes:
+            raise ValueError("Missing required field: nodes")
+        self._validate_header()
+        if self.fault_type is None:
+            self._init_fault_model()
+        self._log_node_statistics(node_types, vulnerable_nodes)
+
+        # Comparator inputs that were never defined are plain signals, as in CircuitGraph
+        for waiting in list(self._pending_cmp.values()):
+            for node, node_index in waiting:
+                self._encode_node(node, encoders[node['type']], node_index)
+        self._pending_cmp = {}
+
+        for input_id, waiting in self._pending_outputs.items():
+            error_msg = f"Input {input_id} of output node {waiting[0][0]['id']} not found in variable mapping, violating strict validation requirement"
+            logging.error(error_msg)
+            raise ValueError(error_msg)
+
+        if self._deferred_faults:
+            self._emit_deferred_faults()
+
+    def encode(self, n_e=None, batch=False, card_encoding=None, slice_cone=False, strash=False, polarity=False,
+               self_check='off'):
+        if batch:
+            logging.warning("Batch encoding needs the whole netlist in memory, encoding streamed nodes one by one")
+        if slice_cone:
+            logging.warning("Cone of influence slicing needs the whole netlist in memory, encoding every streamed node")
+        if strash:
+            logging.warning("Structural hashing needs the whole netlist in memory, encoding streamed nodes unchanged")
+        if polarity:
+            logging.warning("Polarity analysis needs the whole netlist in memory, encoding full gate clauses")
+        # The self-check and the saved provenance read the nodes back by streaming the file again
+        return super().encode(n_e, card_encoding=card_encoding, self_check=self_check)
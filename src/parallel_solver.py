@@ -0,0 +1,342 @@
+import os
+import json
+import time
+import queue
+import logging
+from collections import Counter
+from datetime import datetime
+from cli_args import PORTFOLIO_SOLVERS
+
+
+def solver_names():
+    # Every solver name PySAT accepts, including the short aliases
+    from pysat.solvers import SolverNames
+    return {alias for names in vars(SolverNames).values() if isinstance(names, tuple) for alias in names}
+
+
+# Per-process state of a pool worker, set up once by _init_worker
+_worker = {}
+
+
+def shard_controls(control_vars, shards):
+    # Split the control variables into contiguous, disjoint shards in netlist order
+    controls = list(control_vars.values())
+    shards = max(1, min(shards, len(controls)))
+    size, extra = divmod(len(controls), shards)
+    result = []
+    start = 0
+    for i in range(shards):
+        end = start + size + (1 if i < extra else 0)
+        result.append(controls[start:end])
+        start = end
+    return result
+
+
+def _init_worker(cnf):
+    # Load the formula into one solver that serves every shard this worker gets
+    from pysat.solvers import Minisat22
+    solver = Minisat22()
+    cnf.add_to_solver(solver)
+    _worker['solver'] = solver
+    _worker['top_var'] = cnf.nv
+
+
+def _solve_shard(task):
+    # Look for an attack whose first fault (in shard order) lies in this shard
+    # Controls of earlier shards are assumed 0, controls of later shards stay
+    # free, and a selector-guarded clause asks for a fault in this shard
+    index, shard, earlier = task
+    solver = _worker['solver']
+    assumptions = [-var for var in earlier]
+    selector = None
+    if shard:
+        selector = _worker['top_var'] + index + 1
+        solver.add_clause([-selector] + shard)
+        assumptions.append(selector)
+
+    start_time = time.time()
+    is_sat = solver.solve(assumptions=assumptions)
+    elapsed = time.time() - start_time
+    model = solver.get_model() if is_sat else None
+    if selector is not None:
+        # The shard is done either way, disable its clause for later tasks
+        solver.add_clause([-selector])
+    return index, is_sat, model, elapsed
+
+
+class ShardedSolver:
+    def __init__(self, workers=None, shards_per_worker=4):
+        # Solve one formula on several cores by splitting the fault locations
+        # Shard i covers exactly the fault vectors whose lowest-numbered fault
+        # lies in shard i, so the shards are disjoint, together cover every
+        # fault vector, and the circuit is vulnerable iff some shard is SAT
+        self.workers = workers or os.cpu_count() or 1
+        self.shards_per_worker = shards_per_worker
+
+    def solve(self, cnf, control_vars):
+        """Solve the formula with a pool of worker processes
+
+        Args:
+            cnf (ClauseStore): Formula, shipped once to every worker
+            control_vars (dict): Control variable mapping, split into shards
+
+        Returns:
+            tuple: (is_sat, model), model is None when UNSAT
+        """
+        shards = shard_controls(control_vars, self.workers * self.shards_per_worker)
+        tasks = []
+        earlier = []
+        for index, shard in enumerate(shards):
+            tasks.append((index, shard, list(earlier)))
+            earlier.extend(shard)
+
+        import multiprocessing
+        start_time = time.time()
+        logging.info(f"Starting sharded solving: {len(tasks)} shards over {self.workers} worker processes")
+        pool = multiprocessing.Pool(self.workers, initializer=_init_worker, initargs=(cnf,))
+        is_sat, model = False, None
+        try:
+            for index, shard_sat, shard_model, elapsed in pool.imap_unordered(_solve_shard, tasks):
+                logging.debug(f"Shard {index}: {'SAT' if shard_sat else 'UNSAT'}, time taken: {elapsed:.2f} seconds")
+                if shard_sat:
+                    is_sat, model = True, shard_model
+                    logging.info(f"Shard {index} is SAT, cancelling the remaining shards")
+                    break
+        finally:
+            # Cancels every shard still queued or running
+            pool.terminate()
+            pool.join()
+
+        end_time = time.time()
+        logging.info(f"Solving result: {'SAT' if is_sat else 'UNSAT'}, time taken: {end_time - start_time:.2f} seconds")
+        return is_sat, model
+
+
+def _lookahead(solver, prefix, var):
+    # Propagate both polarities of var under the prefix, the score favours
+    # variables whose two branches both imply many literals
+    pos_ok, pos = solver.propagate(assumptions=prefix + [var])
+    neg_ok, neg = solver.propagate(assumptions=prefix + [-var])
+    base = len(prefix) + 1
+    return pos_ok, neg_ok, (len(pos) - base + 1) * (len(neg) - base + 1)
+
+
+def split_cubes(solver, candidates, depth):
+    """Split the search space into cubes by lookahead on the candidate variables
+
+    Args:
+        solver: PySAT solver holding the formula, only unit propagation is run on it
+        candidates (list): Branching variables, most promising first
+        depth (int): Decisions per cube, at most 2^depth cubes are produced
+
+    Returns:
+        tuple: (cubes, refuted), cubes are assumption lists covering every
+            model of the formula, refuted counts branches closed by propagation
+    """
+    cubes = []
+    refuted = 0
+    stack = [([], depth)]
+    while stack:
+        prefix, level = stack.pop()
+        ok, implied = solver.propagate(assumptions=prefix)
+        if not ok:
+            refuted += 1
+            continue
+        assigned = {abs(lit) for lit in implied}
+        free = [var for var in candidates if var not in assigned]
+        if level == 0 or not free:
+            cubes.append(prefix)
+            continue
+
+        # A failed literal forces the other polarity, the branch is re-examined
+        # with it added instead of spending a decision on it
+        best, best_score, forced = None, -1, None
+        for var in free:
+            pos_ok, neg_ok, score = _lookahead(solver, prefix, var)
+            if not pos_ok or not neg_ok:
+                forced = -var if not pos_ok else var
+                if not pos_ok and not neg_ok:
+                    forced = 0
+                break
+            if score > best_score:
+                best, best_score = var, score
+        if forced is not None:
+            refuted += 1
+            if forced:
+                stack.append((prefix + [forced], level))
+            continue
+        stack.append((prefix + [-best], level - 1))
+        stack.append((prefix + [best], level - 1))
+    return cubes, refuted
+
+
+def _solve_cube(task):
+    # Solve the formula under one cube of assumptions, with the solver
+    # statistics this cube added for the aggregate of an UNSAT proof
+    index, cube = task
+    solver = _worker['solver']
+    before = solver.accum_stats()
+    start_time = time.time()
+    is_sat = solver.solve(assumptions=cube)
+    elapsed = time.time() - start_time
+    after = solver.accum_stats()
+    stats = {key: after[key] - before[key] for key in ('conflicts', 'decisions', 'propagations')}
+    model = solver.get_model() if is_sat else None
+    return index, is_sat, model, elapsed, stats
+
+
+class CubeSolver:
+    def __init__(self, workers=None, cubes=None, max_candidates=64):
+        # Cube-and-conquer: a lookahead splitter branches on primary inputs and
+        # fault controls to cut the formula into cubes, which the worker pool
+        # solves as assumptions; the cubes cover every assignment not refuted
+        # by propagation, so the formula is SAT iff some cube is SAT
+        # cubes is the target cube count (default: 4 per worker), the splitter
+        # only scores the max_candidates variables occurring most often
+        self.workers = workers or os.cpu_count() or 1
+        self.cubes = cubes or self.workers * 4
+        self.max_candidates = max_candidates
+        self.stats = {}
+
+    def rank_candidates(self, cnf, candidates):
+        # Most frequently occurring variables first, ties in candidate order
+        counts = Counter(map(abs, cnf.lits))
+        ranked = sorted(candidates, key=lambda var: -counts[var])
+        return [var for var in ranked if counts[var]][:self.max_candidates]
+
+    def solve(self, cnf, control_vars, input_vars):
+        """Split the formula into cubes and solve them with a pool of worker processes
+
+        Args:
+            cnf (ClauseStore): Formula, shipped once to every worker
+            control_vars (dict): Control variable mapping, branching candidates
+            input_vars (dict): Primary input variable mapping, branching candidates
+
+        Returns:
+            tuple: (is_sat, model), model is None when UNSAT
+        """
+        from pysat.solvers import Minisat22
+        start_time = time.time()
+        candidates = self.rank_candidates(cnf, list(dict.fromkeys(list(input_vars.values()) + list(control_vars.values()))))
+        depth = max(1, (self.cubes - 1).bit_length())
+        splitter = Minisat22()
+        cnf.add_to_solver(splitter)
+        try:
+            cubes, refuted = split_cubes(splitter, candidates, depth)
+        finally:
+            splitter.delete()
+        split_time = time.time() - start_time
+        logging.info(f"Split into {len(cubes)} cubes of up to {depth} decisions over {len(candidates)} candidate "
+                     f"variables, {refuted} branches refuted by lookahead, time taken: {split_time:.2f} seconds")
+
+        self.stats = {"cubes": len(cubes), "refuted": refuted, "solved": 0, "split_time": split_time,
+                      "cube_time": 0.0, "max_cube_time": 0.0, "conflicts": 0, "decisions": 0, "propagations": 0}
+        is_sat, model = False, None
+        if cubes:
+            import multiprocessing
+            logging.info(f"Starting cube solving: {len(cubes)} cubes over {self.workers} worker processes")
+            pool = multiprocessing.Pool(self.workers, initializer=_init_worker, initargs=(cnf,))
+            try:
+                for index, cube_sat, cube_model, elapsed, cube_stats in pool.imap_unordered(_solve_cube, enumerate(cubes)):
+                    logging.debug(f"Cube {index} {cubes[index]}: {'SAT' if cube_sat else 'UNSAT'}, "
+                                  f"time taken: {elapsed:.2f} seconds")
+                    self.stats["solved"] += 1
+                    self.stats["cube_time"] += elapsed
+                    self.stats["max_cube_time"] = max(self.stats["max_cube_time"], elapsed)
+                    for key, value in cube_stats.items():
+                        self.stats[key] += value
+                    if cube_sat:
+                        is_sat, model = True, cube_model
+                        logging.info(f"Cube {index} is SAT, cancelling the remaining cubes")
+                        break
+            finally:
+                # Cancels every cube still queued or running
+                pool.terminate()
+                pool.join()
+
+        elapsed = time.time() - start_time
+        self.stats["total_time"] = elapsed
+        if not is_sat:
+            logging.info(f"UNSAT proof over {self.stats['cubes']} cubes and {refuted} refuted branches: "
+                         f"{self.stats['cube_time']:.2f} s of cube solving (longest cube {self.stats['max_cube_time']:.2f} s), "
+                         f"{self.stats['conflicts']} conflicts, {self.stats['decisions']} decisions, "
+                         f"{self.stats['propagations']} propagations")
+        logging.info(f"Solving result: {'SAT' if is_sat else 'UNSAT'}, time taken: {elapsed:.2f} seconds")
+        return is_sat, model
+
+
+def _run_backend(name, cnf, results):
+    # Solve the whole formula with one PySAT backend and report back
+    from pysat.solvers import Solver
+    start_time = time.time()
+    solver = Solver(name=name)
+    cnf.add_to_solver(solver)
+    is_sat = solver.solve()
+    model = solver.get_model() if is_sat else None
+    solver.delete()
+    results.put((name, is_sat, model, time.time() - start_time))
+
+
+class PortfolioSolver:
+    def __init__(self, solvers=PORTFOLIO_SOLVERS, stats_file=None):
+        # Race several PySAT backends on the same formula, one process each
+        # The first answer is taken and the other processes are terminated;
+        # the winner is logged and, with a stats file, appended as JSON Lines
+        self.solvers = list(solvers)
+        self.stats_file = stats_file
+        self.winner = None
+
+    def solve(self, cnf, label=None):
+        """Solve the formula with the first backend to finish
+
+        Args:
+            cnf (ClauseStore): Formula, handed to every backend process
+            label (str): Name recorded with the statistics, e.g. the circuit
+
+        Returns:
+            tuple: (is_sat, model), model is None when UNSAT
+        """
+        import multiprocessing
+        start_time = time.time()
+        logging.info(f"Starting portfolio solving with {', '.join(self.solvers)}")
+        results = multiprocessing.Queue()
+        processes = {name: multiprocessing.Process(target=_run_backend, args=(name, cnf, results), daemon=True)
+                     for name in self.solvers}
+        for process in processes.values():
+            process.start()
+
+        answer = None
+        try:
+            while answer is None:
+                try:
+                    answer = results.get(timeout=0.1)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes.values()) and results.empty():
+                        raise RuntimeError("Every portfolio solver exited without an answer")
+        finally:
+            for process in processes.values():
+                if process.is_alive():
+                    process.terminate()
+            for process in processes.values():
+                process.join()
+
+        self.winner, is_sat, model, solve_time = answer
+        elapsed = time.time() - start_time
+        logging.info(f"Portfolio winner: {self.winner}, solving result: {'SAT' if is_sat else 'UNSAT'}, "
+                     f"solver time: {solve_time:.2f} seconds, total time: {elapsed:.2f} seconds")
+
+        if self.stats_file:
+            record = {
+                "timestamp": datetime.now().isoformat(timespec='seconds'),
+                "label": label,
+                "winner": self.winner,
+                "sat": is_sat,
+                "solver_time": solve_time,
+                "total_time": elapsed,
+                "solvers": self.solvers,
+                "variables": cnf.nv,
+                "clauses": len(cnf),
+            }
+            with open(self.stats_file, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+        return is_sat, model
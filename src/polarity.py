@@ -0,0 +1,192 @@
+import logging
+from gate_templates import GATE_TEMPLATES, FAULT_TEMPLATES, instantiate
+
+# Occurrence signs of a variable in the formula
+POSITIVE = 1
+NEGATIVE = -1
+
+# Slot of the faulty output in the fault logic templates
+FAULTY_SLOT = 3
+
+
+def _out_slot(spec):
+    # 1-based template position of a gate's own output
+    return spec['slots'].index('out') + 1
+
+
+def _needed(clauses, out_slot, signs):
+    # Template clauses that must be kept for a variable with these occurrence signs
+    # A positive occurrence needs out -> definition, the clauses holding -out;
+    # a negative occurrence needs definition -> out, the clauses holding +out
+    kept = []
+    for clause in clauses:
+        for lit in clause:
+            if abs(lit) == out_slot and (NEGATIVE if lit > 0 else POSITIVE) in signs:
+                kept.append(clause)
+                break
+    return kept
+
+
+def _cyclic_nodes(graph):
+    # Nodes on or behind a loop, with registers read as wires as in one time frame
+    # One-directional clauses are only sound for acyclic definitions
+    pending = {node_id: sum(1 for i in graph.get_fanin(node_id) if i in graph) for node_id in graph.order}
+    ready = [node_id for node_id, count in pending.items() if count == 0]
+    while ready:
+        node_id = ready.pop()
+        del pending[node_id]
+        for succ in graph.get_fanout(node_id):
+            if succ in pending:
+                pending[succ] -= 1
+                if pending[succ] == 0:
+                    ready.append(succ)
+    return list(pending)
+
+
+class PolarityAnalysis:
+    def __init__(self, circuit, graph, fault_type):
+        # Occurrence signs of every node and faulty output variable
+        # Propagated backwards from the countermeasure constraint: a variable
+        # only defined by clauses that are kept in one direction passes the
+        # matching signs on to its inputs. Variables with no occurrence need
+        # no clauses at all, variables read by XOR or a MUX select need both.
+        self.circuit = circuit
+        self.graph = graph
+        self.fault_template = FAULT_TEMPLATES[fault_type]
+        self.signs = {}
+
+    def _definition(self, key):
+        # Template, slot keys and output slot of the clauses that define a variable
+        kind, node_id = key
+        node = self.graph.get_node(node_id)
+        if node is None:
+            return None
+        if kind == 'faulty':
+            return self.fault_template, (('node', node_id), ('control', node_id), key), FAULTY_SLOT
+
+        node_type = node['type']
+        inputs = node.get('inputs') or []
+        if node_type == 'input' or (node_type == 'reg' and not inputs):
+            return None
+        spec = GATE_TEMPLATES[node_type]
+        is_cmp = node_type == 'xor' and node_id.startswith('cmp')
+        slot_keys = []
+        for slot in spec['slots']:
+            if slot == 'out':
+                slot_keys.append(key)
+            elif is_cmp and self.graph.is_vulnerable(inputs[slot]):
+                slot_keys.append(('faulty', inputs[slot]))
+            else:
+                slot_keys.append(('node', inputs[slot]))
+        return spec['clauses'], slot_keys, _out_slot(spec)
+
+    def run(self):
+        """Propagate occurrence signs from the countermeasure constraint
+
+        Returns:
+            dict: ('node' | 'faulty', node id) -> set of occurrence signs
+        """
+        pending = []
+
+        def occur(key, sign):
+            signs = self.signs.setdefault(key, set())
+            if sign not in signs:
+                signs.add(sign)
+                pending.append((key, sign))
+
+        if self.circuit['countermeasure'] == 'detection' and 'flag' in self.graph:
+            # The unit clause flag = 0
+            occur(('node', 'flag'), NEGATIVE)
+        for node_id in _cyclic_nodes(self.graph):
+            occur(('node', node_id), POSITIVE)
+            occur(('node', node_id), NEGATIVE)
+
+        while pending:
+            key, sign = pending.pop()
+            definition = self._definition(key)
+            if definition is None:
+                continue
+            clauses, slot_keys, out_slot = definition
+            # Only the clauses switched on by this sign add new occurrences
+            for clause in _needed(clauses, out_slot, {sign}):
+                for lit in clause:
+                    if abs(lit) != out_slot and slot_keys[abs(lit) - 1][0] != 'control':
+                        occur(slot_keys[abs(lit) - 1], POSITIVE if lit > 0 else NEGATIVE)
+        return self.signs
+
+
+class PolarityEncoder:
+    def __init__(self, encoder):
+        # Plaisted-Greenbaum node encoder working on a CNFEncoder's state
+        # Variables are allocated exactly as the per-node encoders do, but
+        # each gate and fault logic block only gets the implication directions
+        # its output's occurrence signs need. The formula stays equisatisfiable
+        # for every assignment of inputs and control variables, so verdicts and
+        # fault vectors are unchanged while node values in a model may not be.
+        self.encoder = encoder
+        self.signs = PolarityAnalysis(encoder.circuit, encoder.graph, encoder.fault_type).run()
+        self._templates = {}
+
+    def _template(self, name, clauses, out_slot, signs):
+        # Kept clauses of a template for one set of occurrence signs, computed once
+        key = (name, frozenset(signs))
+        kept = self._templates.get(key)
+        if kept is None:
+            kept = self._templates[key] = _needed(clauses, out_slot, signs)
+        return kept
+
+    def encode_nodes(self):
+        # Encode all nodes into the encoder's clause store
+        enc = self.encoder
+        full = {"normal_logic": 0, "fault_logic": 0}
+        kept = {"normal_logic": 0, "fault_logic": 0}
+
+        for node_index, node in enumerate(enc.circuit['nodes']):
+            node_id = node['id']
+            node_type = node['type']
+            if node_type == 'input':
+                continue
+            spec = GATE_TEMPLATES.get(node_type)
+            if spec is None:
+                raise ValueError(f"Unknown node type: {node_type}")
+
+            inputs = node.get('inputs') or []
+            if node_type == 'reg' and not inputs:
+                enc._get_var(node_id)
+                continue
+            if node_type == 'output' and not inputs:
+                error_msg = f"Output node {node_id} has no valid inputs, violating strict validation requirement"
+                logging.error(error_msg)
+                raise ValueError(error_msg)
+
+            is_cmp = node_type == 'xor' and node_id.startswith('cmp')
+            slot_vars = []
+            for slot in spec['slots']:
+                if slot == 'out':
+                    slot_vars.append(enc._get_var(node_id))
+                elif is_cmp and enc.graph.is_vulnerable(inputs[slot]):
+                    slot_vars.append(enc._get_faulty_output(inputs[slot]))
+                else:
+                    slot_vars.append(enc._get_var(inputs[slot]))
+
+            clauses = self._template(node_type, spec['clauses'], _out_slot(spec), self.signs.get(('node', node_id), ()))
+            enc.cnf.extend(instantiate(clauses, slot_vars))
+            enc._mark_origin(enc._gate_category(node), node_index)
+            full["normal_logic"] += len(spec['clauses'])
+            kept["normal_logic"] += len(clauses)
+
+            if node.get('vulnerable', False):
+                control = enc._get_control_var(node_id)
+                faulty = enc._get_faulty_output(node_id)
+                fault_clauses = FAULT_TEMPLATES[enc.fault_type]
+                clauses = self._template('fault', fault_clauses, FAULTY_SLOT, self.signs.get(('faulty', node_id), ()))
+                enc.cnf.extend(instantiate(clauses, (enc._get_var(node_id), control, faulty)))
+                enc._mark_origin('fault', node_index)
+                full["fault_logic"] += len(fault_clauses)
+                kept["fault_logic"] += len(clauses)
+
+        for category in kept:
+            enc.clause_stats[category] += kept[category]
+        enc.polarity_stats = {"full": sum(full.values()), "kept": sum(kept.values())}
+        logging.info(f"Polarity encoding kept {enc.polarity_stats['kept']} of {enc.polarity_stats['full']} "
+                     f"gate and fault logic clauses")
@@ -2,28 +2,129 @@ import subprocess
 import os
 import time
 import logging
+import threading
 from pysat.solvers import Minisat22
+from clause_store import ClauseStore
 
 class SATSolver:
-    def __init__(self, use_library=True):
+    def __init__(self, use_library=True, workers=None, portfolio=None, stats_file=None, solver_cmd=None, timeout=None,
+                 conflict_budget=None, propagation_budget=None, progress_interval=None, cubes=None):
+        # solver_cmd runs a competition-format solver over pipes instead (see external_solver.py)
+        # timeout (seconds), conflict_budget and propagation_budget bound every solve call,
+        # a call that runs out answers None (UNKNOWN) instead of SAT/UNSAT
+        # progress_interval logs the solver statistics every that many seconds
+        # cubes switches the worker pool to cube-and-conquer with that many target cubes
         self.use_library = use_library
-        logging.info(f"Initializing SAT solver, using {'PySAT library' if use_library else 'external MiniSAT'}")
+        self.workers = workers
+        self.portfolio = portfolio
+        self.stats_file = stats_file
+        self.solver_cmd = solver_cmd
+        self.timeout = timeout
+        self.conflict_budget = conflict_budget
+        self.propagation_budget = propagation_budget
+        self.progress_interval = progress_interval
+        self.cubes = cubes
+        if solver_cmd:
+            logging.info(f"Initializing SAT solver, using external solver: {solver_cmd}")
+        else:
+            logging.info(f"Initializing SAT solver, using {'PySAT library' if use_library else 'external MiniSAT'}")
+    
+    def _log_stats(self, label, stats, elapsed):
+        # Solver statistics since the solve call started, with rates per second
+        elapsed = max(elapsed, 1e-9)
+        logging.info(f"{label}: {elapsed:.1f} s, {stats['conflicts']} conflicts ({stats['conflicts'] / elapsed:.0f}/s), "
+                     f"{stats['decisions']} decisions ({stats['decisions'] / elapsed:.0f}/s), "
+                     f"{stats['propagations']} propagations ({stats['propagations'] / elapsed:.0f}/s), "
+                     f"{stats['restarts']} restarts")
+    
+    def _report_progress(self, solver, base, start_time, done):
+        # Runs in a thread while the solver searches, the counters are read without stopping it
+        while not done.wait(self.progress_interval):
+            used = {key: value - base[key] for key, value in solver.accum_stats().items()}
+            self._log_stats("Solver progress", used, time.time() - start_time)
+    
+    def solve_bounded(self, solver, assumptions=None):
+        """Solve within the conflict, propagation and wall-clock budgets
+        
+        Without budgets or progress reporting this is a plain solve() call.
+        Otherwise one solve_limited call runs with the conflict and propagation
+        budgets set, a timer interrupts it once the time budget is spent, and
+        a reporter thread logs the solver statistics every progress_interval
+        seconds. The search is never restarted to check budgets.
+        
+        Args:
+            solver: PySAT solver holding the formula
+            assumptions (list): Assumption literals, None for none
+            
+        Returns:
+            bool: True (SAT), False (UNSAT) or None (UNKNOWN, a budget ran out)
+        """
+        assumptions = assumptions or []
+        if not (self.timeout or self.conflict_budget or self.propagation_budget or self.progress_interval):
+            return solver.solve(assumptions=assumptions)
+        
+        # conf_budget before prop_budget, MiniSat clears both when a budget is switched off
+        solver.conf_budget(self.conflict_budget or -1)
+        if self.propagation_budget:
+            solver.prop_budget(self.propagation_budget)
+        
+        start_time = time.time()
+        base = solver.accum_stats()
+        timed_out = threading.Event()
+        timer = None
+        if self.timeout:
+            timer = threading.Timer(self.timeout, lambda: (timed_out.set(), solver.interrupt()))
+            timer.daemon = True
+            timer.start()
+        done = threading.Event()
+        reporter = None
+        if self.progress_interval:
+            reporter = threading.Thread(target=self._report_progress, args=(solver, base, start_time, done), daemon=True)
+            reporter.start()
+        
+        try:
+            # expect_interrupt releases the GIL during the search, without it
+            # neither the timer nor the progress reporter get to run
+            result = solver.solve_limited(assumptions=assumptions, expect_interrupt=True)
+        finally:
+            done.set()
+            if reporter is not None:
+                reporter.join()
+            if timer is not None:
+                timer.cancel()
+                solver.clear_interrupt()
+            # Later calls on the same solver start without budgets
+            solver.conf_budget(-1)
+        
+        used = {key: value - base[key] for key, value in solver.accum_stats().items()}
+        self._log_stats("Solver statistics", used, time.time() - start_time)
+        if result is None:
+            if timed_out.is_set():
+                logging.warning(f"Solver interrupted after the {self.timeout} second time budget")
+            elif self.conflict_budget and used['conflicts'] >= self.conflict_budget:
+                logging.warning(f"Solver stopped after the {self.conflict_budget} conflict budget")
+            else:
+                logging.warning(f"Solver stopped after the {self.propagation_budget} propagation budget")
+        return result
     
     def solve_with_library(self, cnf):
         start_time = time.time()
         logging.info("Starting solving with PySAT")
         
         solver = Minisat22()
-        solver.append_formula(cnf)
-        is_sat = solver.solve()
+        if isinstance(cnf, ClauseStore):
+            cnf.add_to_solver(solver)
+        else:
+            solver.append_formula(cnf)
+        try:
+            is_sat = self.solve_bounded(solver)
+            model = solver.get_model() if is_sat else None
+        finally:
+            solver.delete()
         
         end_time = time.time()
-        if is_sat:
-            model = solver.get_model()
-            logging.info(f"Solving result: SAT, time taken: {end_time - start_time:.2f} seconds")
-        else:
-            model = None
-            logging.info(f"Solving result: UNSAT, time taken: {end_time - start_time:.2f} seconds")
+        status = {True: "SAT", False: "UNSAT", None: "UNKNOWN"}[is_sat]
+        logging.info(f"Solving result: {status}, time taken: {end_time - start_time:.2f} seconds")
         
         return is_sat, model
     
@@ -68,7 +169,114 @@ class SATSolver:
             except Exception as e:
                 logging.warning(f"Error while cleaning temporary files: {str(e)}")
     
-    def solve(self, cnf, cnf_file=None, output_file=None):
+    def sweep_n_e(self, cnf, bound_assumptions, max_n_e, control_vars):
+        """Check n_e = 1..max_n_e on one incremental solver
+        
+        The formula must contain a fault counter whose bounds are selected by
+        assumptions, so learned clauses are kept from one bound to the next.
+        Stops at the first bound for which the circuit is vulnerable.
+        
+        Args:
+            cnf (ClauseStore): Formula with incremental fault constraints
+            bound_assumptions (callable): Maps n_e to the assumptions enforcing it
+            max_n_e (int): Largest bound to check
+            control_vars (dict): Control variable mapping
+            
+        Returns:
+            list: One dict per checked bound with n_e, sat (None if a budget ran out), fault_vector and time
+        """
+        if not self.use_library:
+            raise ValueError("n_e sweep needs the PySAT library solver")
+        
+        logging.info(f"Starting n_e sweep from 1 to {max_n_e} with PySAT")
+        solver = Minisat22()
+        cnf.add_to_solver(solver)
+        
+        results = []
+        try:
+            for n_e in range(1, max_n_e + 1):
+                start_time = time.time()
+                is_sat = self.solve_bounded(solver, bound_assumptions(n_e))
+                elapsed = time.time() - start_time
+                
+                fault_vector = []
+                if is_sat:
+                    model = solver.get_model()
+                    fault_vector = [node_id for node_id, var in control_vars.items() if model[var - 1] > 0]
+                
+                results.append({"n_e": n_e, "sat": is_sat, "fault_vector": fault_vector, "time": elapsed})
+                status = {True: "SAT", False: "UNSAT", None: "UNKNOWN"}[is_sat]
+                logging.info(f"n_e = {n_e}: {status}, time taken: {elapsed:.2f} seconds")
+                # Larger bounds cannot be decided once one is vulnerable or undecided
+                if is_sat is not False:
+                    break
+        finally:
+            solver.delete()
+        
+        return results
+    
+    def solve_sharded(self, cnf, control_vars):
+        """Split the fault locations into shards solved by a pool of processes
+        
+        Args:
+            cnf (ClauseStore): CNF formula
+            control_vars (dict): Control variable mapping
+            
+        Returns:
+            tuple: (is_sat, model)
+        """
+        from parallel_solver import ShardedSolver
+        return ShardedSolver(self.workers).solve(cnf, control_vars)
+    
+    def solve_cubes(self, cnf, control_vars, input_vars):
+        """Split the formula into cubes on inputs and controls, solved by a pool of processes
+        
+        Args:
+            cnf (ClauseStore): CNF formula
+            control_vars (dict): Control variable mapping
+            input_vars (dict): Primary input variable mapping
+            
+        Returns:
+            tuple: (is_sat, model)
+        """
+        from parallel_solver import CubeSolver
+        return CubeSolver(self.workers, self.cubes).solve(cnf, control_vars, input_vars or {})
+    
+    def solve_portfolio(self, cnf, label=None):
+        """Race several PySAT backends and keep the first answer
+        
+        Args:
+            cnf (ClauseStore): CNF formula
+            label (str): Name recorded with the winner statistics
+            
+        Returns:
+            tuple: (is_sat, model)
+        """
+        from parallel_solver import PortfolioSolver
+        return PortfolioSolver(self.portfolio, self.stats_file).solve(cnf, label)
+    
+    def solve_external(self, cnf):
+        """Stream the formula to an external solver and read its competition output
+        
+        Args:
+            cnf (ClauseStore): CNF formula
+            
+        Returns:
+            tuple: (is_sat, model)
+        """
+        from external_solver import ExternalSolver
+        logging.info(f"Starting solving with external solver over pipes: {self.solver_cmd}")
+        return ExternalSolver(self.solver_cmd, self.timeout).solve(cnf)
+    
+    def solve(self, cnf, cnf_file=None, output_file=None, control_vars=None, label=None, input_vars=None):
+        if self.solver_cmd:
+            return self.solve_external(cnf)
+        if self.use_library and self.portfolio:
+            return self.solve_portfolio(cnf, label)
+        if self.use_library and self.cubes and control_vars is not None:
+            return self.solve_cubes(cnf, control_vars, input_vars)
+        if self.use_library and self.workers and control_vars is not None:
+            return self.solve_sharded(cnf, control_vars)
         if self.use_library:
             return self.solve_with_library(cnf)
         else:
@@ -80,17 +288,22 @@ class SATSolver:
         """Interpret solving results
         
         Args:
-            sat (bool): Whether satisfiable
+            sat (bool): Whether satisfiable, None if the solver ran out of budget
             model (list): Model (if satisfiable)
             variable_map (dict): Variable mapping
             control_vars (dict): Control variable mapping
             countermeasure (str): Countermeasure type
             
         Returns:
-            tuple: (is_fault_resistant, fault_vector)
+            tuple: (is_fault_resistant, fault_vector), is_fault_resistant is None when sat is None
         """
         logging.info(f"Interpreting solving results, countermeasure type: {countermeasure}")
         
+        # A solver that ran out of budget decides nothing
+        if sat is None:
+            logging.info("Result: UNKNOWN, the solver budget ran out before a verdict")
+            return None, []
+        
         # Check if model is None
         if model is None:
             if not sat:
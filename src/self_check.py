@@ -0,0 +1,214 @@
+import logging
+from cnf_encoder import CLAUSE_CATEGORIES
+from gate_templates import GATE_TEMPLATES, FAULT_TEMPLATES, instantiate
+from cli_args import SELF_CHECK_LEVELS
+
+
+def _clause_key(clause):
+    # Order-independent hash key of a clause
+    return tuple(sorted(clause))
+
+
+class CNFSelfCheck:
+    def __init__(self, encoder):
+        # Linear-time consistency check of an encoder's formula
+        # 'structural' checks variable bounds and, from the recorded provenance,
+        # that every node owns a clause range of the expected size and that the
+        # fault and countermeasure constraints are present. 'full' also rebuilds
+        # every expected gate and fault clause and looks it up in a hash index of
+        # the formula, and compares each node's range with its expected clauses.
+        self.encoder = encoder
+        self.passed = 0
+        self.failed = 0
+
+    def _result(self, ok, error_msg):
+        if ok:
+            self.passed += 1
+        else:
+            self.failed += 1
+            logging.error(error_msg)
+
+    def _nodes(self):
+        # Nodes to check in netlist order, streamed encodings read the netlist file again
+        return self.encoder._iter_netlist()
+
+    def _node_ranges(self):
+        # Clause range per (netlist position, 'gate' or 'fault') from the provenance runs
+        enc = self.encoder
+        ranges = {}
+        start = 0
+        fault_code = CLAUSE_CATEGORIES.index('fault')
+        for end, category, node_index in zip(enc.origin_ends, enc.origin_categories, enc.origin_nodes):
+            if node_index >= 0:
+                part = 'fault' if category == fault_code else 'gate'
+                ranges[(node_index, part)] = (start, end)
+            start = end
+        return ranges
+
+    def _constraint_runs(self):
+        # Clause ranges of the formula-level constraints by category
+        enc = self.encoder
+        runs = {}
+        start = 0
+        for end, category, node_index in zip(enc.origin_ends, enc.origin_categories, enc.origin_nodes):
+            if node_index < 0:
+                runs.setdefault(CLAUSE_CATEGORIES[category], []).append((start, end))
+            start = end
+        return runs
+
+    def _expected_clauses(self, node):
+        # Gate and fault logic clauses the encoder must have emitted for a node
+        # Returns (gate clauses, fault clauses), or None with the reason if they cannot be built
+        enc = self.encoder
+        node_id = node['id']
+        node_type = node['type']
+        spec = GATE_TEMPLATES.get(node_type)
+        output_var = enc.variable_map.get(node_id)
+        if output_var is None:
+            return None, f"Cannot find variable mapping for node {node_id}"
+
+        inputs = node.get('inputs') or []
+        is_cmp = node_type == 'xor' and node_id.startswith('cmp')
+        slot_vars = []
+        for slot in spec['slots']:
+            if slot == 'out':
+                slot_vars.append(output_var)
+                continue
+            if slot >= len(inputs):
+                return None, f"{node_type.upper()} node {node_id} missing inputs"
+            input_id = inputs[slot]
+            if is_cmp and enc.graph.is_vulnerable(input_id):
+                var = enc.faulty_outputs.get(f"{input_id}_faulty")
+            else:
+                var = enc.variable_map.get(input_id)
+            if var is None:
+                return None, f"Cannot find variable mapping for input {input_id} of node {node_id}"
+            slot_vars.append(var)
+        gate_clauses = instantiate(spec['clauses'], slot_vars)
+
+        fault_clauses = []
+        if node.get('vulnerable', False) and node_id in enc.control_vars:
+            faulty_output = enc.faulty_outputs.get(f"{node_id}_faulty")
+            if faulty_output is None:
+                return None, f"Cannot find faulty output variable of node {node_id}"
+            fault_clauses = instantiate(FAULT_TEMPLATES[enc.fault_type], (output_var, enc.control_vars[node_id], faulty_output))
+        return (gate_clauses, fault_clauses), None
+
+    def _check_bounds(self):
+        # Every literal refers to an allocated variable
+        enc = self.encoder
+        lits = enc.cnf.lits
+        if not len(lits):
+            self._result(False, "Formula has no literals")
+            return
+        top = max(max(lits), -min(lits))
+        self._result(top < enc.next_var and 0 not in lits,
+                     f"Formula uses variable {top}, only {enc.next_var - 1} were allocated")
+
+    def _check_provenance(self):
+        # Provenance runs must cover every clause exactly once
+        enc = self.encoder
+        ends = enc.origin_ends
+        ordered = all(ends[i] < ends[i + 1] for i in range(len(ends) - 1))
+        self._result(ordered and ends[-1] == len(enc.cnf),
+                     f"Clause provenance covers {ends[-1]} of {len(enc.cnf)} clauses")
+
+    def _check_nodes(self, full, index):
+        # Per-node clause ranges (and, for full, their contents)
+        enc = self.encoder
+        ranges = self._node_ranges() if len(enc.origin_ends) else None
+        check_gates = not enc.polarity
+        if not check_gates:
+            logging.info("Polarity encoding emits partial gate clauses, skipping per-node clause checks")
+
+        for node_index, node in enumerate(self._nodes()):
+            node_id = node['id']
+            node_type = node['type']
+            if node_type == 'input' or (node_type == 'reg' and not node.get('inputs')):
+                continue
+            if node_type not in GATE_TEMPLATES:
+                self._result(False, f"Unknown node type {node_type} of node {node_id}")
+                continue
+
+            expected, error_msg = self._expected_clauses(node)
+            if expected is None:
+                self._result(False, error_msg)
+                continue
+            if not check_gates:
+                continue
+
+            for part, clauses in zip(('gate', 'fault'), expected):
+                if not clauses:
+                    continue
+                label = "fault logic" if part == 'fault' else f"{node_type.upper()} node"
+                if ranges is not None:
+                    start, end = ranges.get((node_index, part), (0, 0))
+                    self._result(end - start == len(clauses),
+                                 f"{label} {node_id} owns {end - start} clauses, expected {len(clauses)}")
+                    if full and end - start == len(clauses):
+                        found = {_clause_key(clause) for clause in enc.cnf.iter_clauses(start, end)}
+                        self._result(all(_clause_key(clause) in found for clause in clauses),
+                                     f"{label} {node_id} clause range does not hold its clauses")
+                if full:
+                    missing = [clause for clause in clauses if _clause_key(clause) not in index]
+                    self._result(not missing, f"{label} {node_id} missing clauses: {missing}")
+
+    def _check_constraints(self, index):
+        # Fault number and countermeasure constraints
+        enc = self.encoder
+        control_vars = list(enc.control_vars.values())
+        runs = self._constraint_runs() if len(enc.origin_ends) else None
+
+        if control_vars:
+            at_least_one = _clause_key(control_vars)
+            if index is not None:
+                self._result(at_least_one in index, "Missing at least one fault clause")
+            elif runs is not None:
+                self._result('at_least_one' in runs, "Missing at least one fault clause")
+            n_e = enc.n_e if enc.n_e is not None else enc.circuit['fault_model']['n_e']
+            if runs is not None and n_e < len(control_vars):
+                self._result('at_most' in runs or 'fault_counter' in runs,
+                             "Missing fault number upper bound constraint clauses")
+
+        if enc.circuit.get('countermeasure') == 'detection':
+            flag_var = enc.variable_map.get('flag')
+            if flag_var is None:
+                self._result(False, "Cannot find flag node, skipping countermeasure constraint test")
+            elif index is not None:
+                self._result((-flag_var,) in index, f"Missing detection countermeasure constraint clause: {[-flag_var]}")
+            elif runs is not None:
+                start, end = runs.get('countermeasure', [(0, 0)])[-1]
+                self._result(any(clause == [-flag_var] for clause in enc.cnf.iter_clauses(start, end)),
+                             f"Missing detection countermeasure constraint clause: {[-flag_var]}")
+
+    def run(self, level='full'):
+        """Check the encoder's formula
+
+        Args:
+            level (str): 'structural' or 'full', 'off' checks nothing
+
+        Returns:
+            tuple: (tests_passed, tests_failed)
+        """
+        if level not in SELF_CHECK_LEVELS:
+            raise ValueError(f"Unknown self-check level: {level}")
+        if level == 'off':
+            return (0, 0)
+
+        logging.info(f"Starting {level} CNF self-check...")
+        enc = self.encoder
+        full = level == 'full'
+        self._check_bounds()
+        if len(enc.origin_ends):
+            self._check_provenance()
+        elif not full:
+            logging.warning("No clause provenance recorded, structural self-check only covers variable bounds")
+
+        # One pass builds the hash index full checks look clauses up in
+        index = {_clause_key(clause) for clause in enc.cnf} if full else None
+        self._check_nodes(full, index)
+        self._check_constraints(index)
+
+        total_tests = self.passed + self.failed
+        logging.info(f"CNF self-check completed: {total_tests} total tests, {self.passed} passed, {self.failed} failed")
+        return (self.passed, self.failed)
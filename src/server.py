@@ -0,0 +1,361 @@
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+from collections import OrderedDict
+from cnf_encoder import CNFEncoder
+from formula_cache import formula_key
+from self_check import SELF_CHECK_LEVELS
+from cli_args import BASE_DIR, DEFAULT_SOCKET, REQUEST_FIELDS
+
+DEFAULT_MAX_SESSIONS = 16
+
+
+class VerificationSession:
+    def __init__(self, json_file, circuit, options):
+        # Encoded formula of one circuit and fault model with a warm incremental solver
+        # The fault bound is not part of the formula: the at-most-n_e constraint is a
+        # totalizer selected by assumptions, grown when a query asks for a larger n_e,
+        # so queries for any bound reuse the solver and its learned clauses
+        from pysat.solvers import Minisat22
+        start_time = time.time()
+        self.encoder = CNFEncoder(json_file, circuit=circuit, overrides={
+            "fault_type": options['fault_type'],
+            "countermeasure": options['countermeasure'],
+        })
+        self.countermeasure = self.encoder.circuit['countermeasure']
+        self.encoder.encode(self.encoder.circuit['fault_model']['n_e'], batch=options['batch_encode'], incremental=True,
+                            slice_cone=options['slice'], strash=options['strash'], polarity=options['polarity'],
+                            save_maps=False)
+        self.solver = Minisat22()
+        self.encoder.cnf.add_to_solver(self.solver)
+        self.encode_time = time.time() - start_time
+        # n_e -> (is_resistant, fault_vector) of every answered bound
+        self.results = {}
+
+    def _grow_fault_counter(self, n_e):
+        # Extend the totalizer to n_e, new clauses go to the encoder and the warm solver
+        enc = self.encoder
+        counter = enc.fault_counter
+        if n_e <= counter.ubound:
+            return
+        counter.increase(ubound=n_e, top_id=enc.next_var - 1)
+        if counter.nof_new:
+            clauses = counter.cnf.clauses[-counter.nof_new:]
+            enc.cnf.extend(clauses)
+            enc._mark_origin('fault_counter')
+            self.solver.append_formula(clauses)
+        enc.next_var = counter.top_id + 1
+        logging.info(f"Fault counter extended to n_e = {n_e} with {counter.nof_new} clauses")
+
+    def _known_result(self, n_e):
+        # A fault vector found under a smaller bound also exists under n_e, and
+        # resistance under a larger bound implies resistance under n_e
+        for bound, (is_resistant, fault_vector) in self.results.items():
+            if not is_resistant and bound <= n_e:
+                return is_resistant, fault_vector
+            if is_resistant and bound >= n_e:
+                return is_resistant, fault_vector
+        return None
+
+    def check(self, n_e, bounds):
+        """Verify the circuit for at most n_e faults
+
+        Args:
+            n_e (int): Maximum number of injected faults
+            bounds (SATSolver): Solver budgets of the request, the warm solver runs under them
+
+        Returns:
+            dict: n_e, resistant (None when a budget ran out), fault_vector, time and
+                whether it was answered from earlier queries
+        """
+        start_time = time.time()
+        known = self._known_result(n_e)
+        if known is not None:
+            is_resistant, fault_vector = known
+            return {"n_e": n_e, "resistant": is_resistant, "fault_vector": fault_vector,
+                    "time": time.time() - start_time, "reused": True}
+
+        self._grow_fault_counter(n_e)
+        sat = bounds.solve_bounded(self.solver, self.encoder.fault_bound_assumptions(n_e))
+        model = self.solver.get_model() if sat else None
+        is_resistant, fault_vector = bounds.interpret_result(
+            sat, model, self.encoder.get_variable_map(), self.encoder.get_control_vars(), self.countermeasure)
+        # An UNKNOWN verdict is not reused, a later request may have a larger budget
+        if is_resistant is not None:
+            self.results[n_e] = (is_resistant, fault_vector)
+        return {"n_e": n_e, "resistant": is_resistant, "fault_vector": fault_vector,
+                "time": time.time() - start_time, "reused": False}
+
+    def delete(self):
+        self.solver.delete()
+        self.encoder.fault_counter.delete()
+
+
+class VerificationServer:
+    def __init__(self, input_dir, max_sessions=DEFAULT_MAX_SESSIONS):
+        # Resident state shared by every connection: parsed circuits by input file and
+        # encoded sessions by formula key, least recently used sessions are dropped
+        self.input_dir = input_dir
+        self.max_sessions = max_sessions
+        self.circuits = {}
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "sessions_created": 0, "sessions_evicted": 0}
+        self.started = time.time()
+
+    def _load_circuit(self, name):
+        # Parsed circuit JSON, re-read when the file changes on disk
+        if not name or os.path.basename(name) != name:
+            raise ValueError(f"Invalid circuit name: {name!r}")
+        json_file = os.path.join(self.input_dir, f"{name}.json")
+        try:
+            stat = os.stat(json_file)
+        except FileNotFoundError:
+            raise ValueError(f"Input file not found {json_file}")
+        version = (stat.st_mtime_ns, stat.st_size)
+        entry = self.circuits.get(name)
+        if entry is None or entry[0] != version:
+            with open(json_file, 'rb') as f:
+                json_bytes = f.read()
+            entry = (version, json_file, json_bytes, json.loads(json_bytes))
+            self.circuits[name] = entry
+            logging.info(f"Loaded circuit {name} from {json_file}")
+        return entry[1:]
+
+    def _session(self, request):
+        # Warm session for the request's circuit and formula options, created on first use
+        json_file, json_bytes, circuit = self._load_circuit(request['circuit'])
+        fault_model = circuit['fault_model']
+        options = {
+            "fault_type": request['fault_type'] or fault_model.get('fault_type', 'bit-flip'),
+            "countermeasure": request['countermeasure'] or circuit['countermeasure'],
+            "batch_encode": request['batch_encode'],
+            "slice": request['slice'],
+            "strash": request['strash'],
+            "polarity": request['polarity'],
+        }
+        # Batch encoding builds the same formula, so it shares the session
+        key = formula_key(json_bytes, dict(options, batch_encode=None, incremental=True))
+        session = self.sessions.get(key)
+        if session is not None:
+            self.sessions.move_to_end(key)
+            return session, False, circuit
+
+        session = VerificationSession(json_file, circuit, options)
+        self.sessions[key] = session
+        self.stats['sessions_created'] += 1
+        while len(self.sessions) > self.max_sessions:
+            _, evicted = self.sessions.popitem(last=False)
+            evicted.delete()
+            self.stats['sessions_evicted'] += 1
+        logging.info(f"New session for {request['circuit']} ({key[:12]}), encoded in {session.encode_time:.2f} seconds")
+        return session, True, circuit
+
+    def verify(self, request):
+        """Answer a verification request from warm state
+
+        Args:
+            request (dict): Fields of REQUEST_FIELDS, circuit is required
+
+        Returns:
+            dict: Verdict per checked bound and the session timings
+        """
+        unknown = [field for field in request if field not in REQUEST_FIELDS]
+        if unknown:
+            raise ValueError(f"Unsupported request fields: {', '.join(unknown)}")
+        request = dict(REQUEST_FIELDS, **request)
+        if request['self_check'] not in SELF_CHECK_LEVELS:
+            raise ValueError(f"Unknown self-check level: {request['self_check']}")
+        for field in ('n_e', 'sweep_n_e', 'conflict_budget', 'propagation_budget'):
+            if request[field] is not None and (not isinstance(request[field], int) or request[field] <= 0):
+                raise ValueError(f"{field} must be a positive integer")
+        timeout = request['solver_timeout']
+        if timeout is not None and (not isinstance(timeout, (int, float)) or timeout <= 0):
+            raise ValueError("solver_timeout must be a positive number of seconds")
+
+        from sat_solver import SATSolver
+        # Budgets bound how long a request holds the server lock in the solver
+        bounds = SATSolver(timeout=timeout, conflict_budget=request['conflict_budget'],
+                           propagation_budget=request['propagation_budget'])
+        session, created, circuit = self._session(request)
+        if request['card_encoding'] is not None:
+            logging.info("Warm sessions select the fault bound on a totalizer, ignoring card_encoding")
+        if request['self_check'] != 'off':
+            passed, failed = session.encoder.test_cnf(request['self_check'])
+            if failed:
+                raise ValueError(f"CNF self-check failed: {failed} of {passed + failed} tests")
+
+        response = {"circuit": request['circuit'], "countermeasure": session.countermeasure,
+                    "fault_type": session.encoder.fault_type, "new_session": created,
+                    "encode_time": session.encode_time if created else 0.0}
+        if request['sweep_n_e'] is not None:
+            # Stop at the first vulnerable or unknown bound, as main.py --sweep-n-e does
+            results = []
+            for n_e in range(1, request['sweep_n_e'] + 1):
+                results.append(session.check(n_e, bounds))
+                if not results[-1]['resistant']:
+                    break
+            response['sweep'] = results
+        else:
+            n_e = request['n_e'] or circuit['fault_model']['n_e']
+            response.update(session.check(n_e, bounds))
+        return response
+
+    def status(self):
+        # Resident state summary
+        return dict(self.stats, circuits=sorted(self.circuits), sessions=len(self.sessions),
+                    uptime=time.time() - self.started)
+
+    def handle(self, message):
+        # Dispatch one decoded request, errors become {"ok": false} responses
+        with self.lock:
+            self.stats['requests'] += 1
+            try:
+                if not isinstance(message, dict):
+                    raise ValueError("Request must be a JSON object")
+                message = dict(message)
+                op = message.pop('op', 'verify')
+                if op == 'verify':
+                    response = self.verify(message)
+                elif op == 'status':
+                    response = self.status()
+                else:
+                    raise ValueError(f"Unknown operation: {op}")
+                return dict(response, ok=True)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logging.error(f"Request failed: {e}")
+                return {"ok": False, "error": str(e)}
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.delete()
+            self.sessions.clear()
+
+
+class UnixRequestHandler(socketserver.StreamRequestHandler):
+    # One JSON request per line, one JSON response per line, until the client closes
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError as e:
+                response = {"ok": False, "error": f"Invalid JSON request: {e}"}
+            else:
+                response = self.server.verifier.handle(message)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+def http_handler():
+    # HTTP handler class, http.server is only imported by servers using it
+    from http.server import BaseHTTPRequestHandler
+
+    class HTTPRequestHandler(BaseHTTPRequestHandler):
+        # POST /verify with a JSON body, GET /status
+        def _reply(self, code, response):
+            body = json.dumps(response).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != '/status':
+                self._reply(404, {"ok": False, "error": f"Unknown path: {self.path}"})
+                return
+            self._reply(200, self.server.verifier.handle({"op": "status"}))
+
+        def do_POST(self):
+            if self.path != '/verify':
+                self._reply(404, {"ok": False, "error": f"Unknown path: {self.path}"})
+                return
+            try:
+                message = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            except json.JSONDecodeError as e:
+                self._reply(400, {"ok": False, "error": f"Invalid JSON request: {e}"})
+                return
+            response = self.server.verifier.handle(dict(message, op='verify') if isinstance(message, dict) else message)
+            self._reply(200 if response['ok'] else 400, response)
+
+        def log_message(self, format, *args):
+            logging.debug(f"HTTP {self.address_string()} {format % args}")
+
+    return HTTPRequestHandler
+
+
+class UnixVerificationServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve(verifier, socket_path=None, port=None):
+    """Serve verification requests until interrupted
+
+    Args:
+        verifier (VerificationServer): Resident state answering the requests
+        socket_path (str): Unix domain socket to listen on (used when port is None)
+        port (int): Localhost HTTP port
+    """
+    if port is not None:
+        from http.server import ThreadingHTTPServer
+        server = ThreadingHTTPServer(('127.0.0.1', port), http_handler())
+        address = f"http://127.0.0.1:{server.server_address[1]}"
+    else:
+        if os.path.exists(socket_path):
+            # A socket nobody accepts on is left over from a server that was killed
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                if probe.connect_ex(socket_path) == 0:
+                    raise ValueError(f"A verification server is already listening on {socket_path}")
+            os.unlink(socket_path)
+        server = UnixVerificationServer(socket_path, UnixRequestHandler)
+        address = socket_path
+    server.verifier = verifier
+    # Stopping the service cleans up like Ctrl-C does
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logging.info(f"Verification server listening on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Shutting down verification server")
+    finally:
+        server.server_close()
+        verifier.close()
+        if port is None and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Keep parsed circuits and encoded formulas resident and answer verification requests')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help=f'Unix domain socket path (default: {DEFAULT_SOCKET})')
+    parser.add_argument('--port', type=int, help='Serve HTTP on 127.0.0.1 at this port instead of a Unix socket')
+    parser.add_argument('--max-sessions', type=int, default=DEFAULT_MAX_SESSIONS,
+                        help=f'Encoded formulas kept resident, least recently used are dropped (default: {DEFAULT_MAX_SESSIONS})')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.max_sessions <= 0:
+        logging.error("Error: max-sessions must be a positive integer")
+        sys.exit(1)
+    if args.port is None:
+        os.makedirs(os.path.dirname(os.path.abspath(args.socket)), exist_ok=True)
+    try:
+        serve(VerificationServer(os.path.join(BASE_DIR, 'inputs'), args.max_sessions), args.socket, args.port)
+    except (ValueError, OSError) as e:
+        logging.error(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import logging
+from circuit_graph import CircuitGraph
+
+# Gates whose inputs can be reordered without changing the function
+COMMUTATIVE = ('xor', 'and', 'or')
+
+# Internal ids of the constant nodes, only added when a kept node reads a constant
+CONST_IDS = {0: '__const0', 1: '__const1'}
+
+
+def _is_comparator(node):
+    return node['type'] == 'xor' and node['id'].startswith('cmp')
+
+
+def _is_protected(node, compared):
+    # Nodes the pass must leave in place
+    # Vulnerable nodes carry fault logic, comparators read faulty values,
+    # outputs and inputs are ports, and registers hold per-cycle state.
+    # Comparator inputs stay too: a comparator reads the faulty value of a
+    # vulnerable input, so redirecting it to a vulnerable representative
+    # would expose faults it never saw.
+    return (node.get('vulnerable', False)
+            or node['type'] in ('input', 'output', 'reg')
+            or _is_comparator(node)
+            or node['id'] in compared)
+
+
+def _topological_order(graph):
+    # Netlist order is not guaranteed to be topological, registers break cycles
+    pending = {}
+    for node_id in graph.order:
+        node = graph.get_node(node_id)
+        deps = [] if node['type'] == 'reg' else [i for i in graph.get_fanin(node_id) if i in graph]
+        pending[node_id] = len(deps)
+    ready = [node_id for node_id in graph.order if pending[node_id] == 0]
+    order = []
+    while ready:
+        node_id = ready.pop()
+        order.append(node_id)
+        for succ in graph.get_fanout(node_id):
+            if succ in pending and graph.get_node(succ)['type'] != 'reg':
+                pending[succ] -= 1
+                if pending[succ] == 0:
+                    ready.append(succ)
+    if len(order) < len(graph):
+        # Combinational loops are left untouched at the end
+        placed = set(order)
+        order.extend(node_id for node_id in graph.order if node_id not in placed)
+    return order
+
+
+class StructuralHasher:
+    def __init__(self, circuit, graph):
+        # AIG-style structural hashing with constant and double negation folding
+        # Every node is resolved to a representative: itself, an equivalent
+        # node seen earlier, or a constant. Node variables hold fault-free
+        # values (faulty values are only read by comparators), so a plain gate
+        # may be merged onto any equivalent node, but protected nodes are never
+        # merged away or rewritten beyond renaming their inputs.
+        self.circuit = circuit
+        self.graph = graph
+        self.replacement = {}
+        self.table = {}
+        self.rewritten = {}
+        self.used_consts = set()
+        self.stats = {"merged": 0, "constants": 0, "double_negations": 0, "simplified": 0}
+
+    def _resolve(self, ref):
+        # Follow replacements to a node id or a constant (0 or 1)
+        while ref in self.replacement:
+            ref = self.replacement[ref]
+        return ref
+
+    def _type_of(self, ref):
+        node = self.rewritten.get(ref)
+        return node['type'] if node is not None else None
+
+    def _fold(self, node_type, inputs):
+        # Simplify one gate whose inputs are already resolved
+        # Returns ('ref', node id or constant) or ('gate', type, inputs)
+        consts = [ref for ref in inputs if ref in (0, 1)]
+
+        if node_type == 'not':
+            a = inputs[0]
+            if a in (0, 1):
+                return ('ref', 1 - a)
+            if self._type_of(a) == 'not':
+                self.stats["double_negations"] += 1
+                return ('ref', self.rewritten[a]['inputs'][0])
+            return ('gate', 'not', [a])
+
+        if node_type == 'mux':
+            a, b, sel = inputs
+            if sel in (0, 1):
+                return ('ref', b if sel else a)
+            if a == b:
+                return ('ref', a)
+            return ('gate', 'mux', [a, b, sel])
+
+        a, b = inputs[0], inputs[1]
+        if node_type == 'and':
+            if 0 in consts:
+                return ('ref', 0)
+            if a == 1 or a == b:
+                return ('ref', b)
+            if b == 1:
+                return ('ref', a)
+        elif node_type == 'or':
+            if 1 in consts:
+                return ('ref', 1)
+            if a == 0 or a == b:
+                return ('ref', b)
+            if b == 0:
+                return ('ref', a)
+        elif node_type == 'xor':
+            if a == b:
+                return ('ref', 0)
+            if a in (0, 1) and b in (0, 1):
+                return ('ref', a ^ b)
+            if a == 0:
+                return ('ref', b)
+            if b == 0:
+                return ('ref', a)
+            if 1 in consts:
+                return self._fold('not', [b if a == 1 else a])
+        return ('gate', node_type, [a, b])
+
+    def _ref_id(self, ref):
+        # Node id for a resolved reference, materializing constants on demand
+        if ref in (0, 1):
+            self.used_consts.add(ref)
+            return CONST_IDS[ref]
+        return ref
+
+    def run(self):
+        """Hash and fold the netlist
+
+        Returns:
+            tuple: (new circuit, new graph, stats)
+        """
+        compared = {ref for node_id in self.graph.order if _is_comparator(self.graph.get_node(node_id))
+                    for ref in self.graph.get_node(node_id).get('inputs') or []}
+
+        for node_id in _topological_order(self.graph):
+            node = self.graph.get_node(node_id)
+            inputs = [self._resolve(ref) for ref in node.get('inputs') or []]
+
+            if _is_protected(node, compared):
+                rewritten = dict(node)
+                if 'inputs' in node:
+                    rewritten['inputs'] = [self._ref_id(ref) for ref in inputs]
+                self.rewritten[node_id] = rewritten
+                if node['type'] in COMMUTATIVE + ('not', 'mux') and not _is_comparator(node):
+                    # A vulnerable gate's fault-free value can still stand in for duplicates
+                    self.table.setdefault(self._key(node['type'], inputs), node_id)
+                continue
+
+            folded = self._fold(node['type'], inputs)
+            if folded[0] == 'ref':
+                self.replacement[node_id] = folded[1]
+                if folded[1] in (0, 1):
+                    self.stats["constants"] += 1
+                else:
+                    self.stats["simplified"] += 1
+                continue
+
+            _, node_type, inputs = folded
+            key = self._key(node_type, inputs)
+            if key in self.table:
+                self.replacement[node_id] = self.table[key]
+                self.stats["merged"] += 1
+                continue
+
+            self.table[key] = node_id
+            rewritten = dict(node)
+            rewritten['type'] = node_type
+            rewritten['inputs'] = [self._ref_id(ref) for ref in inputs]
+            self.rewritten[node_id] = rewritten
+
+        # Registers and loop-back nodes were emitted before their drivers, so
+        # their inputs are resolved again now that every replacement is known
+        for rewritten in self.rewritten.values():
+            if 'inputs' in rewritten:
+                rewritten['inputs'] = [self._ref_id(self._resolve(ref)) for ref in rewritten['inputs']]
+
+        nodes = [{"id": CONST_IDS[value], "type": f"const{value}", "vulnerable": False}
+                 for value in sorted(self.used_consts)]
+        nodes.extend(self.rewritten[node_id] for node_id in self.graph.order if node_id in self.rewritten)
+
+        # An input that named a node of the netlist must still name a kept node,
+        # otherwise it would turn into a free variable of the formula
+        for node in nodes:
+            for ref in node.get('inputs') or []:
+                if ref in self.graph and ref not in self.rewritten:
+                    raise ValueError(f"Structural hashing left input {ref} of node {node['id']} without a definition")
+
+        self.stats["removed_nodes"] = len(self.graph) - len(self.rewritten)
+        logging.info(f"Structural hashing removed {self.stats['removed_nodes']} of {len(self.graph)} nodes: "
+                     f"{self.stats['merged']} merged, {self.stats['constants']} constant, "
+                     f"{self.stats['double_negations']} double negations, {self.stats['simplified']} other simplifications")
+
+        hashed = dict(self.circuit)
+        hashed['nodes'] = nodes
+        return hashed, CircuitGraph(nodes), self.stats
+
+    def _key(self, node_type, inputs):
+        if node_type in COMMUTATIVE:
+            return (node_type,) + tuple(sorted(inputs, key=str))
+        return (node_type,) + tuple(inputs)
+
+
+def hash_circuit(circuit, graph):
+    # Run structural hashing and constant folding over a circuit
+    return StructuralHasher(circuit, graph).run()
@@ -0,0 +1,190 @@
+import time
+import logging
+from pysat.card import ITotalizer
+from pysat.solvers import Minisat22
+from clause_store import ClauseStore
+import cardinality
+from gate_templates import GATE_TEMPLATES, FAULT_TEMPLATES, instantiate
+
+
+class TimeFrameUnroller:
+    def __init__(self, encoder, n_e=None, n_c=None, card_encoding=None):
+        # Incremental time-frame expansion of a circuit over clock cycles
+        # Every frame gets its own copy of the node, control and faulty output
+        # variables. A register's output in frame t equals its input in frame
+        # t - 1, in frame 0 it holds an unconstrained initial state. Frames are
+        # pushed into one live solver, so clauses learned for earlier cycles are
+        # reused when the next cycle is checked.
+        #
+        # Fault model: at most n_e faults in any single cycle, faults in at most
+        # n_c different cycles, at least one fault overall
+        self.encoder = encoder
+        self.circuit = encoder.circuit
+        self.graph = encoder.graph
+        self.fault_type = encoder.fault_type
+
+        fault_model = self.circuit['fault_model']
+        self.n_e = n_e if n_e is not None else fault_model['n_e']
+        self.n_c = n_c if n_c is not None else fault_model['n_c']
+        self.card_encoding = card_encoding if card_encoding is not None else encoder.card_encoding
+
+        if self.circuit['countermeasure'] != 'detection':
+            raise ValueError("Multi-cycle verification only supports the detection countermeasure")
+        flag_node = self.graph.get_node('flag')
+        if flag_node is None or flag_node['type'] != 'output':
+            raise ValueError("Missing flag node or its input")
+
+        self.cnf = ClauseStore()
+        self.next_var = 1
+        self.frames = []
+        self.cycle_active = []
+        self.fault_selectors = []
+        self.cycle_counter = None
+        self.solver = Minisat22()
+        self._pushed = 0
+        self._counter_clauses = 0
+
+    def _new_var(self):
+        var = self.next_var
+        self.next_var += 1
+        return var
+
+    def _frame_var(self, frame, node_id):
+        # Get or create the variable of a node in one frame
+        var = frame['vars'].get(node_id)
+        if var is None:
+            var = frame['vars'][node_id] = self._new_var()
+        return var
+
+    def _frame_faulty(self, frame, node_id):
+        var = frame['faulty'].get(node_id)
+        if var is None:
+            var = frame['faulty'][node_id] = self._new_var()
+        return var
+
+    def _encode_frame(self, cycle):
+        # Add the gate, fault and countermeasure clauses of one clock cycle
+        frame = {'vars': {}, 'controls': {}, 'faulty': {}}
+        previous = self.frames[-1] if self.frames else None
+        fault_clauses = FAULT_TEMPLATES[self.fault_type]
+
+        for node_id in self.graph.order:
+            node = self.graph.get_node(node_id)
+            node_type = node['type']
+            if node_type == 'input':
+                continue
+
+            inputs = node.get('inputs') or []
+            if node_type == 'reg':
+                output = self._frame_var(frame, node_id)
+                if inputs and previous is not None:
+                    # Register output now is the register input one cycle earlier
+                    input_var = self._frame_var(previous, inputs[0])
+                    self.cnf.extend_fixed((-input_var, output, input_var, -output), 2)
+            else:
+                spec = GATE_TEMPLATES[node_type]
+                is_cmp = node_type == 'xor' and node_id.startswith('cmp')
+                slot_vars = []
+                for slot in spec['slots']:
+                    if slot == 'out':
+                        slot_vars.append(self._frame_var(frame, node_id))
+                    elif is_cmp and self.graph.is_vulnerable(inputs[slot]):
+                        slot_vars.append(self._frame_faulty(frame, inputs[slot]))
+                    else:
+                        slot_vars.append(self._frame_var(frame, inputs[slot]))
+                self.cnf.extend(instantiate(spec['clauses'], slot_vars))
+
+            if node.get('vulnerable', False) and (node_type != 'reg' or inputs):
+                output = frame['vars'][node_id]
+                control = frame['controls'][node_id] = self._new_var()
+                faulty = self._frame_faulty(frame, node_id)
+                self.cnf.extend(instantiate(fault_clauses, (output, control, faulty)))
+
+        # Detection: the flag must stay low in every cycle
+        self.cnf.append([-frame['vars']['flag']])
+        self.frames.append(frame)
+        self._encode_frame_fault_budget(frame)
+
+    def _encode_frame_fault_budget(self, frame):
+        # Per-cycle budget (n_e), cycle budget (n_c) and the at-least-one-fault selector
+        controls = list(frame['controls'].values())
+
+        if 0 < self.n_e < len(controls):
+            atmost = cardinality.atmost(controls, self.n_e, self.next_var - 1, self.card_encoding)
+            self.cnf.extend(atmost.clauses)
+            self.next_var = max(self.next_var, atmost.nv + 1)
+
+        # active <-> some fault is injected in this cycle
+        active = self._new_var()
+        for control in controls:
+            self.cnf.append([-control, active])
+        self.cnf.append([-active] + controls)
+        self.cycle_active.append(active)
+
+        # The cycle counter is a totalizer that grows by one input per frame
+        if self.cycle_counter is None:
+            self.cycle_counter = ITotalizer(lits=[active], ubound=self.n_c, top_id=self.next_var - 1)
+        else:
+            self.cycle_counter.extend(lits=[active], top_id=self.next_var - 1)
+        new_clauses = self.cycle_counter.cnf.clauses[self._counter_clauses:]
+        self._counter_clauses = len(self.cycle_counter.cnf.clauses)
+        self.cnf.extend(new_clauses)
+        self.next_var = max(self.next_var, self.cycle_counter.top_id + 1)
+
+        # selector -> at least one fault in some cycle up to this one
+        selector = self._new_var()
+        self.cnf.append([-selector] + self.cycle_active)
+        self.fault_selectors.append(selector)
+
+    def _assumptions(self):
+        assumptions = [self.fault_selectors[-1]]
+        if self.n_c < len(self.cycle_counter.rhs):
+            assumptions.append(-self.cycle_counter.rhs[self.n_c])
+        return assumptions
+
+    def add_cycle(self):
+        # Unroll one more cycle and push its clauses into the live solver
+        self._encode_frame(len(self.frames))
+        self.cnf.add_to_solver(self.solver, self._pushed)
+        self._pushed = len(self.cnf)
+
+    def solve_current(self):
+        # Check the current unrolling depth
+        # Returns (sat, fault_vector) where fault_vector lists (node_id, cycle) pairs
+        is_sat = self.solver.solve(assumptions=self._assumptions())
+        if not is_sat:
+            return False, []
+        model = self.solver.get_model()
+        fault_vector = []
+        for cycle, frame in enumerate(self.frames):
+            for node_id, var in frame['controls'].items():
+                if model[var - 1] > 0:
+                    fault_vector.append((node_id, cycle))
+        return True, fault_vector
+
+    def verify(self, cycles):
+        # Unroll up to the given number of cycles, checking every depth on the way
+        # Returns a list of per-depth results; the last one is the k-cycle verdict
+        logging.info(f"Multi-cycle verification over {cycles} cycles, n_e = {self.n_e} per cycle, n_c = {self.n_c} cycles")
+        results = []
+        for cycle in range(len(self.frames), cycles):
+            start_time = time.time()
+            self.add_cycle()
+            sat, fault_vector = self.solve_current()
+            elapsed = time.time() - start_time
+            results.append({
+                "cycles": cycle + 1,
+                "sat": sat,
+                "fault_vector": fault_vector,
+                "time": elapsed,
+                "variables": self.next_var - 1,
+                "clauses": len(self.cnf),
+            })
+            verdict = "SAT (vulnerable)" if sat else "UNSAT (fault resistant)"
+            logging.info(f"Cycle {cycle + 1}: {verdict}, {self.next_var - 1} variables, {len(self.cnf)} clauses, time taken: {elapsed:.2f} seconds")
+        return results
+
+    def delete(self):
+        self.solver.delete()
+        if self.cycle_counter is not None:
+            self.cycle_counter.delete()